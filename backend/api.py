@@ -1,11 +1,17 @@
 from django.db import IntegrityError, transaction
 from django.utils import timezone
+from django.utils.http import parse_etags
 from rest_framework import serializers, status, viewsets, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .models import Game, Player, PlayerToken
-from .serializers import GameSerializer, PlayerSerializer
+from . import matchmaking
+from .leaderboard import InvalidCursor, leaderboard_around, leaderboard_page
+from .join_service import join_game
+from .models import Game, Player
+from .serializers import PlayerSerializer
+from .state_cache import get_game_state, invalidate_game_state
+from .stats import finish_game, leave_game
 
 def ok(**data):
     return Response({"status": "success", **data}, status=status.HTTP_200_OK)
@@ -35,7 +41,8 @@ class JoinGameRequestSerializer(serializers.Serializer):
 
 
 class GameViewSet(viewsets.GenericViewSet):
-    queryset = Game.objects.all()
+    # GameSerializer reads the winner and the players of every game
+    queryset = Game.objects.select_related("winner").prefetch_related("players")
 
     def create(self, request, *args, **kwargs):
         # Validate that request is either empty or at least not invalid.
@@ -55,28 +62,27 @@ class GameViewSet(viewsets.GenericViewSet):
 
     @action(detail=True, methods=["post"])
     def join(self, request, pk=None):
-        game = self.get_object()
-
         req = JoinGameRequestSerializer(data=request.data)
         req.is_valid(raise_exception=True)
-        nickname = req.validated_data["nickname"]
-
-        with transaction.atomic():
-            player, _ = Player.objects.get_or_create(nickname=nickname)
-            token = PlayerToken.generate(player)
-            game.players.add(player)
 
-        return ok(
-            player_id=player.id,
-            game_id=game.id,
-            token=token.value,
-            game=GameSerializer(game).data,
-        )
+        # a retry with the same Idempotency-Key gets the first response
+        return ok(**join_game(
+            pk,
+            req.validated_data["nickname"],
+            request.headers.get("Idempotency-Key"),
+        ))
 
     @action(detail=True, methods=["get"])
     def state(self, request, pk=None):
-        game = self.get_object()
-        return ok(game_id=game.id, game=GameSerializer(game).data)
+        # polled by clients, served from the cache and 304 when unchanged
+        etag, game_data = get_game_state(pk, self.get_queryset())
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        response = ok(game_id=game_data["id"], game=game_data)
+        response["ETag"] = etag
+        return response
 
     @action(detail=True, methods=["delete"])
     def remove_player(self, request, pk=None):
@@ -90,7 +96,8 @@ class GameViewSet(viewsets.GenericViewSet):
         except (ValueError, Player.DoesNotExist):
             return err("Player not found", status.HTTP_404_NOT_FOUND)
 
-        game.players.remove(player)
+        leave_game(game.id, player.id)
+        invalidate_game_state(game.id)
         return ok(game_id=game.id)
 
     @action(detail=True, methods=["patch"])
@@ -103,15 +110,92 @@ class GameViewSet(viewsets.GenericViewSet):
                 winner = Player.objects.get(id=int(winner_id))
             except (ValueError, Player.DoesNotExist):
                 return err("Winner not found", status.HTTP_404_NOT_FOUND)
-            game.winner_id = winner
+            game.winner = winner
 
-        game.finished = True
         game.end_time = timezone.now()
-        game.save()
+        finish_game(game)
+        invalidate_game_state(game.id)
 
         return ok(message="Game finished", game_id=game.id)
 
 
-class PlayerViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
-    queryset = Player.objects.all().order_by("-total_score", "nickname")
+class PlayerViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                    viewsets.GenericViewSet):
+    # PlayerSerializer reads the player's stats row
+    queryset = Player.objects.select_related("stats") \
+        .order_by("-total_score", "nickname")
     serializer_class = PlayerSerializer
+
+    def ranked(self, entries):
+        """
+        Serialize leaderboard entries with PlayerSerializer, in one query.
+        The rank comes from the leaderboard, players deleted since drop out.
+        """
+        players = self.get_queryset().in_bulk(
+            [entry["id"] for entry in entries]
+        )
+        return [
+            {"rank": entry["rank"],
+             **self.get_serializer(players[entry["id"]]).data}
+            for entry in entries if entry["id"] in players
+        ]
+
+    def list(self, request, *args, **kwargs):
+        # leaderboard pages: ?cursor=<next from the previous page>&limit=50
+        try:
+            limit = int(request.query_params.get("limit", 0)) or None
+        except ValueError:
+            return err("limit must be a number")
+        try:
+            players, next_cursor = leaderboard_page(
+                request.query_params.get("cursor"), limit
+            )
+        except InvalidCursor as e:
+            return err(str(e))
+        return ok(players=self.ranked(players), next=next_cursor)
+
+    @action(detail=True, methods=["get"])
+    def rank(self, request, pk=None):
+        # the player's rank with ?k=5 neighbours on each side
+        player = self.get_object()
+        try:
+            k = min(int(request.query_params.get("k", 5)), 50)
+        except ValueError:
+            return err("k must be a number")
+        rank, players = leaderboard_around(player, max(k, 0))
+        return ok(
+            player_id=player.id, rank=rank, players=self.ranked(players)
+        )
+
+
+class MatchmakingViewSet(viewsets.ViewSet):
+    """Auto-match queue, see backend/matchmaking.py."""
+
+    def enqueue(self, request):
+        req = JoinGameRequestSerializer(data=request.data)
+        req.is_valid(raise_exception=True)
+        return ok(**matchmaking.enqueue(req.validated_data["nickname"]))
+
+    def poll(self, request, nickname=None):
+        # polled by the waiting clients, read only
+        try:
+            return ok(**matchmaking.poll(nickname))
+        except matchmaking.NotQueued as e:
+            return err(str(e), status.HTTP_404_NOT_FOUND)
+
+    def retry(self, request, nickname=None):
+        # sent by the waiting clients now and then, matches with the
+        # band widened since the enqueue
+        try:
+            return ok(**matchmaking.retry(nickname))
+        except matchmaking.NotQueued as e:
+            return err(str(e), status.HTTP_404_NOT_FOUND)
+
+    def leave(self, request, nickname=None):
+        if not matchmaking.leave(nickname):
+            return err("Player is not in the matchmaking queue",
+                       status.HTTP_404_NOT_FOUND)
+        return ok(nickname=nickname)
+
+    def stats(self, request):
+        return ok(**matchmaking.matchmaking_stats())
@@ -5,3 +5,5 @@ class VirusGameMotherConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend"
 
+    def ready(self):
+        from . import signals  # noqa: F401
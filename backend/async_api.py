@@ -0,0 +1,163 @@
+"""
+Async versions of the game endpoints, on Django's async ORM.
+
+DRF viewsets are synchronous, so under the ASGI server every call to them
+is handed to the sync-to-async thread and waits for it. These views run
+on the event loop and only leave it for the database queries themselves.
+Requests and responses are the same as GameViewSet's; backend/urls.py
+routes to them when ASYNC_API is on.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .api import JoinGameRequestSerializer
+from .join_service import join_game
+from .models import Game, Player
+from .state_cache import aget_game_state, ainvalidate_game_state
+from .stats import finish_game, leave_game
+
+games = Game.objects.select_related("winner").prefetch_related("players")
+
+
+def ok(status=200, **data):
+    return JsonResponse({"status": "success", **data}, status=status)
+
+
+def err(message: str, status=400):
+    return JsonResponse({"status": "error", "message": message}, status=status)
+
+
+def not_found():
+    return JsonResponse(
+        {"detail": "No Game matches the given query."}, status=404
+    )
+
+
+def not_allowed(request):
+    return JsonResponse(
+        {"detail": f'Method "{request.method}" not allowed.'}, status=405
+    )
+
+
+def request_data(request):
+    """
+    Request body parsed by DRF's parsers, JSON, form or multipart.
+
+    Raises:
+        APIException: ParseError or UnsupportedMediaType, as the viewset
+    """
+    return Request(request, parsers=[
+        parser() for parser in api_settings.DEFAULT_PARSER_CLASSES
+    ]).data
+
+
+async def get_game(pk):
+    try:
+        return await Game.objects.aget(pk=pk)
+    except Game.DoesNotExist:
+        return None
+
+
+# ----------------- Views ----------------- #
+
+
+@csrf_exempt
+async def create_game(request):
+    if request.method != "POST":
+        return not_allowed(request)
+    game = await Game.objects.acreate()
+    return ok(status=201, game_id=game.id)
+
+
+@csrf_exempt
+async def game_detail(request, pk):
+    try:
+        match request.method:
+            case "POST":
+                return await join(request, pk)
+            case "DELETE":
+                return await remove_player(request, pk)
+            case "PATCH":
+                return await finish(request, pk)
+    except APIException as e:
+        return JsonResponse({"detail": e.detail}, status=e.status_code)
+    return not_allowed(request)
+
+
+async def join(request, pk):
+    req = JoinGameRequestSerializer(data=request_data(request))
+    if not req.is_valid():
+        return JsonResponse(req.errors, status=400)
+
+    # one transaction of a few statements, Django has no async atomic()
+    try:
+        response = await sync_to_async(join_game)(
+            pk,
+            req.validated_data["nickname"],
+            request.headers.get("Idempotency-Key"),
+        )
+    except Http404:
+        return not_found()
+    return ok(**response)
+
+
+async def remove_player(request, pk):
+    game = await get_game(pk)
+    if game is None:
+        return not_found()
+
+    player_id = request.GET.get("player_id") \
+        or request_data(request).get("player_id")
+    if not player_id:
+        return err("player_id is required")
+
+    try:
+        player = await Player.objects.aget(id=int(player_id))
+    except (ValueError, Player.DoesNotExist):
+        return err("Player not found", 404)
+
+    await sync_to_async(leave_game)(game.id, player.id)
+    await ainvalidate_game_state(game.id)
+    return ok(game_id=game.id)
+
+
+async def finish(request, pk):
+    game = await get_game(pk)
+    if game is None:
+        return not_found()
+
+    winner_id = request_data(request).get("winner_id")
+    if winner_id is not None:
+        try:
+            game.winner = await Player.objects.aget(id=int(winner_id))
+        except (ValueError, Player.DoesNotExist):
+            return err("Winner not found", 404)
+
+    game.end_time = timezone.now()
+    # with the players' stats, in one transaction
+    await sync_to_async(finish_game)(game)
+    await ainvalidate_game_state(game.id)
+
+    return ok(message="Game finished", game_id=game.id)
+
+
+async def game_state(request, pk):
+    if request.method != "GET":
+        return not_allowed(request)
+    try:
+        etag, game_data = await aget_game_state(pk, games)
+    except Http404:
+        return not_found()
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+    response = ok(game_id=game_data["id"], game=game_data)
+    response["ETag"] = etag
+    return response
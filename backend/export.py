@@ -0,0 +1,191 @@
+"""
+Streaming exports of the game history and the player stats, for analysis.
+
+Rows are read with aiterator(chunk_size=EXPORT_CHUNK_SIZE) and written out
+as they come, so an export holds one chunk in memory however big the
+tables are. Both exports are ordered by id: a client that lost the
+connection resumes with ?after={last id it got}. ?since= and ?until= (ISO
+date or datetime) limit the games to those started in that range.
+
+?format=ndjson (default) writes one JSON object per line, ?format=csv a
+header and one row per game or player.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from .models import Game, Player
+
+GAME_COLUMNS = [
+    "id", "finished", "start_time", "end_time",
+    "winner_id", "winner_nickname", "player_ids", "player_nicknames",
+]
+PLAYER_COLUMNS = [
+    "id", "nickname", "total_score", "games_played", "games_won",
+]
+
+
+class InvalidParameter(ValueError):
+    pass
+
+
+class Echo:
+    """File-like object for csv.writer that hands the row back."""
+
+    def write(self, value):
+        return value
+
+
+def err(message: str, status=400):
+    return JsonResponse({"status": "error", "message": message}, status=status)
+
+
+def parse_filters(request):
+    """
+    Returns:
+        Tuple of (format, after, since, until) from the query string
+
+    Raises:
+        InvalidParameter: a malformed parameter
+    """
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        raise InvalidParameter("format must be ndjson or csv")
+    try:
+        after = int(request.GET.get("after", 0))
+    except ValueError:
+        raise InvalidParameter("after must be an id")
+    return (
+        fmt, after,
+        parse_time(request.GET.get("since"), "since"),
+        parse_time(request.GET.get("until"), "until"),
+    )
+
+
+def parse_time(value, name):
+    if not value:
+        return None
+    moment = parse_datetime(value) or parse_datetime(f"{value}T00:00")
+    if moment is None:
+        raise InvalidParameter(f"{name} must be an ISO date or datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def stream(rows, fmt, columns, name):
+    """
+    Args:
+        rows: async iterator of dicts with `columns` as keys
+        name: file name offered to the client, without extension
+    """
+    if fmt == "csv":
+        content_type = "text/csv"
+
+        async def lines():
+            writer = csv.writer(Echo())
+            yield writer.writerow(columns)
+            async for row in rows:
+                yield writer.writerow([row[column] for column in columns])
+    else:
+        content_type = "application/x-ndjson"
+
+        async def lines():
+            async for row in rows:
+                yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    response = StreamingHttpResponse(lines(), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+# ----------------- Views ----------------- #
+
+
+@require_GET
+async def export_games(request):
+    """GET /api/export/games/ - games with their players and winner."""
+    try:
+        fmt, after, since, until = parse_filters(request)
+    except InvalidParameter as e:
+        return err(str(e))
+
+    games = Game.objects.filter(id__gt=after).select_related(
+        "winner"
+    ).prefetch_related("players").order_by("id")
+    if since:
+        games = games.filter(start_time__gte=since)
+    if until:
+        games = games.filter(start_time__lt=until)
+
+    async def rows():
+        async for game in games.aiterator(
+                chunk_size=settings.EXPORT_CHUNK_SIZE):
+            players = list(game.players.all())
+            row = {
+                "id": game.id,
+                "finished": game.finished,
+                "start_time": game.start_time,
+                "end_time": game.end_time,
+                "winner_id": game.winner_id,
+                "winner_nickname": game.winner and game.winner.nickname,
+            }
+            if fmt == "csv":
+                row["player_ids"] = ";".join(str(p.id) for p in players)
+                row["player_nicknames"] = ";".join(
+                    p.nickname for p in players
+                )
+            else:
+                row["players"] = [
+                    {"id": p.id, "nickname": p.nickname} for p in players
+                ]
+            yield row
+
+    return stream(rows(), fmt, GAME_COLUMNS, "games")
+
+
+@require_GET
+async def export_players(request):
+    """
+    GET /api/export/players/ - every player with their score, games
+    played and games won (counting only games in the since/until range).
+    """
+    try:
+        fmt, after, since, until = parse_filters(request)
+    except InvalidParameter as e:
+        return err(str(e))
+
+    players = Player.objects.filter(id__gt=after).order_by("id")
+    if since or until:
+        played, won = Q(), Q()
+        if since:
+            played &= Q(games__start_time__gte=since)
+            won &= Q(won_games__start_time__gte=since)
+        if until:
+            played &= Q(games__start_time__lt=until)
+            won &= Q(won_games__start_time__lt=until)
+        players = players.annotate(
+            games_played=Count("games", filter=played, distinct=True),
+            games_won=Count("won_games", filter=won, distinct=True),
+        )
+    else:
+        # all time, straight from the stats rows
+        players = players.annotate(
+            games_played=F("stats__games_played"),
+            games_won=F("stats__games_won"),
+        )
+    players = players.values(*PLAYER_COLUMNS)
+
+    async def rows():
+        async for player in players.aiterator(
+                chunk_size=settings.EXPORT_CHUNK_SIZE):
+            yield player
+
+    return stream(rows(), fmt, PLAYER_COLUMNS, "players")
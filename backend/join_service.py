@@ -0,0 +1,117 @@
+"""
+Joining a game in as few statements as possible.
+
+The player, its token and whether it is seated already come back from
+one SELECT, a new seat is the membership INSERT and its games played
+increment, and the lobby snapshot returned to the player is the cached
+game state with the new player patched in. A returning player joins with
+three statements (one when seated already) and a new one with six. A
+client retrying with the same Idempotency-Key gets the first response
+back from the cache without any statement at all.
+"""
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
+
+from .models import Game, Player, PlayerToken
+from .stats import Membership, record_seat
+from .serializers import GamePlayerSerializer
+from .state_cache import get_game_state, invalidate_game_state, state_key
+
+
+def idempotency_key(game_id, key):
+    return f"join:{game_id}:{key}"
+
+
+def join_game(game_id, nickname, key=None):
+    """
+    Seat `nickname` in the game, creating the player and its token when
+    needed.
+
+    Returns:
+        Response dict with player_id, game_id, token and game
+
+    Raises:
+        Http404: no game with this id
+    """
+    try:
+        game_id = int(game_id)
+    except ValueError:
+        raise Http404("No Game matches the given query.")
+    if key:
+        cached = cache.get(idempotency_key(game_id, key))
+        if cached is not None:
+            return cached
+
+    try:
+        player, token = _join(game_id, nickname)
+    except IntegrityError:
+        # a missing game fails the membership's foreign key, a nickname
+        # or a seat taken by a concurrent join fails a unique constraint
+        if not Game.objects.filter(pk=game_id).exists():
+            raise Http404("No Game matches the given query.")
+        player, token = _join(game_id, nickname)
+
+    response = {
+        "player_id": player.id,
+        "game_id": game_id,
+        "token": token.value,
+        "game": lobby_snapshot(game_id, player),
+    }
+    if key:
+        cache.set(idempotency_key(game_id, key), response,
+                  settings.JOIN_IDEMPOTENCY_TTL)
+    return response
+
+
+def _join(game_id, nickname):
+    with transaction.atomic():
+        player = Player.objects.select_related("token").annotate(
+            seated=Exists(Membership.objects.filter(
+                game_id=game_id, player_id=OuterRef("pk")
+            ))
+        ).filter(nickname=nickname).first()
+        token = None
+        if player is None:
+            # its stats row is created by the post_save signal
+            player = Player.objects.create(nickname=nickname)
+            player.seated = False
+        else:
+            # loaded by select_related, a new player has none to look up
+            try:
+                token = player.token
+            except PlayerToken.DoesNotExist:
+                pass
+        if token is None:
+            token = PlayerToken.objects.create(
+                player=player, value=secrets.token_hex(32)
+            )
+        if not player.seated:
+            Membership.objects.create(game_id=game_id, player_id=player.id)
+            record_seat(player.id)
+    return player, token
+
+
+def lobby_snapshot(game_id, player):
+    """
+    The game state as the joining player should see it, patched from the
+    cached state when there is one. When the player took a new seat that
+    cached state is dropped, the next poll rebuilds it from the database.
+    """
+    cached = cache.get(state_key(game_id))
+    if not player.seated:
+        invalidate_game_state(game_id)
+    if cached is None:
+        return get_game_state(game_id, Game.objects.select_related(
+            "winner").prefetch_related("players"))[1]
+
+    data = dict(cached[1])
+    if all(seat["id"] != player.id for seat in data["players"]):
+        data["players"] = data["players"] + [
+            GamePlayerSerializer(player).data
+        ]
+    return data
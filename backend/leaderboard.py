@@ -0,0 +1,277 @@
+"""
+Leaderboard of players ranked by total_score, then nickname.
+
+The database stays the source of truth. A Redis sorted set mirrors it
+(member = nickname, score = -total_score, so ties come out in nickname
+order) and answers top-N pages and "my rank +- k" in O(log n + page).
+Pages are cursor-paginated on (total_score, nickname), which works the
+same against Redis and against the (total_score, nickname) index the
+database falls back to when Redis is disabled or unreachable.
+"""
+import base64
+import json
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Player
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(entry):
+    raw = json.dumps([entry["total_score"], entry["nickname"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, nickname = json.loads(base64.urlsafe_b64decode(cursor))
+        return int(score), str(nickname)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def entry(rank, player_id, nickname, total_score):
+    return {
+        "rank": rank,
+        "id": player_id,
+        "nickname": nickname,
+        "total_score": total_score,
+    }
+
+
+# ----------------- Redis ----------------- #
+
+
+class RedisLeaderboard:
+    key = "leaderboard"
+    ids_key = "leaderboard:ids"  # nickname -> player id
+
+    def __init__(self, url):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.checked = False
+
+    def ensure_built(self):
+        """Fill an empty sorted set from the database, once per process."""
+        if not self.checked:
+            if not self.redis.exists(self.key) and Player.objects.exists():
+                self.rebuild()
+            self.checked = True
+
+    def update(self, player):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(self.key, {player.nickname: -player.total_score})
+        pipe.hset(self.ids_key, player.nickname, player.id)
+        pipe.execute()
+
+    def remove(self, player):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrem(self.key, player.nickname)
+        pipe.hdel(self.ids_key, player.nickname)
+        pipe.execute()
+
+    def rebuild(self, chunk_size=1000):
+        """Load every player into fresh keys and swap them in at once."""
+        tmp_key, tmp_ids_key = f"{self.key}:tmp", f"{self.ids_key}:tmp"
+        self.redis.delete(tmp_key, tmp_ids_key)
+        count = 0
+        rows = Player.objects.values_list("id", "nickname", "total_score") \
+            .order_by("id").iterator(chunk_size=chunk_size)
+        pipe = self.redis.pipeline(transaction=False)
+        for player_id, nickname, total_score in rows:
+            pipe.zadd(tmp_key, {nickname: -total_score})
+            pipe.hset(tmp_ids_key, nickname, player_id)
+            count += 1
+            if count % chunk_size == 0:
+                pipe.execute()
+        pipe.execute()
+
+        pipe = self.redis.pipeline(transaction=True)
+        if count:
+            pipe.rename(tmp_key, self.key)
+            pipe.rename(tmp_ids_key, self.ids_key)
+        else:
+            pipe.delete(self.key, self.ids_key)
+        pipe.execute()
+        self.checked = True
+        return count
+
+    def _entries(self, start, stop):
+        rows = self.redis.zrange(self.key, start, stop, withscores=True)
+        if not rows:
+            return []
+        ids = self.redis.hmget(self.ids_key, [name for name, _ in rows])
+        return [
+            entry(start + i + 1, int(player_id), name, -int(score))
+            for i, ((name, score), player_id) in enumerate(zip(rows, ids))
+            if player_id is not None
+        ]
+
+    def page(self, cursor, limit):
+        self.ensure_built()
+        start = 0
+        if cursor:
+            total_score, nickname = cursor
+            rank = self.redis.zrank(self.key, nickname)
+            score = self.redis.zscore(self.key, nickname)
+            if rank is not None and score == -total_score:
+                start = rank + 1
+            else:
+                # the cursor's player moved, continue after its old place
+                start = self.rank_after(total_score, nickname)
+        return self._entries(start, start + limit - 1)
+
+    def rank_after(self, total_score, nickname):
+        """0-based rank following (total_score, nickname) in the set."""
+        score = -total_score
+        low = self.redis.zcount(self.key, "-inf", f"({score}")
+        high = self.redis.zcount(self.key, "-inf", score)
+        # ties are ordered by member, binary search them for the nickname
+        while low < high:
+            middle = (low + high) // 2
+            members = self.redis.zrange(self.key, middle, middle)
+            if not members:
+                break
+            if members[0] <= nickname:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def around(self, player, k):
+        self.ensure_built()
+        rank = self.redis.zrank(self.key, player.nickname)
+        if rank is None:
+            self.update(player)
+            rank = self.redis.zrank(self.key, player.nickname)
+        return rank + 1, self._entries(max(0, rank - k), rank + k)
+
+
+# ----------------- Database ----------------- #
+
+
+class DatabaseLeaderboard:
+    """Keyset queries on the (total_score, nickname) index."""
+
+    ordering = ("-total_score", "nickname")
+
+    @staticmethod
+    def ahead_of(total_score, nickname):
+        return Q(total_score__gt=total_score) \
+            | Q(total_score=total_score, nickname__lt=nickname)
+
+    @staticmethod
+    def behind(total_score, nickname):
+        return Q(total_score__lt=total_score) \
+            | Q(total_score=total_score, nickname__gt=nickname)
+
+    def rank_of(self, total_score, nickname):
+        return Player.objects.filter(
+            self.ahead_of(total_score, nickname)
+        ).count() + 1
+
+    def _entries(self, rows, first_rank):
+        return [
+            entry(first_rank + i, *row) for i, row in enumerate(rows)
+        ]
+
+    @staticmethod
+    def _rows(queryset):
+        return list(queryset.values_list("id", "nickname", "total_score"))
+
+    def page(self, cursor, limit):
+        queryset = Player.objects.order_by(*self.ordering)
+        first_rank = 1
+        if cursor:
+            queryset = queryset.filter(self.behind(*cursor))
+            first_rank = self.rank_of(*cursor) + 1
+        return self._entries(self._rows(queryset[:limit]), first_rank)
+
+    def around(self, player, k):
+        rank = self.rank_of(player.total_score, player.nickname)
+        # nearest k ahead, fetched in reverse and flipped back
+        above = self._rows(Player.objects.filter(
+            self.ahead_of(player.total_score, player.nickname)
+        ).order_by("total_score", "-nickname")[:k])[::-1]
+        below = self._rows(Player.objects.filter(
+            self.behind(player.total_score, player.nickname)
+        ).order_by(*self.ordering)[:k])
+        entries = self._entries(above, rank - len(above))
+        entries.append(
+            entry(rank, player.id, player.nickname, player.total_score)
+        )
+        entries += self._entries(below, rank + 1)
+        return rank, entries
+
+
+# ----------------- Service ----------------- #
+
+
+database_leaderboard = DatabaseLeaderboard()
+redis_leaderboard = None
+if settings.LEADERBOARD_REDIS and not settings.REDIS_URL.startswith('memory'):
+    redis_leaderboard = RedisLeaderboard(settings.REDIS_URL)
+
+
+def _query(method, *args):
+    """Ask Redis when enabled, the database when not or on failure."""
+    if redis_leaderboard:
+        try:
+            return getattr(redis_leaderboard, method)(*args)
+        except redis.RedisError as e:
+            print(f"Leaderboard falling back to the database: {e!r}")
+    return getattr(database_leaderboard, method)(*args)
+
+
+def leaderboard_page(cursor=None, limit=None):
+    """
+    Args:
+        cursor: opaque cursor of the previous page, None for the top
+        limit: entries per page, LEADERBOARD_PAGE_SIZE by default
+
+    Returns:
+        Tuple of (entries, next_cursor), next_cursor is None on the last page
+    """
+    limit = max(1, min(limit or settings.LEADERBOARD_PAGE_SIZE,
+                       settings.LEADERBOARD_MAX_PAGE_SIZE))
+    position = decode_cursor(cursor) if cursor else None
+    entries = _query("page", position, limit)
+    next_cursor = encode_cursor(entries[-1]) \
+        if len(entries) == limit else None
+    return entries, next_cursor
+
+
+def leaderboard_around(player, k):
+    """
+    Returns:
+        Tuple of (rank, entries) with up to k players on each side
+    """
+    return _query("around", player, k)
+
+
+def sync_player(player):
+    """Mirror a saved player into Redis, the database is already updated."""
+    if redis_leaderboard:
+        try:
+            redis_leaderboard.update(player)
+        except redis.RedisError as e:
+            print(f"Leaderboard update failed, rebuild to resync: {e!r}")
+
+
+def sync_players(player_ids):
+    """Mirror players whose scores were changed by QuerySet.update()."""
+    if redis_leaderboard and player_ids:
+        for player in Player.objects.filter(id__in=list(player_ids)):
+            sync_player(player)
+
+
+def remove_player(player):
+    if redis_leaderboard:
+        try:
+            redis_leaderboard.remove(player)
+        except redis.RedisError as e:
+            print(f"Leaderboard update failed, rebuild to resync: {e!r}")
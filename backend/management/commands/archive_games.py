@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.models import Game
+from backend.state_cache import invalidate_game_state
+
+Membership = Game.players.through
+
+
+class Command(BaseCommand):
+    help = (
+        "Move games finished before a cutoff from the database into "
+        "gzipped NDJSON files (one game per line, with its players), "
+        "deleting them in small batches so the write lock is never held "
+        "for long. --every keeps it running on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float,
+                            default=settings.ARCHIVE_AFTER_DAYS,
+                            help="archive games finished this long ago")
+        parser.add_argument("--before",
+                            help="archive games finished before this "
+                                 "ISO date(time) instead of --days")
+        parser.add_argument("--batch-size", type=int,
+                            default=settings.ARCHIVE_BATCH_SIZE,
+                            help="games deleted per transaction")
+        parser.add_argument("--pause", type=float, default=0.05,
+                            help="seconds between batches, for other writers")
+        parser.add_argument("--output-dir", default=str(settings.ARCHIVE_DIR),
+                            help="where the .ndjson.gz files are written")
+        parser.add_argument("--every", type=float, default=0,
+                            help="run again every this many seconds")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options["before"]:
+            before = parse_datetime(options["before"]) or parse_datetime(
+                f"{options['before']}T00:00"
+            )
+            if before is None:
+                raise CommandError(f"Invalid --before {options['before']}")
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+
+        while True:
+            if not options["before"]:
+                before = timezone.now() - timedelta(days=options["days"])
+            self.archive(before, options)
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
+
+    def archive(self, before, options):
+        """Archive and delete every game finished before `before`."""
+        finished = Game.objects.filter(
+            finished=True, end_time__lt=before
+        ).order_by("id")
+        output_dir = Path(options["output_dir"])
+        path = output_dir / (
+            f"games-{timezone.now():%Y%m%dT%H%M%S}.ndjson.gz"
+        )
+        archive = None
+        games = rows = 0
+        started = time.perf_counter()
+
+        try:
+            while True:
+                ids = list(finished.values_list("id", flat=True)[
+                           :options["batch_size"]])
+                if not ids:
+                    break
+                if archive is None:
+                    output_dir.mkdir(parents=True, exist_ok=True)
+                    archive = gzip.open(path, "wt", encoding="utf-8")
+                batch = self.dump(ids)
+                archive.writelines(
+                    json.dumps(game, cls=DjangoJSONEncoder) + "\n"
+                    for game in batch
+                )
+                # on disk before the rows are gone
+                archive.flush()
+                os.fsync(archive.buffer.fileobj.fileno())
+
+                with transaction.atomic():
+                    memberships, _ = Membership.objects.filter(
+                        game_id__in=ids
+                    ).delete()
+                    Game.objects.filter(id__in=ids).delete()
+                invalidate_game_state(*ids)
+                games += len(batch)
+                rows += memberships + len(ids)
+                if options["pause"]:
+                    time.sleep(options["pause"])
+        finally:
+            if archive is not None:
+                archive.close()
+
+        elapsed = time.perf_counter() - started
+        if not games:
+            self.stdout.write(
+                f"No games finished before {before:%Y-%m-%d %H:%M}."
+            )
+            return
+        self.stdout.write(
+            f"Archived {games} games ({rows} rows) to {path} in "
+            f"{elapsed:.1f}s, {rows / elapsed:.0f} rows/s."
+        )
+
+    @staticmethod
+    def dump(ids):
+        """The games as archived, with their players' ids and nicknames."""
+        players = {game_id: [] for game_id in ids}
+        for game_id, player_id, nickname in Membership.objects.filter(
+                game_id__in=ids
+        ).values_list("game_id", "player_id", "player__nickname"):
+            players[game_id].append({"id": player_id, "nickname": nickname})
+
+        return [
+            {**game, "players": players[game["id"]]}
+            for game in Game.objects.filter(id__in=ids).order_by("id").values(
+                "id", "start_time", "end_time", "winner_id"
+            )
+        ]
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.models import Game, Player
+from virus_the_game.bots import get_bot_runner
+from virus_the_game.lifespan import shutdown
+from virus_the_game.loadtest import InProcessSocket, use_in_memory_backends
+
+
+def thread_cpu_seconds(thread):
+    clock = time.pthread_getcpuclockid(thread.ident)
+    return time.clock_gettime(clock)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in-process rooms with bots only, play them until the games "
+        "are over or --duration runs out and report the turns played, "
+        "the CPU the bots used and how many bots one core can run at the "
+        "configured think time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=10)
+        parser.add_argument("--bots", type=int, default=4,
+                            help="bots per room")
+        parser.add_argument("--duration", type=float, default=60.0,
+                            help="seconds after which unfinished rooms stop")
+        parser.add_argument("--think", type=float,
+                            default=settings.BOT_THINK_TIME,
+                            help="seconds a bot waits before playing")
+        parser.add_argument("--in-memory", action="store_true",
+                            help="use the in-process channel layer and "
+                                 "Redis stand-in, the bots then share the "
+                                 "worker's loop")
+
+    def handle(self, *args, **options):
+        if not 2 <= options["bots"] <= 8:
+            raise CommandError("--bots must be between 2 and 8")
+        if options["in_memory"]:
+            use_in_memory_backends()
+        settings.BOT_THINK_TIME = options["think"]
+        settings.BOT_MAX_PER_WORKER = max(
+            settings.BOT_MAX_PER_WORKER, options["rooms"] * options["bots"]
+        )
+
+        game_ids = []
+        try:
+            asyncio.run(self.measure(options, game_ids))
+        finally:
+            Game.objects.filter(pk__in=game_ids).delete()
+            for player in Player.objects.filter(nickname__in=[
+                    f"Bot {game_id}-{number}" for game_id in game_ids
+                    for number in range(1, options["bots"] + 1)]):
+                # one by one, so the leaderboard hears about it
+                player.delete()
+
+    async def measure(self, options, game_ids):
+        from virus_the_game.asgi import application
+
+        runner = get_bot_runner()
+        bots = options["rooms"] * options["bots"]
+        finished = 0
+
+        async def play_room(api):
+            nonlocal finished
+            response = await api.post("games/", json={})
+            response.raise_for_status()
+            game_id = response.json()["game_id"]
+            game_ids.append(game_id)
+
+            host = InProcessSocket(application, f"/ws/lobby/{game_id}/")
+            await host.connect()
+            try:
+                await host.send({
+                    'sender': 'frontend',
+                    'header': 'add_bot',
+                    'data': {'count': options["bots"]},
+                })
+                await self.wait_for(host, 'connection', options["bots"])
+                await host.send({
+                    'sender': 'frontend',
+                    'header': 'game_start',
+                    'data': {},
+                })
+                # the bots leave once the game is over
+                await self.wait_for(host, 'player_disconnected', options["bots"])
+                finished += 1
+            finally:
+                await host.close()
+
+        started = time.perf_counter()
+        cpu_started = (thread_cpu_seconds(runner.thread) if runner.threaded
+                       else time.process_time())
+        async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=application),
+                base_url="http://localhost/api/"
+        ) as api:
+            rooms = [asyncio.ensure_future(play_room(api))
+                     for _ in range(options["rooms"])]
+            await asyncio.wait(rooms, timeout=options["duration"])
+        elapsed = time.perf_counter() - started
+        cpu = ((thread_cpu_seconds(runner.thread) if runner.threaded
+                else time.process_time()) - cpu_started)
+        turns = runner.turns
+        for room in rooms:
+            room.cancel()
+        await asyncio.gather(*rooms, return_exceptions=True)
+        await shutdown()
+
+        self.stdout.write(
+            f"{bots} bots in {options['rooms']} rooms, think time "
+            f"{options['think']}s, {'bots thread' if runner.threaded else 'worker loop'}"
+        )
+        self.stdout.write(
+            f"{finished} games finished, {turns} turns in {elapsed:.1f}s "
+            f"({turns / elapsed:.1f} turns/s)"
+        )
+        self.stdout.write(
+            f"CPU {cpu:.2f}s ({cpu / elapsed:.0%} of a core), "
+            f"{cpu / max(turns, 1) * 1000:.2f} ms per turn, "
+            f"{bots * elapsed / max(cpu, 1e-9):.0f} bots per core"
+        )
+        if not runner.threaded:
+            self.stdout.write(
+                "On the worker loop the CPU includes the hosts and the "
+                "channel layer, the bots alone need less."
+            )
+
+    async def wait_for(self, host, header, count):
+        """Read the host socket until `count` frames with the header arrived."""
+        while count:
+            message = await host.receive(None)
+            if message.get('header') == header:
+                count -= 1
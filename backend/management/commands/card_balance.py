@@ -0,0 +1,108 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from engine.card import SpecialCard
+from engine.game import DEFAULT_COMPOSITION
+from engine.simulation import balance_report, run_simulations
+
+
+def parse_variant(value):
+    """"name=epidemy:4,thieft:2" -> ("name", {"epidemy": 4, "thieft": 2})"""
+    name, _, overrides = value.partition("=")
+    composition = {}
+    for override in filter(None, overrides.split(",")):
+        card, _, count = override.rpartition(":")
+        if card not in DEFAULT_COMPOSITION or not count.isdigit():
+            raise CommandError(
+                f"Invalid card count {override!r}, expected card:count with "
+                f"card one of: {', '.join(DEFAULT_COMPOSITION)}"
+            )
+        composition[card] = int(count)
+    return name, composition
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate seeded games on every core and report each seat's win "
+        "rate, how playing each special card goes with winning, and the "
+        "game lengths. --variant adds alternative deck compositions, "
+        "played from the same seeds as the standard deck."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=10000,
+                            help="games simulated per deck composition")
+        parser.add_argument("--players", type=int, default=4)
+        parser.add_argument("--seed", type=int, default=0,
+                            help="seed of the first game")
+        parser.add_argument("--max-turns", type=int, default=500,
+                            help="turns after which a game counts as stalled")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--variant", action="append", default=[],
+                            metavar="NAME=CARD:COUNT,...",
+                            help='e.g. "more-epidemy=epidemy:4,thieft:2"')
+        parser.add_argument("--output",
+                            default=str(settings.BASE_DIR / "data" / "card_balance.json"),
+                            help="where the JSON report is written")
+
+    def handle(self, *args, **options):
+        if not 2 <= options["players"] <= 8:
+            raise CommandError("--players must be between 2 and 8")
+        variants = [("standard", {})] + [
+            parse_variant(value) for value in options["variant"]
+        ]
+
+        reports = {}
+        for name, composition in variants:
+            started = time.perf_counter()
+            stats = run_simulations(
+                options["games"], options["players"], composition,
+                seed=options["seed"], max_turns=options["max_turns"],
+                workers=options["workers"],
+            )
+            elapsed = time.perf_counter() - started
+            reports[name] = {
+                "composition": {**DEFAULT_COMPOSITION, **composition},
+                **balance_report(stats, options["players"]),
+            }
+            self.stdout.write(
+                f"{name}: {stats.games} games in {elapsed:.1f}s "
+                f"({stats.games / elapsed:.0f} games/s)"
+            )
+
+        self.write_summary(reports, options["players"])
+        output = Path(options["output"])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(reports, indent=2))
+        self.stdout.write(f"Report written to {output}")
+
+    def write_summary(self, reports, players):
+        names = list(reports)
+        width = max(len("latex glove lift"), *map(len, names))
+
+        def row(label, values):
+            self.stdout.write(
+                label.ljust(width) + " | "
+                + " | ".join(value.rjust(width) for value in values)
+            )
+
+        row("", names)
+        for seat in range(players):
+            row(f"seat {seat} win rate", [
+                f"{report['seat_win_rate'][seat]:.3f}" for report in reports.values()
+            ])
+        for card_type in SpecialCard.card_types:
+            row(f"{card_type} lift", [
+                f"{report['specials'][card_type]['win_rate_lift']:.2f}"
+                for report in reports.values()
+            ])
+        for key in ("mean", "p50", "p90"):
+            row(f"turns {key}", [
+                f"{report['game_turns'][key]:.1f}" for report in reports.values()
+            ])
+        row("stalled", [str(report["stalled"]) for report in reports.values()])
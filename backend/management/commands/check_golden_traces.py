@@ -0,0 +1,45 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from engine.traces import replay_traces
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the golden traces on the current engine, on every core, "
+        "and fail on the first step of any game that plays differently."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=str(settings.GOLDEN_TRACES))
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--show", type=int, default=5,
+                            help="divergences printed in full")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            replayed, divergences = replay_traces(
+                options["file"], options["workers"]
+            )
+        except FileNotFoundError:
+            raise CommandError(
+                f"No traces in {options['file']}, "
+                "run python manage.py record_golden_traces first"
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Replayed {replayed} traces in {elapsed:.1f}s "
+            f"({replayed / elapsed:.0f} games/s)."
+        )
+        for divergence in divergences[:options["show"]]:
+            self.stdout.write(json.dumps(divergence))
+        if divergences:
+            raise CommandError(
+                f"{len(divergences)} of {replayed} games diverged "
+                "from their golden trace."
+            )
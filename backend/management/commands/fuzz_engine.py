@@ -0,0 +1,75 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from engine.fuzz import fuzz_reproduce, run_fuzz
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive seeded games with random legal and illegal moves on every "
+        "core, checking the engine's invariants after each step. Failing "
+        "games are shrunk to minimal reproducers and written to --output; "
+        "--reproduce plays such a file again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=2000)
+        parser.add_argument("--steps", type=int, default=400,
+                            help="moves and turn ends per game")
+        parser.add_argument("--players", type=int, default=4)
+        parser.add_argument("--seed", type=int, default=0,
+                            help="seed of the first game")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--output",
+                            default=str(settings.BASE_DIR / "data" / "fuzz_failures.json"))
+        parser.add_argument("--reproduce", metavar="FILE",
+                            help="play the failures of a previous run again")
+
+    def handle(self, *args, **options):
+        if options["reproduce"]:
+            return self.reproduce(options["reproduce"])
+
+        started = time.perf_counter()
+        stats = run_fuzz(
+            options["games"], options["players"], seed=options["seed"],
+            steps=options["steps"], workers=options["workers"],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{stats.games} games, {stats.steps} steps "
+            f"({stats.refused} refused) in {elapsed:.1f}s, "
+            f"{stats.steps / elapsed:.0f} steps/s."
+        )
+        if not stats.failures:
+            return
+
+        for failure in stats.failures:
+            self.stdout.write(
+                f"seed {failure['seed']}: {failure['message']} "
+                f"({len(failure['steps'])} steps)"
+            )
+        output = Path(options["output"])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(stats.failures, indent=2))
+        raise CommandError(
+            f"{len(stats.failures)} failing games, reproducers in {output}"
+        )
+
+    def reproduce(self, path):
+        failures = json.loads(Path(path).read_text())
+        still_failing = 0
+        for failure in failures:
+            result = fuzz_reproduce(failure)
+            if result is None:
+                self.stdout.write(f"seed {failure['seed']}: fixed")
+                continue
+            still_failing += 1
+            index, message = result
+            self.stdout.write(f"seed {failure['seed']}: step {index}, {message}")
+        if still_failing:
+            raise CommandError(f"{still_failing} of {len(failures)} still fail")
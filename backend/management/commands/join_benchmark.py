@@ -0,0 +1,120 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.join_service import join_game
+from backend.models import Game, Player
+from virus_the_game.measurement import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Joins/sec and latency (ms) of many simultaneous POST "
+        "/api/games/{id}/ through the ASGI application. Run it with "
+        "ASYNC_API=True and ASYNC_API=False to compare the two paths. "
+        "--service calls the join service directly instead and counts "
+        "its SQL statements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, nargs="+",
+                            default=[1, 10, 50, 200],
+                            help="simultaneous joins per measurement")
+        parser.add_argument("--rounds", type=int, default=5,
+                            help="bursts measured per concurrency level")
+        parser.add_argument("--service", action="store_true",
+                            help="sequential joins through join_game()")
+        parser.add_argument("--joins", type=int, default=500,
+                            help="joins per kind with --service")
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        try:
+            if options["service"]:
+                self.measure_service(run_id, options["joins"])
+                return
+            mode = "async" if settings.ASYNC_API else "sync (DRF)"
+            self.stdout.write(f"API path: {mode}")
+            self.stdout.write(
+                "concurrency | joins/s |   p50 |   p95 | errors"
+            )
+            for concurrency in options["concurrency"]:
+                self.stdout.write(asyncio.run(
+                    self.measure(run_id, concurrency, options["rounds"])
+                ))
+        finally:
+            Game.objects.filter(
+                players__nickname__startswith=f"bench-{run_id}-"
+            ).delete()
+            for player in Player.objects.filter(
+                    nickname__startswith=f"bench-{run_id}-"):
+                # one by one, so the leaderboard hears about it
+                player.delete()
+
+    async def measure(self, run_id, concurrency, rounds):
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        async with httpx.AsyncClient(
+                transport=transport, base_url="http://localhost/api/"
+        ) as client:
+            latencies, errors = [], 0
+
+            async def join(game_id, nickname):
+                started = time.perf_counter()
+                response = await client.post(
+                    f"games/{game_id}/", data={"player_name": nickname}
+                )
+                latencies.append(time.perf_counter() - started)
+                return response.status_code == 200
+
+            started = time.perf_counter()
+            for round_number in range(rounds):
+                response = await client.post("games/")
+                game_id = response.json()["game_id"]
+                results = await asyncio.gather(*(
+                    join(game_id, f"bench-{run_id}-{concurrency}-"
+                                  f"{round_number}-{i}")
+                    for i in range(concurrency)
+                ))
+                errors += results.count(False)
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency in latencies]
+        return (
+            f"{concurrency:11d} | {len(latencies) / elapsed:7.0f} "
+            f"| {percentile(latencies, 0.5):5.1f} "
+            f"| {percentile(latencies, 0.95):5.1f} | {errors}"
+        )
+
+    def measure_service(self, run_id, joins):
+        """Joins/sec and statements per join, for each kind of join."""
+        self.stdout.write(
+            f"database: {connection.vendor}, {joins} joins per kind"
+        )
+        self.stdout.write("kind      | joins/s | statements/join")
+        game = Game.objects.create()
+        nicknames = [f"bench-{run_id}-{i}" for i in range(joins)]
+        kinds = (
+            # nobody by that nickname yet
+            ("new", lambda i: join_game(game.id, nicknames[i])),
+            # the same players seated again
+            ("returning", lambda i: join_game(game.id, nicknames[i])),
+            # retries of one request, only the first is not in the cache
+            ("retry", lambda i: join_game(game.id, nicknames[i], run_id)),
+        )
+        for kind, join in kinds:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for i in range(joins):
+                    join(i)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{kind:9s} | {joins / elapsed:7.0f} "
+                f"| {len(queries) / joins:.2f}"
+            )
@@ -0,0 +1,76 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from virus_the_game.loadtest import LoadGenerator, use_in_memory_backends
+
+
+COLUMNS = [
+    ("rooms", "rooms", "{:d}"),
+    ("players", "players", "{:d}"),
+    ("connect p50", "connect_p50_ms", "{:.1f}"),
+    ("connect p95", "connect_p95_ms", "{:.1f}"),
+    ("moves", "moves", "{:d}"),
+    ("move p50", "move_p50_ms", "{:.1f}"),
+    ("move p95", "move_p95_ms", "{:.1f}"),
+    ("move p99", "move_p99_ms", "{:.1f}"),
+    ("msg/s", "messages_per_sec", "{:.0f}"),
+    ("rss MB", "rss_mb", "{:.1f}"),
+    ("+kB/room", "rss_growth_per_room_kb", "{:.0f}"),
+    ("games over", "games_over", "{:d}"),
+    ("errors", "errors", "{:d}"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Ramp simulated rooms against the websocket game flow and report "
+        "connect latency, move round-trips (ms), messages/sec and RSS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=10)
+        parser.add_argument("--players", type=int, default=4,
+                            help="simulated players per room")
+        parser.add_argument("--steps", type=int, default=5,
+                            help="number of ramp increments")
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="seconds of play measured per step")
+        parser.add_argument("--timeout", type=float, default=5.0,
+                            help="seconds to wait for a reply")
+        parser.add_argument("--url", default=None,
+                            help="ws://host:port of a running server, "
+                                 "the application runs in-process if omitted")
+        parser.add_argument("--in-memory", action="store_true",
+                            help="use the in-process channel layer and "
+                                 "Redis stand-in instead of Redis")
+
+    def handle(self, *args, **options):
+        if options["in_memory"]:
+            if options["url"]:
+                raise CommandError("--in-memory only works in-process")
+            use_in_memory_backends()
+        if options["players"] < 2:
+            raise CommandError("A game needs at least 2 players")
+
+        generator = LoadGenerator(
+            rooms=options["rooms"],
+            players_per_room=options["players"],
+            steps=options["steps"],
+            step_duration=options["duration"],
+            url=options["url"],
+            timeout=options["timeout"],
+        )
+        reports = asyncio.run(generator.run())
+
+        self.stdout.write(" | ".join(title for title, _, _ in COLUMNS))
+        for report in reports:
+            self.stdout.write(" | ".join(
+                fmt.format(report[key]).rjust(len(title))
+                for title, key, fmt in COLUMNS
+            ))
+        if not options["url"]:
+            self.stdout.write(
+                "RSS includes the in-process server and all clients, "
+                "+kB/room is its growth since before the first room."
+            )
@@ -0,0 +1,73 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.matchmaking import (
+    MAX_ROOM_SIZE, MemoryQueue, RedisQueue, band, pick
+)
+from virus_the_game.measurement import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Microseconds per matchmaking attempt (queue insert, neighbour "
+        "lookup and room pick) at growing queue depths, on the in-memory "
+        "queue and on Redis, to check the cost grows with log(depth) only. "
+        "Redis keys use the matchmaking:bench prefix and are deleted after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depths", type=int, nargs="+",
+                            default=[1000, 10000, 100000],
+                            help="players waiting in the queue")
+        parser.add_argument("--samples", type=int, default=1000,
+                            help="attempts measured per depth")
+        parser.add_argument("--max-score", type=int, default=1000,
+                            help="total_score of the waiting players is "
+                                 "spread over 0 .. max-score")
+
+    def handle(self, *args, **options):
+        queues = [("memory", MemoryQueue())]
+        if settings.MATCHMAKING_REDIS \
+                and not settings.REDIS_URL.startswith('memory'):
+            queues.append((
+                "redis", RedisQueue(settings.REDIS_URL, "matchmaking:bench")
+            ))
+
+        self.stdout.write("queue  |   depth |  p50 us |  p99 us")
+        for name, queue in queues:
+            try:
+                self.measure(name, queue, options)
+            finally:
+                if isinstance(queue, RedisQueue):
+                    queue.clear()
+
+    def measure(self, name, queue, options):
+        rng = random.Random(0)
+        max_score = options["max_score"]
+        filled = 0
+        for depth in sorted(options["depths"]):
+            while filled < depth:
+                queue.add(f"bench-{filled}", rng.randint(0, max_score), 0)
+                filled += 1
+
+            timings = []
+            for sample in range(options["samples"]):
+                nickname = f"probe-{sample}"
+                score = rng.randint(0, max_score)
+                started = time.perf_counter()
+                queue.add(nickname, score, started)
+                pick(score, 0, queue.neighbours(
+                    nickname, score, band(0), MAX_ROOM_SIZE - 1
+                ))
+                timings.append(time.perf_counter() - started)
+                # leaves the depth as it is for the next attempt
+                queue.remove(nickname)
+
+            timings = [timing * 1e6 for timing in timings]
+            self.stdout.write(
+                f"{name:6} | {depth:7d} | {percentile(timings, 0.5):7.1f} "
+                f"| {percentile(timings, 0.99):7.1f}"
+            )
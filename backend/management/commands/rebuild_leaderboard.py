@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Reload the Redis leaderboard from the players in the database."
+
+    def handle(self, *args, **options):
+        if leaderboard.redis_leaderboard is None:
+            raise CommandError(
+                "The leaderboard is served from the database, "
+                "LEADERBOARD_REDIS is off or REDIS_URL is memory://"
+            )
+        count = leaderboard.redis_leaderboard.rebuild()
+        self.stdout.write(f"Leaderboard rebuilt with {count} players.")
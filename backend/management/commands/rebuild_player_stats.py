@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+
+from backend.models import Game, Player, PlayerStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the stats of players from the games in the database. "
+        "By default only players without a stats row (from before the "
+        "table existed) are counted; --all recounts everybody, which "
+        "loses the games already moved out by archive_games."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="recount players that have stats too")
+        parser.add_argument("--chunk-size", type=int, default=1000,
+                            help="players counted per transaction")
+
+    def handle(self, *args, **options):
+        players = Player.objects.order_by("id")
+        if not options["all"]:
+            players = players.filter(stats__isnull=True)
+        ids = list(players.values_list("id", flat=True))
+
+        finished = Q(games__finished=True, games__end_time__isnull=False)
+        for start in range(0, len(ids), options["chunk_size"]):
+            chunk = ids[start:start + options["chunk_size"]]
+            # wins counted apart, joining both relations would multiply
+            # the rows the durations are summed over
+            wins = dict(Game.objects.filter(winner_id__in=chunk).values(
+                "winner_id"
+            ).annotate(won=Count("id")).values_list("winner_id", "won"))
+            rows = Player.objects.filter(id__in=chunk).annotate(
+                played=Count("games"),
+                finished=Count("games", filter=finished),
+                duration=Sum(ExpressionWrapper(
+                    F("games__end_time") - F("games__start_time"),
+                    output_field=DurationField(),
+                ), filter=finished),
+            ).values_list("id", "played", "finished", "duration")
+            with transaction.atomic():
+                PlayerStats.objects.filter(player_id__in=chunk).delete()
+                PlayerStats.objects.bulk_create(
+                    PlayerStats(
+                        player_id=player_id,
+                        games_played=played,
+                        games_finished=finished_count,
+                        games_won=wins.get(player_id, 0),
+                        total_game_seconds=(
+                            duration.total_seconds() if duration else 0
+                        ),
+                    )
+                    for player_id, played, finished_count, duration in rows
+                )
+        self.stdout.write(f"Stats recounted for {len(ids)} players.")
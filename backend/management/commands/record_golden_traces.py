@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from engine.traces import record_traces, write_traces
+
+
+class Command(BaseCommand):
+    help = (
+        "Record simulated games (seed, moves, the engine's answers and "
+        "state digests) as the golden traces check_golden_traces replays. "
+        "Only re-record after a deliberate change of the engine's rules."
+    )
+
+    def add_arguments(self, parser):
+        # the versioned fixture stays small enough to review, record a
+        # larger corpus with --count and --output for a wider check
+        parser.add_argument("--count", type=int, default=10,
+                            help="games recorded per number of players")
+        parser.add_argument("--players", type=int, nargs="+",
+                            default=[2, 3, 4])
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--output", default=str(settings.GOLDEN_TRACES))
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        traces = []
+        for players in options["players"]:
+            # distinct seeds for every number of players
+            first = players * 1_000_000
+            traces += record_traces(
+                range(first, first + options["count"]), players,
+                workers=options["workers"],
+            )
+        write_traces(options["output"], traces)
+        self.stdout.write(
+            f"Recorded {len(traces)} traces "
+            f"({sum(len(t['steps']) for t in traces)} steps) to "
+            f"{options['output']} in {time.perf_counter() - started:.1f}s."
+        )
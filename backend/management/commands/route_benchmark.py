@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from virus_the_game.consumers import PLAYER_ROUTES, HOST_ROUTES
+from virus_the_game.message_router import InvalidMessage
+
+
+# a representative mix of player frames, as the frontend sends them
+FRAMES = [
+    {"sender": "frontend", "header": "card_play",
+     "data": {"action": "organ", "card_id": 12}},
+    {"sender": "frontend", "header": "card_play",
+     "data": {"action": "attack", "card_id": 40, "target_id": 2,
+              "target_stack": 0}},
+    {"sender": "frontend", "header": "card_play",
+     "data": {"action": "heal", "card_id": 55, "target_id": 1}},
+    {"sender": "frontend", "header": "card_play",
+     "data": {"action": "special", "card_id": 63, "card_type": "thieft",
+              "target_id": 3, "target_stack": 1}},
+    {"sender": "frontend", "header": "card_play",
+     "data": {"action": "discard", "card_id": 7}},
+    {"sender": "frontend", "header": "turn_end",
+     "data": {"action": "end_turn"}},
+    {"sender": "frontend", "header": "connection",
+     "data": {"action": "resume", "last_seq": 41}},
+    {"sender": "frontend", "header": "unknown", "data": {}},
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Frames/sec through the websocket routing layer: JSON decoding, "
+        "route lookup, validation and payload extraction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frames", type=int, default=200000,
+                            help="frames routed per measurement")
+
+    def handle(self, *args, **options):
+        texts = [json.dumps(frame) for frame in FRAMES]
+        count = options["frames"]
+
+        self.stdout.write(f"{'layer':<22} | {'frames/s':>10} | rejected")
+        for name, router, hop in (
+                ("player receive", PLAYER_ROUTES, False),
+                ("player -> host", HOST_ROUTES, True)):
+            rejected = 0
+            started = time.perf_counter()
+            for i in range(count):
+                message = json.loads(texts[i % len(texts)])
+                sender = "player" if hop else message["sender"]
+                try:
+                    router.route(sender, message["header"], message["data"])
+                except InvalidMessage:
+                    rejected += 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name:<22} | {count / elapsed:10.0f} | {rejected}"
+            )
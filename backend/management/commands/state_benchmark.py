@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from backend.leaderboard import remove_player
+from backend.models import Game, Player
+from backend.state_cache import invalidate_game_state
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests/sec and queries/request of /api/games/{id}/state/ "
+        "without the cache, from the cache and answered with 304. "
+        "Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--players", type=int, default=6,
+                            help="players in the benchmarked game")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            players = self.benchmark(options["requests"], options["players"])
+            transaction.set_rollback(True)
+        # the rollback does not reach the Redis leaderboard
+        for player in players:
+            remove_player(player)
+
+    def benchmark(self, count, player_count):
+        players = [
+            Player.objects.create(nickname=f"state-benchmark-{i}")
+            for i in range(player_count)
+        ]
+        game = Game.objects.create(winner=players[0])
+        game.players.add(*players)
+        url = f"/api/games/{game.id}/state/"
+        client = Client(HTTP_HOST="localhost")
+        etag = client.get(url)["ETag"]
+
+        self.stdout.write(f"{'mode':<10} | {'req/s':>8} | queries/req")
+        for mode in ("uncached", "cached", "304"):
+            headers = {"HTTP_IF_NONE_MATCH": etag} if mode == "304" else {}
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(count):
+                    if mode == "uncached":
+                        invalidate_game_state(game.id)
+                    client.get(url, **headers)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{mode:<10} | {count / elapsed:8.0f} "
+                f"| {len(queries) / count:.1f}"
+            )
+        invalidate_game_state(game.id)
+        return players
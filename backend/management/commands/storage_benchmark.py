@@ -0,0 +1,108 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from backend.models import Game, Player
+from virus_the_game.measurement import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "API requests/sec of whole games (create, joins, state polls, "
+        "finish) played concurrently through the ASGI application, on the "
+        "configured database profile. Run it without DATABASE_URL for the "
+        "SQLite profile and with it for the server database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, nargs="+",
+                            default=[1, 10, 50],
+                            help="games played simultaneously")
+        parser.add_argument("--players", type=int, default=4,
+                            help="players joining each game")
+        parser.add_argument("--polls", type=int, default=5,
+                            help="state polls per player")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"profile: {self.describe()}")
+        self.stdout.write("games | requests/s |   p50 |   p95 | errors")
+        run_id = uuid.uuid4().hex[:8]
+        try:
+            for games in options["games"]:
+                self.stdout.write(asyncio.run(self.measure(
+                    run_id, games, options["players"], options["polls"]
+                )))
+        finally:
+            Game.objects.filter(
+                players__nickname__startswith=f"bench-{run_id}-"
+            ).delete()
+            for player in Player.objects.filter(
+                    nickname__startswith=f"bench-{run_id}-"):
+                # one by one, so the leaderboard hears about it
+                player.delete()
+
+    def describe(self):
+        database = connection.settings_dict
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                pragmas = []
+                for pragma in ("journal_mode", "synchronous", "busy_timeout"):
+                    cursor.execute(f"PRAGMA {pragma}")
+                    pragmas.append(f"{pragma}={cursor.fetchone()[0]}")
+            return f"sqlite {', '.join(pragmas)}"
+        pool = database.get("OPTIONS", {}).get("pool")
+        if pool:
+            return (f"{connection.vendor} pool "
+                    f"{pool['min_size']}-{pool['max_size']}")
+        return (f"{connection.vendor} conn_max_age="
+                f"{database['CONN_MAX_AGE']}")
+
+    async def measure(self, run_id, games, players, polls):
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        async with httpx.AsyncClient(
+                transport=transport, base_url="http://localhost/api/"
+        ) as client:
+            latencies, errors = [], 0
+
+            async def request(method, url, **kwargs):
+                nonlocal errors
+                started = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+                return response
+
+            async def seat(game_id, nickname):
+                response = await request(
+                    "POST", f"games/{game_id}/", data={"player_name": nickname}
+                )
+                for _ in range(polls):
+                    await request("GET", f"games/{game_id}/state/")
+                return response.json().get("player_id")
+
+            async def play(game_number):
+                response = await request("POST", "games/")
+                game_id = response.json()["game_id"]
+                player_ids = await asyncio.gather(*(
+                    seat(game_id, f"bench-{run_id}-{games}-{game_number}-{i}")
+                    for i in range(players)
+                ))
+                winner = {"winner_id": player_ids[0]} if player_ids[0] else {}
+                await request("PATCH", f"games/{game_id}/", data=winner)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(play(i) for i in range(games)))
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency in latencies]
+        return (
+            f"{games:5d} | {len(latencies) / elapsed:10.0f} "
+            f"| {percentile(latencies, 0.5):5.1f} "
+            f"| {percentile(latencies, 0.95):5.1f} | {errors}"
+        )
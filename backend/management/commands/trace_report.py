@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from virus_the_game.tracing import summarize_traces
+
+
+class Command(BaseCommand):
+    help = "Per-hop latency breakdown (ms) of the sampled move traces."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=str(settings.TRACE_FILE),
+                            help="trace file written by the consumers")
+
+    def handle(self, *args, **options):
+        try:
+            summary = summarize_traces(options["file"])
+        except FileNotFoundError:
+            raise CommandError(
+                f"No traces in {options['file']}, "
+                "is TRACE_SAMPLE_RATE above 0?"
+            )
+
+        width = max((len(hop) for hop in summary), default=0)
+        self.stdout.write(
+            f"{'hop'.ljust(width)} | count |   mean |    p50 |    p95 |    p99"
+        )
+        for hop, row in summary.items():
+            self.stdout.write(
+                f"{hop.ljust(width)} | {row['count']:5d} "
+                f"| {row['mean_ms']:6.2f} | {row['p50_ms']:6.2f} "
+                f"| {row['p95_ms']:6.2f} | {row['p99_ms']:6.2f}"
+            )
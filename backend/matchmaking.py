@@ -0,0 +1,407 @@
+"""
+Matchmaking queue behind the "auto-match" button.
+
+Waiting players are kept ordered by total_score, in a Redis sorted set
+(member = nickname) or, when Redis is disabled or unreachable, in a list
+kept sorted with bisect in the worker's memory. The in-memory queue only
+matches players of the same worker.
+
+On an enqueue or a retry (both POSTs), the player's nearest neighbours in
+score are read from that order (O(log n) plus a handful of entries). A room is
+formed when MATCH_ROOM_SIZE players fit in the player's band. The band
+is MATCH_BAND points on each side and widens by MATCH_BAND_GROWTH per
+second of waiting, up to MATCH_BAND_MAX. After MATCH_SMALL_ROOM_AFTER
+seconds, a room of 2 or more is started rather than waiting for a full
+one.
+
+The matched players are taken out of the queue at once, a game is
+created like GameViewSet.create does and every player is seated through
+join_game. Each player's seat (player id, token) is kept for
+MATCH_RESULT_TTL seconds for the ones still polling. A poll (GET) only
+reads that seat or the waiting state, it never matches.
+"""
+import bisect
+import json
+import threading
+import time
+from collections import deque
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from virus_the_game.measurement import percentile
+
+from .join_service import join_game
+from .models import Game, Player
+
+MAX_ROOM_SIZE = 6
+WAIT_SAMPLES = 1000  # latest times to match kept for the percentiles
+
+
+class NotQueued(LookupError):
+    pass
+
+
+def band(waited):
+    """Score distance accepted after waiting `waited` seconds."""
+    return min(settings.MATCH_BAND + settings.MATCH_BAND_GROWTH * waited,
+               settings.MATCH_BAND_MAX)
+
+
+def pick(score, waited, neighbours):
+    """
+    Choose the room of a player among its neighbours within the band.
+
+    Args:
+        neighbours: (nickname, score) of the other waiting players
+
+    Returns:
+        Nicknames of the players to match it with, or None to keep waiting
+    """
+    nearest = sorted(neighbours, key=lambda n: abs(n[1] - score))
+    size = min(max(settings.MATCH_ROOM_SIZE, 2), MAX_ROOM_SIZE)
+    if len(nearest) + 1 >= size:
+        return [nickname for nickname, _ in nearest[:size - 1]]
+    if nearest and waited >= settings.MATCH_SMALL_ROOM_AFTER:
+        return [nickname for nickname, _ in nearest]
+    return None
+
+
+# ----------------- Redis ----------------- #
+
+
+class RedisQueue:
+    def __init__(self, url, prefix="matchmaking"):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.key = f"{prefix}:queue"  # nickname -> total_score
+        self.since_key = f"{prefix}:since"  # nickname -> enqueue time
+        self.match_key = f"{prefix}:match"
+        self.waits_key = f"{prefix}:waits"
+        self.matched_key = f"{prefix}:matched"
+
+    def add(self, nickname, score, since):
+        """
+        Queue the player, keeping its first enqueue time, and forget its
+        previous match. Returns the enqueue time.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(f"{self.match_key}:{nickname}")
+        pipe.zadd(self.key, {nickname: score})
+        pipe.hsetnx(self.since_key, nickname, since)
+        pipe.hget(self.since_key, nickname)
+        return float(pipe.execute()[-1])
+
+    def entry(self, nickname):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zscore(self.key, nickname)
+        pipe.hget(self.since_key, nickname)
+        score, since = pipe.execute()
+        if score is None or since is None:
+            return None
+        return int(score), float(since)
+
+    def neighbours(self, nickname, score, distance, count):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrevrangebyscore(self.key, score, score - distance,
+                              start=0, num=count + 1, withscores=True)
+        pipe.zrangebyscore(self.key, f"({score}", score + distance,
+                           start=0, num=count, withscores=True)
+        below, above = pipe.execute()
+        return [(name, int(value)) for name, value in below + above
+                if name != nickname]
+
+    def claim(self, players):
+        """
+        Take the players (nickname -> score) out of the queue, all or none.
+
+        Returns:
+            nickname -> enqueue time, None when one of them was gone
+        """
+        names = list(players)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hmget(self.since_key, names)
+        for name in names:
+            pipe.zrem(self.key, name)
+        pipe.hdel(self.since_key, *names)
+        since, *removed = pipe.execute()[:-1]
+        if all(removed):
+            return dict(zip(names, map(float, since)))
+        # matched by a concurrent request, put back the ones taken here
+        self.restore({
+            name: (players[name], float(started))
+            for name, started, taken in zip(names, since, removed)
+            if taken and started is not None
+        })
+        return None
+
+    def restore(self, players):
+        """Queue players again with their enqueue times (nickname -> (score, since))."""
+        if players:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.zadd(self.key, {name: score for name, (score, _) in players.items()})
+            pipe.hset(self.since_key, mapping={
+                name: since for name, (_, since) in players.items()
+            })
+            pipe.execute()
+
+    def remove(self, nickname):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zrem(self.key, nickname)
+        pipe.hdel(self.since_key, nickname)
+        return bool(pipe.execute()[0])
+
+    def store_match(self, seats, waits):
+        pipe = self.redis.pipeline(transaction=False)
+        for nickname, seat in seats.items():
+            pipe.set(f"{self.match_key}:{nickname}", json.dumps(seat),
+                     ex=settings.MATCH_RESULT_TTL)
+        pipe.lpush(self.waits_key, *waits)
+        pipe.ltrim(self.waits_key, 0, WAIT_SAMPLES - 1)
+        pipe.incrby(self.matched_key, len(seats))
+        pipe.execute()
+
+    def get_match(self, nickname):
+        seat = self.redis.get(f"{self.match_key}:{nickname}")
+        return json.loads(seat) if seat else None
+
+    def stats(self):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(self.key)
+        pipe.get(self.matched_key)
+        pipe.lrange(self.waits_key, 0, -1)
+        depth, matched, waits = pipe.execute()
+        return depth, int(matched or 0), [float(wait) for wait in waits]
+
+    def clear(self):
+        self.redis.delete(self.key, self.since_key, self.waits_key,
+                          self.matched_key)
+
+
+# ----------------- Memory ----------------- #
+
+
+class MemoryQueue:
+    """Same operations on a bisect-sorted list, for a single worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []  # (score, nickname), sorted
+        self.players = {}  # nickname -> (score, since)
+        self.matches = {}  # nickname -> (expiry, seat)
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.matched = 0
+
+    def add(self, nickname, score, since):
+        with self.lock:
+            self.matches.pop(nickname, None)
+            if nickname in self.players:
+                old_score, since = self.players[nickname]
+                self._drop(nickname, old_score)
+            bisect.insort(self.order, (score, nickname))
+            self.players[nickname] = (score, since)
+            return since
+
+    def _drop(self, nickname, score):
+        index = bisect.bisect_left(self.order, (score, nickname))
+        del self.order[index]
+
+    def entry(self, nickname):
+        return self.players.get(nickname)
+
+    def neighbours(self, nickname, score, distance, count):
+        with self.lock:
+            index = bisect.bisect_left(self.order, (score, nickname))
+            below = self.order[max(0, index - count):index]
+            above = self.order[index:index + count + 1]
+        return [(name, value) for value, name in below[::-1] + above
+                if name != nickname and abs(value - score) <= distance]
+
+    def claim(self, players):
+        with self.lock:
+            if any(name not in self.players for name in players):
+                return None
+            claimed = {}
+            for name in players:
+                score, since = self.players.pop(name)
+                self._drop(name, score)
+                claimed[name] = since
+            return claimed
+
+    def restore(self, players):
+        for name, (score, since) in players.items():
+            self.add(name, score, since)
+
+    def remove(self, nickname):
+        with self.lock:
+            if nickname not in self.players:
+                return False
+            score, _ = self.players.pop(nickname)
+            self._drop(nickname, score)
+            return True
+
+    def store_match(self, seats, waits):
+        expiry = time.time() + settings.MATCH_RESULT_TTL
+        with self.lock:
+            for nickname, seat in seats.items():
+                self.matches[nickname] = (expiry, seat)
+            self.waits.extendleft(waits)
+            self.matched += len(seats)
+            # drop the seats nobody came back for
+            now = time.time()
+            for nickname in [n for n, (e, _) in self.matches.items() if e < now]:
+                del self.matches[nickname]
+
+    def get_match(self, nickname):
+        expiry, seat = self.matches.get(nickname, (0, None))
+        return seat if expiry >= time.time() else None
+
+    def stats(self):
+        return len(self.order), self.matched, list(self.waits)
+
+
+# ----------------- Service ----------------- #
+
+
+memory_queue = MemoryQueue()
+redis_queue = None
+if settings.MATCHMAKING_REDIS and not settings.REDIS_URL.startswith('memory'):
+    redis_queue = RedisQueue(settings.REDIS_URL)
+
+
+def _queue(method, *args):
+    """Use Redis when enabled, the worker's memory when not or on failure."""
+    if redis_queue:
+        try:
+            return getattr(redis_queue, method)(*args)
+        except redis.RedisError as e:
+            print(f"Matchmaking falling back to memory: {e!r}")
+    return getattr(memory_queue, method)(*args)
+
+
+def waiting(score, waited):
+    return {
+        "state": "waiting",
+        "total_score": score,
+        "waited": round(waited, 1),
+        "band": round(band(waited), 1),
+    }
+
+
+def enqueue(nickname):
+    """
+    Queue the player (again) and match it right away if its band allows.
+
+    Returns:
+        The player's "waiting" or "matched" state
+    """
+    score = Player.objects.filter(nickname=nickname) \
+        .values_list("total_score", flat=True).first() or 0
+    now = time.time()
+    since = _queue("add", nickname, score, now)
+    return find_room(nickname, score, now - since)
+
+
+def poll(nickname):
+    """
+    The player's match or waiting state, read only.
+
+    Raises:
+        NotQueued: neither waiting nor recently matched
+    """
+    seat, entry = _seat_or_entry(nickname)
+    if seat is not None:
+        return seat
+    score, since = entry
+    return waiting(score, time.time() - since)
+
+
+def retry(nickname):
+    """
+    Try to match a waiting player again, with its band widened by now.
+
+    Raises:
+        NotQueued: neither waiting nor recently matched
+    """
+    seat, entry = _seat_or_entry(nickname)
+    if seat is not None:
+        return seat
+    score, since = entry
+    return find_room(nickname, score, time.time() - since)
+
+
+def _seat_or_entry(nickname):
+    seat = _queue("get_match", nickname)
+    if seat is not None:
+        return seat, None
+    entry = _queue("entry", nickname)
+    if entry is None:
+        raise NotQueued("Player is not in the matchmaking queue")
+    return None, entry
+
+
+def leave(nickname):
+    """Returns: whether the player was waiting"""
+    return _queue("remove", nickname)
+
+
+def find_room(nickname, score, waited):
+    neighbours = _queue("neighbours", nickname, score, band(waited),
+                        MAX_ROOM_SIZE - 1)
+    others = pick(score, waited, neighbours)
+    if others is None:
+        return waiting(score, waited)
+
+    scores = dict(neighbours)
+    players = {nickname: score, **{name: scores[name] for name in others}}
+    since = _queue("claim", players)
+    if since is None:
+        # some were matched meanwhile, the next retry tries again
+        return waiting(score, waited)
+    try:
+        seats = start_game(list(players))
+    except Exception:
+        _queue("restore", {
+            name: (players[name], since[name]) for name in players
+        })
+        raise
+    now = time.time()
+    _queue("store_match", seats, [now - started for started in since.values()])
+    return seats[nickname]
+
+
+def start_game(nicknames):
+    """
+    Create the game of a match and seat its players.
+
+    Returns:
+        nickname -> "matched" state with its game, player id and token
+    """
+    with transaction.atomic():
+        # as GameViewSet.create
+        game = Game.objects.create()
+        joined = [join_game(game.id, nickname) for nickname in nicknames]
+    return {
+        nickname: {
+            "state": "matched",
+            "game_id": game.id,
+            "player_id": response["player_id"],
+            "token": response["token"],
+            "players": nicknames,
+        }
+        for nickname, response in zip(nicknames, joined)
+    }
+
+
+def matchmaking_stats():
+    depth, matched, waits = _queue("stats")
+    return {
+        "queue_depth": depth,
+        "matched": matched,
+        "time_to_match": {
+            "samples": len(waits),
+            "p50": percentile(waits, 0.5),
+            "p90": percentile(waits, 0.9),
+            "p99": percentile(waits, 0.99),
+        },
+    }
@@ -15,6 +15,15 @@ class Game(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # finished games by age, for archive_games
+            models.Index(
+                fields=["finished", "end_time"],
+                name="game_archive_idx",
+            ),
+        ]
+
 # # - to be deleted
 # class GameState(models.Model):
 #     game_id = models.ForeignKey(Game, on_delete=models.RESTRICT)
@@ -28,6 +37,40 @@ class Player(models.Model):
     nickname = models.CharField(max_length=100, unique=True)
     total_score = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # leaderboard order, also used for its keyset pagination
+            models.Index(
+                fields=["-total_score", "nickname"],
+                name="player_leaderboard_idx",
+            ),
+        ]
+
+
+class PlayerStats(models.Model):
+    """
+    Per-player aggregates, kept up to date by backend/stats.py in the
+    transactions that seat players and finish games.
+    """
+    player = models.OneToOneField(Player, on_delete=models.CASCADE, related_name="stats")
+    games_played = models.IntegerField(default=0)  # games joined
+    games_finished = models.IntegerField(default=0)
+    games_won = models.IntegerField(default=0)
+    total_game_seconds = models.FloatField(default=0)
+
+    @property
+    def win_rate(self):
+        if not self.games_finished:
+            return 0.0
+        return self.games_won / self.games_finished
+
+    @property
+    def average_game_seconds(self):
+        if not self.games_finished:
+            return 0.0
+        return self.total_game_seconds / self.games_finished
+
+
 class PlayerToken(models.Model):
     player = models.OneToOneField(Player, on_delete=models.CASCADE, related_name="token")
     value = models.CharField(max_length=64, unique=True)
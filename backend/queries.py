@@ -1,8 +1,13 @@
-from time import timezone
-from models import Player, Game
-from django.db import DatabaseError, IntegrityError, OperationalError
+from django.utils import timezone
+from django.db import DatabaseError, IntegrityError, OperationalError, transaction
+from django.db.models import F
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 
+from .leaderboard import sync_players
+from .models import Player, Game
+from .state_cache import invalidate_game_state
+from .stats import Membership, finish_game as save_finished_game, record_seat
+
 # -------- PLAYER QUERIES -------- #
 
 
@@ -18,12 +23,19 @@ def create_player(nickname: str) -> tuple[Player | None, DatabaseError | None]:
 
 def update_player_score(player_id: int, score: int) -> DatabaseError | None:
     try:
-        player = Player.objects.get(id=player_id)
-        player.total_score += score
-        player.save()
+        # incremented in the database, concurrent updates cannot be lost
+        updated = Player.objects.filter(id=player_id).update(
+            total_score=F("total_score") + score
+        )
+        if not updated:
+            return DatabaseError("Player does not exist")
+        sync_players([player_id])
+        # as the post_save signal .update() skips, cached game states
+        # show the player's total score
+        invalidate_game_state(*Membership.objects.filter(
+            player_id=player_id
+        ).values_list("game_id", flat=True))
         return None
-    except ObjectDoesNotExist:
-        return DatabaseError("Player does not exist")
     except (OperationalError, DatabaseError) as e:
         return e
 
@@ -54,9 +66,12 @@ def create_game() -> tuple[Game | None, DatabaseError | None]:
 
 def add_player_to_game(game_id: int, player_id: int) -> DatabaseError | None:
     try:
-        game = Game.objects.get(id=game_id)
-        game.players.add(player_id)
-        game.save()
+        with transaction.atomic():
+            _, seated = Membership.objects.get_or_create(
+                game_id=Game.objects.get(id=game_id).id, player_id=player_id
+            )
+            if seated:
+                record_seat(player_id)
         return None
     except ObjectDoesNotExist:
         return DatabaseError("Game or Player does not exist")
@@ -69,10 +84,9 @@ def finish_game(game_id: int, winner_id: int) -> DatabaseError | None:
         if not check_if_player_in_game(game_id, winner_id):
             return DatabaseError("Winner is not part of the game")
         game = Game.objects.get(id=game_id)
-        game.finished = True
         game.winner_id = winner_id
         game.end_time = timezone.now()
-        game.save()
+        save_finished_game(game)
         return None
     except ObjectDoesNotExist:
         return DatabaseError("Game or Player does not exist")
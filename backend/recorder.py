@@ -0,0 +1,238 @@
+"""
+Write-behind recorder for finished games.
+
+The host consumer hands a result record to submit(), which only puts it on
+a queue. A background thread appends the records to a local journal
+(fsynced), then writes them in one transaction per batch: each game is
+finished with an UPDATE conditional on finished=False, and the scores and
+player stats are raised with F() increments for the games that UPDATE
+changed only. A game finished meanwhile through the REST API, or by a
+replay of the same record, is skipped without counting it twice.
+
+Every worker process keeps its own journal, RESULT_JOURNAL suffixed with
+its pid, and empties it once its batch is committed. A starting recorder
+takes over the journals left by processes that are gone, so their
+records are written then.
+
+Record format:
+    {"game_id": 12, "winner_id": 3, "scores": {"3": 1}, "end_time": 1.7e9}
+"""
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .leaderboard import sync_players
+from .models import Game, Player
+from .state_cache import invalidate_game_state
+from .stats import record_finished
+
+
+class ResultRecorder:
+    """
+    Args:
+        journal_path: base name of the files holding the records not
+            committed yet, this process writes to it suffixed with its pid
+        batch_size: records written per transaction at most
+        flush_interval: seconds a record may wait for others to batch with
+    """
+
+    def __init__(self, journal_path, batch_size=100, flush_interval=1.0):
+        self.base_path = journal_path
+        self.journal_path = f"{journal_path}.{os.getpid()}"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.pending = self.read_journal()
+        self.recorded = 0
+        self.thread = threading.Thread(
+            target=self.run, name="result-recorder", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, record):
+        """Queue a finished game, never blocks the caller."""
+        self.queue.put(record)
+
+    def stop(self, timeout=10):
+        """Write everything queued and stop the thread."""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    # ----------------- journal ----------------- #
+
+    def read_journal(self):
+        """
+        This process's records, after taking over the journals left by
+        processes that are gone.
+        """
+        for path in self.orphaned_journals():
+            claim = f"{self.journal_path}.adopted"
+            try:
+                # only one of the recorders starting together gets it
+                os.rename(path, claim)
+            except FileNotFoundError:
+                continue
+            self.append_journal(load_journal(claim))
+            os.remove(claim)
+        return load_journal(self.journal_path)
+
+    def orphaned_journals(self):
+        # the unsuffixed journal is the one all processes used to share
+        paths = glob.glob(f"{glob.escape(self.base_path)}.*")
+        for path in [self.base_path, *paths]:
+            owner = path[len(self.base_path) + 1:].split(".")[0]
+            if not owner or owner.isdigit() and int(owner) != os.getpid() \
+                    and not process_alive(int(owner)):
+                yield path
+
+    def append_journal(self, records):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(self.journal_path, "a") as journal:
+            for record in records:
+                journal.write(json.dumps(record) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def clear_journal(self):
+        with open(self.journal_path, "w") as journal:
+            os.fsync(journal.fileno())
+
+    # ----------------- writer thread ----------------- #
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            incoming, stopping = self.collect()
+            if incoming:
+                self.append_journal(incoming)
+                self.pending.extend(incoming)
+            while self.pending:
+                batch = self.pending[:self.batch_size]
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    # replaying is safe, finished games are skipped
+                    print(f"Recording {len(batch)} results failed: {e!r}")
+                    # kept in the journal, retried with the next records
+                    time.sleep(self.flush_interval)
+                    break
+                del self.pending[:len(batch)]
+                self.recorded += len(batch)
+            if not self.pending:
+                self.clear_journal()
+        connection.close()
+
+    def collect(self):
+        """Wait for a record, then gather what arrives within the interval."""
+        records = []
+        timeout = None if not self.pending else self.flush_interval
+        deadline = None
+        while len(records) < self.batch_size:
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if record is None:
+                return records, True
+            records.append(record)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            timeout = max(0, deadline - time.monotonic())
+        return records, False
+
+    def write(self, records):
+        with transaction.atomic():
+            games = Game.objects.in_bulk(
+                [record["game_id"] for record in records]
+            )
+            # a winner deleted meanwhile must not fail the whole batch
+            known_players = set(Player.objects.filter(
+                id__in=[record.get("winner_id") for record in records]
+            ).values_list("id", flat=True))
+            finished, deltas = [], defaultdict(int)
+            for record in records:
+                game = games.get(record["game_id"])
+                if game is None or game.finished:
+                    continue
+                if record.get("winner_id") in known_players:
+                    game.winner_id = record["winner_id"]
+                game.end_time = datetime.fromtimestamp(
+                    record["end_time"], timezone.utc
+                )
+                # the row may have been finished since it was read
+                if not Game.objects.filter(pk=game.pk, finished=False).update(
+                        finished=True,
+                        winner_id=game.winner_id,
+                        end_time=game.end_time):
+                    continue
+                game.finished = True
+                finished.append(game)
+                for player_id, score in record.get("scores", {}).items():
+                    deltas[int(player_id)] += score
+
+            record_finished(finished)
+            # one UPDATE per distinct increment rather than per player
+            by_delta = defaultdict(list)
+            for player_id, delta in deltas.items():
+                by_delta[delta].append(player_id)
+            for delta, player_ids in by_delta.items():
+                Player.objects.filter(id__in=player_ids).update(
+                    total_score=F("total_score") + delta
+                )
+
+        # QuerySet.update() sends no signals, refresh the read side here
+        invalidate_game_state(*(game.id for game in finished))
+        sync_players(deltas)
+
+
+def load_journal(path):
+    try:
+        with open(path) as journal:
+            return [json.loads(line) for line in journal if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # someone else's process
+        return True
+    return True
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_result_recorder():
+    """The process's recorder, started (and its journal replayed) once."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = ResultRecorder(
+                str(settings.RESULT_JOURNAL),
+                settings.RESULT_BATCH_SIZE,
+                settings.RESULT_FLUSH_INTERVAL,
+            )
+    return _recorder
+
+
+def stop_result_recorder():
+    global _recorder
+    with _recorder_lock:
+        if _recorder is not None:
+            _recorder.stop()
+            _recorder = None
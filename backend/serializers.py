@@ -1,8 +1,27 @@
 from rest_framework import serializers
-from .models import Game, Player, Card
+from .models import Game, Player, PlayerStats, Card
+
+
+class PlayerStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlayerStats
+        fields = [
+            "games_played", "games_finished", "games_won",
+            "win_rate", "average_game_seconds",
+        ]
 
 
 class PlayerSerializer(serializers.ModelSerializer):
+    # load with select_related("stats"), null for a player without a row
+    stats = PlayerStatsSerializer(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Player
+        fields = ["id", "nickname", "total_score", "stats"]
+
+
+class GamePlayerSerializer(serializers.ModelSerializer):
+    # players as listed in a game, without their stats
     class Meta:
         model = Player
         fields = ["id", "nickname", "total_score"]
@@ -15,8 +34,8 @@ class CardSerializer(serializers.ModelSerializer):
 
 
 class GameSerializer(serializers.ModelSerializer):
-    players = PlayerSerializer(many=True, read_only=True)
-    winner = PlayerSerializer(source="winner_id", read_only=True)
+    players = GamePlayerSerializer(many=True, read_only=True)
+    winner = GamePlayerSerializer(read_only=True)
 
     class Meta:
         model = Game
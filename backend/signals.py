@@ -0,0 +1,49 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .leaderboard import remove_player, sync_player
+from .models import Player, PlayerStats, PlayerToken
+from .state_cache import invalidate_game_state
+
+
+@receiver(post_save, sender=PlayerToken)
+@receiver(post_delete, sender=PlayerToken)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # imported here, the websocket stack is not loaded by every command
+    from virus_the_game.ws_auth import invalidate_player_token
+    invalidate_player_token(instance.player_id)
+
+
+@receiver(post_delete, sender=Player)
+def invalidate_deleted_player_token(sender, instance, **kwargs):
+    from virus_the_game.ws_auth import invalidate_player_token
+    invalidate_player_token(instance.id)
+
+
+@receiver(post_save, sender=Player)
+def create_player_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        PlayerStats.objects.create(player=instance)
+
+
+@receiver(post_save, sender=Player)
+def update_leaderboard(sender, instance, **kwargs):
+    # Redis only sees committed scores, a rolled back save leaves none
+    transaction.on_commit(partial(sync_player, instance))
+
+
+@receiver(post_save, sender=Player)
+def invalidate_player_games(sender, instance, created, **kwargs):
+    # cached game states show the player's nickname and total score
+    if not created:
+        invalidate_game_state(
+            *instance.games.values_list("id", flat=True)
+        )
+
+
+@receiver(post_delete, sender=Player)
+def remove_from_leaderboard(sender, instance, **kwargs):
+    transaction.on_commit(partial(remove_player, instance))
@@ -0,0 +1,74 @@
+"""
+Per-game cache of the serialized game state, with its ETag.
+
+The games state endpoint is polled, so the serialized game is kept in the
+Django cache until something that changes it (a join, a removal, the
+finish or a player's score) invalidates it. Clients sending the ETag back
+in If-None-Match get a 304 without touching the database.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .serializers import GameSerializer
+
+
+def state_key(game_id):
+    return f"game-state:{game_id}"
+
+
+def get_game_state(game_id, queryset):
+    """
+    Returns:
+        Tuple of (etag, serialized_game), from the cache when possible
+
+    Raises:
+        Http404: no game with this id
+    """
+    cached = cache.get(state_key(game_id))
+    if cached is None:
+        game = get_object_or_404(queryset, pk=game_id)
+        cached = cache_game_state(game)
+    return cached
+
+
+async def aget_game_state(game_id, queryset):
+    """get_game_state() for async views, using the async ORM."""
+    cached = await cache.aget(state_key(game_id))
+    if cached is None:
+        try:
+            game = await queryset.aget(pk=game_id)
+        except queryset.model.DoesNotExist:
+            raise Http404("No Game matches the given query.")
+        cached = serialize_game_state(game)
+        await cache.aset(
+            state_key(game.id), cached, settings.GAME_STATE_CACHE_TTL
+        )
+    return cached
+
+
+def serialize_game_state(game):
+    """Serialize a game (with winner and players loaded) with its ETag."""
+    data = GameSerializer(game).data
+    digest = hashlib.md5(
+        json.dumps(data, sort_keys=True).encode()
+    ).hexdigest()
+    return f'"{digest}"', data
+
+
+def cache_game_state(game):
+    cached = serialize_game_state(game)
+    cache.set(state_key(game.id), cached, settings.GAME_STATE_CACHE_TTL)
+    return cached
+
+
+def invalidate_game_state(*game_ids):
+    cache.delete_many([state_key(game_id) for game_id in game_ids])
+
+
+async def ainvalidate_game_state(*game_ids):
+    await cache.adelete_many([state_key(game_id) for game_id in game_ids])
@@ -0,0 +1,81 @@
+"""
+Incremental upkeep of PlayerStats.
+
+Every change that affects a player's stats goes through here, inside the
+transaction making the change, and updates the stats rows with F()
+increments: reading a profile is then one row per player instead of
+counting over Game.players on every request.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Game, PlayerStats
+
+Membership = Game.players.through
+
+
+def record_seat(player_id, delta=1):
+    """Count a game joined (or left, with delta=-1) by the player."""
+    PlayerStats.objects.filter(player_id=player_id).update(
+        games_played=F("games_played") + delta
+    )
+
+
+def record_finished(games):
+    """
+    Count games that were just finished (end_time and winner set) in the
+    stats of their players. Call it in the transaction finishing them.
+    """
+    for game in games:
+        seconds = (game.end_time - game.start_time).total_seconds()
+        PlayerStats.objects.filter(player__games=game).update(
+            games_finished=F("games_finished") + 1,
+            total_game_seconds=F("total_game_seconds") + max(seconds, 0),
+        )
+
+    # one UPDATE per distinct number of wins rather than per winner
+    by_wins = defaultdict(list)
+    for winner_id, wins in Counter(
+            game.winner_id for game in games if game.winner_id).items():
+        by_wins[wins].append(winner_id)
+    for wins, winner_ids in by_wins.items():
+        PlayerStats.objects.filter(player_id__in=winner_ids).update(
+            games_won=F("games_won") + wins
+        )
+
+
+def leave_game(game_id, player_id):
+    """
+    Take the player out of the game, and out of their games played.
+
+    Returns:
+        Whether the player was in the game
+    """
+    with transaction.atomic():
+        removed, _ = Membership.objects.filter(
+            game_id=game_id, player_id=player_id
+        ).delete()
+        if removed:
+            record_seat(player_id, -1)
+    return bool(removed)
+
+
+def finish_game(game):
+    """
+    Save the game, with its winner and end_time set, as finished. Its
+    players' stats count it unless it was finished already.
+    """
+    game.finished = True
+    with transaction.atomic():
+        # conditional, two finishes of one game cannot both count it
+        newly_finished = Game.objects.filter(
+            pk=game.pk, finished=False
+        ).update(
+            finished=True, winner_id=game.winner_id, end_time=game.end_time
+        )
+        if newly_finished:
+            record_finished([game])
+        else:
+            game.save()
@@ -1,3 +1,474 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import tempfile
+import time
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import (
+    DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.test.client import BOUNDARY, encode_multipart
+
+from engine.card import Card, SpecialCard, Stack
+from engine.game import Game as EngineGame
+from engine.traces import replay_traces
+from virus_the_game.loadtest import LoadGenerator
+
+from . import async_api, urls
+from .matchmaking import MemoryQueue
+from .models import Game, Player
+from .queries import update_player_score
+from .recorder import ResultRecorder
+
+
+LOCAL_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GameStateTests(TestCase):
+    def setUp(self):
+        # leaderboard updates on player saves go to the database fallback
+        patcher = mock.patch("backend.leaderboard.redis_leaderboard", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        players = [
+            Player.objects.create(nickname=f"player{i}") for i in range(4)
+        ]
+        self.game = Game.objects.create(winner=players[0])
+        self.game.players.add(*players)
+        self.url = f"/api/games/{self.game.id}/state/"
+
+    def test_state_queries_do_not_grow_with_players(self):
+        # the game with its winner, then all players in one query
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["game"]["players"]), 4)
+        self.assertEqual(
+            response.json()["game"]["winner"]["nickname"], "player0"
+        )
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_unchanged_state_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.delete(
+            f"/api/games/{self.game.id}/",
+            {"player_id": self.game.players.first().id},
+            content_type="application/json",
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["game"]["players"]), 3)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_score_update_refreshes_state(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        update_player_score(self.game.players.first().id, 5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+BODIES = {
+    "json": lambda data: (json.dumps(data), "application/json"),
+    "form": lambda data: (
+        urlencode(data), "application/x-www-form-urlencoded"
+    ),
+    "multipart": lambda data: (
+        # the factory would encode again when given MULTIPART_CONTENT
+        encode_multipart(BOUNDARY, data),
+        f"multipart/form-data; boundary={BOUNDARY}",
+    ),
+}
+
+GAME_DETAIL_VIEWS = {
+    "viewset": urls.game_detail,
+    "async": async_to_sync(async_api.game_detail),
+}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GameDetailBodyTests(TestCase):
+    """The viewset and the async views parse the same request bodies."""
+
+    def setUp(self):
+        patcher = mock.patch("backend.leaderboard.redis_leaderboard", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def send(self, view, method, game, data, body):
+        content, content_type = BODIES[body](data)
+        request = getattr(RequestFactory(), method)(
+            f"/api/games/{game.id}/", content, content_type=content_type
+        )
+        response = GAME_DETAIL_VIEWS[view](request, pk=game.id)
+        if hasattr(response, "render"):
+            response.render()
+        return response.status_code, json.loads(response.content)
+
+    def test_join_finish_and_leave_with_every_body(self):
+        for view in GAME_DETAIL_VIEWS:
+            for body in BODIES:
+                with self.subTest(view=view, body=body):
+                    game = Game.objects.create()
+                    status, data = self.send(
+                        view, "post", game, {"player_name": f"{view}-{body}"},
+                        body
+                    )
+                    self.assertEqual(status, 200, data)
+                    player_id = data["player_id"]
+
+                    status, data = self.send(
+                        view, "patch", game, {"winner_id": player_id}, body
+                    )
+                    self.assertEqual(status, 200, data)
+                    game.refresh_from_db()
+                    self.assertEqual(game.winner_id, player_id)
+
+                    status, data = self.send(
+                        view, "delete", game, {"player_id": player_id}, body
+                    )
+                    self.assertEqual(status, 200, data)
+                    self.assertFalse(game.players.exists())
+
+    def test_malformed_json_is_rejected_alike(self):
+        game = Game.objects.create()
+        responses = []
+        for view in GAME_DETAIL_VIEWS:
+            request = RequestFactory().post(
+                f"/api/games/{game.id}/", "{", content_type="application/json"
+            )
+            response = GAME_DETAIL_VIEWS[view](request, pk=game.id)
+            responses.append(response.status_code)
+        self.assertEqual(responses, [400, 400])
+
+
+@override_settings(
+    CACHES=LOCAL_CACHE, MATCH_ROOM_SIZE=3, MATCH_SMALL_ROOM_AFTER=30
+)
+class MatchmakingTests(TestCase):
+    def setUp(self):
+        for target, value in (
+                ("backend.leaderboard.redis_leaderboard", None),
+                ("backend.matchmaking.redis_queue", None),
+                ("backend.matchmaking.memory_queue", MemoryQueue())):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+        for nickname, total_score in (
+                ("a", 10), ("b", 11), ("c", 12), ("d", 40)):
+            Player.objects.create(nickname=nickname, total_score=total_score)
+
+    def enqueue(self, nickname):
+        return self.client.post(
+            "/api/matchmaking/", {"player_name": nickname}
+        ).json()
+
+    def test_players_close_in_score_are_matched(self):
+        self.assertEqual(self.enqueue("a")["state"], "waiting")
+        self.assertEqual(self.enqueue("d")["state"], "waiting")
+        # "d" is too far from the others to be counted
+        self.assertEqual(self.enqueue("b")["state"], "waiting")
+
+        match = self.enqueue("c")
+        self.assertEqual(match["state"], "matched")
+        self.assertCountEqual(match["players"], ["a", "b", "c"])
+        game = Game.objects.get(pk=match["game_id"])
+        self.assertEqual(game.players.count(), 3)
+
+        polled = self.client.get("/api/matchmaking/a/").json()
+        self.assertEqual(polled["game_id"], match["game_id"])
+        polled = self.client.get("/api/matchmaking/d/").json()
+        self.assertEqual(polled["state"], "waiting")
+
+    def test_band_widens_while_waiting(self):
+        self.enqueue("a")
+        self.enqueue("d")
+        polled = self.client.get("/api/matchmaking/d/").json()
+        self.assertEqual(polled["state"], "waiting")
+
+        # two minutes later the band reaches "a", and a room of two is
+        # started on a retry rather than waiting for a third player
+        with mock.patch("backend.matchmaking.time.time",
+                        return_value=time.time() + 120):
+            # polling never matches
+            polled = self.client.get("/api/matchmaking/d/").json()
+            self.assertEqual(polled["state"], "waiting")
+            self.assertFalse(Game.objects.exists())
+
+            match = self.client.post("/api/matchmaking/d/").json()
+        self.assertEqual(match["state"], "matched")
+        self.assertCountEqual(match["players"], ["a", "d"])
+        polled = self.client.get("/api/matchmaking/a/").json()
+        self.assertEqual(polled["game_id"], match["game_id"])
+
+        stats = self.client.get("/api/matchmaking/stats/").json()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["time_to_match"]["samples"], 2)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaderboardPageTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("backend.leaderboard.redis_leaderboard", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for nickname, total_score in (("a", 3), ("b", 5), ("c", 5)):
+            Player.objects.create(nickname=nickname, total_score=total_score)
+
+    def test_pages_list_serialized_players_with_their_rank(self):
+        first = self.client.get("/api/players/?limit=2").json()
+        self.assertEqual(
+            [(p["rank"], p["nickname"]) for p in first["players"]],
+            [(1, "b"), (2, "c")]
+        )
+        self.assertEqual(first["players"][0]["stats"]["games_played"], 0)
+
+        rest = self.client.get(f"/api/players/?cursor={first['next']}").json()
+        self.assertEqual(
+            [(p["rank"], p["nickname"]) for p in rest["players"]], [(3, "a")]
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaderboardSyncTests(TestCase):
+    def setUp(self):
+        self.redis_leaderboard = mock.Mock()
+        patcher = mock.patch(
+            "backend.leaderboard.redis_leaderboard", self.redis_leaderboard
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def test_rolled_back_save_is_not_mirrored(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Player.objects.create(nickname="a", total_score=5)
+                    raise RuntimeError
+        self.redis_leaderboard.update.assert_not_called()
+
+    def test_redis_error_does_not_fail_the_save(self):
+        self.redis_leaderboard.update.side_effect = redis.ConnectionError
+        with self.captureOnCommitCallbacks(execute=True):
+            player = Player.objects.create(nickname="a", total_score=5)
+        self.redis_leaderboard.update.assert_called_once_with(player)
+        self.assertTrue(Player.objects.filter(nickname="a").exists())
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ResultRecorderTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("backend.leaderboard.redis_leaderboard", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = os.path.join(directory.name, "results.journal")
+        self.recorder = ResultRecorder(self.journal)
+        self.addCleanup(self.recorder.stop)
+        self.winner, loser = (
+            Player.objects.create(nickname=f"player{i}") for i in range(2)
+        )
+        self.game = Game.objects.create()
+        self.game.players.add(self.winner, loser)
+        self.record = {
+            "game_id": self.game.id,
+            "winner_id": self.winner.id,
+            "scores": {str(self.winner.id): 1},
+            "end_time": time.time(),
+        }
+
+    def assertCountedOnce(self):
+        self.winner.refresh_from_db()
+        self.assertEqual(self.winner.total_score, 1)
+        self.assertEqual(self.winner.stats.games_won, 1)
+        self.assertEqual(self.winner.stats.games_finished, 1)
+
+    def test_replayed_record_is_counted_once(self):
+        self.recorder.write([self.record, self.record])
+        self.recorder.write([self.record])
+        self.assertCountedOnce()
+
+    def test_game_finished_after_it_was_read_is_skipped(self):
+        stale = Game.objects.get(pk=self.game.id)
+        self.recorder.write([self.record])
+        with mock.patch.object(
+                Game.objects, "in_bulk", return_value={self.game.id: stale}):
+            self.recorder.write([self.record])
+        self.assertCountedOnce()
+
+    def test_journals_of_exited_processes_are_adopted(self):
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+        for pid in (exited.pid, os.getppid()):
+            with open(f"{self.journal}.{pid}", "w") as journal:
+                journal.write(json.dumps(self.record) + "\n")
+
+        # only the journals are read, nothing written
+        with mock.patch.object(ResultRecorder, "run"):
+            recorder = ResultRecorder(self.journal)
+        # the running parent keeps its journal
+        self.assertEqual(recorder.pending, [self.record])
+        self.assertFalse(os.path.exists(f"{self.journal}.{exited.pid}"))
+        self.assertTrue(os.path.exists(f"{self.journal}.{os.getppid()}"))
+
+
+@override_settings(CACHES=LOCAL_CACHE, REDIS_URL="memory://")
+class LoadTestTests(TestCase):
+    def setUp(self):
+        for target, value in (
+                ("backend.leaderboard.redis_leaderboard", None),
+                ("virus_the_game.consumers.get_result_recorder",
+                 mock.Mock())):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        previous = channel_layers.set(
+            DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer()
+        )
+        self.addCleanup(channel_layers.set, DEFAULT_CHANNEL_LAYER, previous)
+        cache.clear()
+
+    def test_room_is_played_to_the_end(self):
+        generator = LoadGenerator(
+            rooms=1, players_per_room=2, steps=1, step_duration=60
+        )
+        report, = async_to_sync(generator.run)()
+        self.assertEqual(report["games_over"], 1)
+        self.assertEqual(report["errors"], 0)
+        self.assertGreater(report["moves"], 0)
+
+
+class EngineRulesTests(SimpleTestCase):
+    """Rules the card-balance simulation relies on, see engine/NOTES.md."""
+
+    def setUp(self):
+        self.game = EngineGame(seed=1)
+        self.game.add_player("alice", 1)
+        self.game.add_player("bob", 2)
+        self.alice, self.bob = self.game.players[1], self.game.players[2]
+        self.next_id = 1000
+
+    def card(self, player, color, value):
+        card = Card(id=self.next_id, color=color, value=value)
+        self.next_id += 1
+        player.on_hand.append(card)
+        return card
+
+    def play(self, player, **attempt):
+        return self.game.resolve_attempt(
+            player, player.attempt_move(attempt)
+        )
+
+    def lay_out(self, player, color):
+        card = self.card(player, color, 0)
+        self.play(player, action="organ", card_id=card.id)
+        return player.laid_out[-1]
+
+    def test_virus_on_a_vaccinated_organ_cancels_the_vaccine(self):
+        stack = self.lay_out(self.bob, "red")
+        vaccine = self.card(self.bob, "red", 1)
+        self.play(self.bob, action="vaccinate", card_id=vaccine.id,
+                  target_stack=0)
+        virus = self.card(self.alice, "red", -1)
+        self.play(self.alice, action="attack", card_id=virus.id,
+                  target_player_id=2, target_stack=0)
+
+        self.assertEqual(stack.status, "healthy")
+        self.assertEqual([card.value for card in stack.cards], [0])
+        self.assertCountEqual(
+            self.game.deck.discard_pile, [vaccine.id, virus.id]
+        )
+
+    def test_healing_discards_the_virus_and_the_vaccine(self):
+        stack = self.lay_out(self.alice, "blue")
+        virus = self.card(self.bob, "rainbow", -1)
+        self.play(self.bob, action="attack", card_id=virus.id,
+                  target_player_id=1, target_stack=stack)
+        self.assertEqual(stack.status, "sick")
+
+        vaccine = self.card(self.alice, "blue", 1)
+        self.play(self.alice, action="heal", card_id=vaccine.id,
+                  target_stack=stack)
+        self.assertEqual(stack.status, "healthy")
+        self.assertCountEqual(
+            self.game.deck.discard_pile, [vaccine.id, virus.id]
+        )
+
+    def test_targets_are_stacks_or_their_index(self):
+        self.lay_out(self.bob, "red")
+        green = self.lay_out(self.bob, "green")
+        virus = self.card(self.alice, "green", -1)
+        self.play(self.alice, action="attack", card_id=virus.id,
+                  target_player_id=2, target_stack=1)
+        self.assertEqual(green.status, "sick")
+
+        foreign = Stack(Card(id=1, color="yellow", value=0))
+        virus = self.card(self.alice, "yellow", -1)
+        for target_stack in (foreign, 2, None):
+            with self.subTest(target_stack=target_stack):
+                with self.assertRaises(ValueError):
+                    self.play(self.alice, action="attack", card_id=virus.id,
+                              target_player_id=2, target_stack=target_stack)
+
+    def test_latex_glove_empties_the_other_hands_only(self):
+        kept = self.card(self.alice, "red", 0)
+        self.card(self.bob, "red", 0)
+        self.card(self.bob, "blue", 1)
+        glove = SpecialCard(id=self.next_id, card_type="latex glove")
+        self.alice.on_hand.append(glove)
+
+        self.play(self.alice, action="special", card_id=glove.id)
+        self.assertEqual(self.alice.on_hand, [kept])
+        self.assertEqual(self.bob.on_hand, [])
+        self.assertEqual(len(self.game.deck.discard_pile), 3)
+
+    def test_ending_player_draws_back_up_to_a_full_hand(self):
+        self.game.start_game()
+        card = self.alice.on_hand[0]
+        self.play(self.alice, action="discard", discard_cards_ids=[card.id])
+        self.assertEqual(len(self.alice.on_hand), 2)
+
+        self.assertEqual(self.game.next_player(), 2)
+        self.assertEqual(len(self.alice.on_hand), 3)
+
+    def test_complete_body_sets_the_winner_id(self):
+        for color in ("red", "green", "blue", "yellow"):
+            self.lay_out(self.alice, color)
+        self.assertTrue(self.game.check_if_winner())
+        self.assertEqual(self.game.winner_id, 1)
+        self.assertTrue(self.game.finished)
+
+
+class GoldenTraceTests(SimpleTestCase):
+    def test_engine_plays_the_golden_games_again(self):
+        replayed, divergences = replay_traces(
+            str(settings.GOLDEN_TRACES), workers=2
+        )
+        self.assertGreater(replayed, 0)
+        self.assertEqual(divergences, [])
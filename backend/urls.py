@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .api import GameViewSet, PlayerViewSet
+from . import async_api, export
+from .api import GameViewSet, MatchmakingViewSet, PlayerViewSet
 
 router = DefaultRouter()
 router.register(r"games", GameViewSet, basename="games")
@@ -13,6 +15,29 @@ game_detail = GameViewSet.as_view({
     "patch": "finish",         # PATCH /api/games/{id}/
 })
 
+# auto-match queue, see backend/matchmaking.py
+matchmaking_queue = MatchmakingViewSet.as_view({"post": "enqueue"})
+matchmaking_ticket = MatchmakingViewSet.as_view({
+    "get": "poll",             # GET /api/matchmaking/{nickname}/
+    "post": "retry",           # POST /api/matchmaking/{nickname}/
+    "delete": "leave",         # DELETE /api/matchmaking/{nickname}/
+})
+matchmaking_stats = MatchmakingViewSet.as_view({"get": "stats"})
+
 urlpatterns = [
     path("games/<int:pk>/", game_detail),
-] + router.urls
\ No newline at end of file
+    path("matchmaking/", matchmaking_queue),
+    path("matchmaking/stats/", matchmaking_stats),
+    path("matchmaking/<str:nickname>/", matchmaking_ticket),
+    # streamed NDJSON/CSV, see backend/export.py
+    path("export/games/", export.export_games),
+    path("export/players/", export.export_players),
+] + router.urls
+
+if settings.ASYNC_API:
+    # same contracts on the async ORM, matched before the viewset routes
+    urlpatterns = [
+        path("games/", async_api.create_game),
+        path("games/<int:pk>/", async_api.game_detail),
+        path("games/<int:pk>/state/", async_api.game_state),
+    ] + urlpatterns
@@ -1,5 +1,25 @@
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from virus_the_game.metrics import REGISTRY, ROOMS_ACTIVE
+
+_metrics_redis_manager = None
+
 
 def game_index(request):
-    return render(request, 'virus_game_mother/index.html')
\ No newline at end of file
+    return render(request, 'virus_game_mother/index.html')
+
+
+async def metrics(request):
+    """Prometheus scrape endpoint with the worker's live capacity numbers."""
+    global _metrics_redis_manager
+    if _metrics_redis_manager is None:
+        # imported here, aioredis is only needed once the endpoint is scraped
+        from virus_the_game.consumer_helpers import get_redis_manager
+        _metrics_redis_manager = await get_redis_manager()
+    ROOMS_ACTIVE.set(await _metrics_redis_manager.count_rooms())
+
+    return HttpResponse(
+        REGISTRY.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
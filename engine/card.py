@@ -1,5 +1,4 @@
 from dataclasses import dataclass
-from game import Game
 
 colors = ["red", "green", "blue", "yellow", "rainbow"]
 status = ["healthy", "sick", "vaccinated", "immune", "dead"]
@@ -28,8 +27,12 @@ class Stack:
             self.color = Card.color
             self.add_card(Card)
 
+    def matches(self, Card):
+        # rainbow organs take any color, rainbow cards go on any organ
+        return "rainbow" in (self.color, Card.color) or self.color == Card.color
+
     def add_card(self, Card):
-        if(self.color != Card.color):
+        if not self.matches(Card):
             raise TypeError("Wrong color!") 
         if(self.status == "immune"):
             raise ValueError("Card is immune. Nothing left to do.") 
@@ -39,7 +42,7 @@ class Stack:
         self.set_status()
 
     def remove_card(self, Card):
-        if(self.color != Card.color):
+        if not self.matches(Card):
             raise TypeError("Wrong color!") 
 
         else:
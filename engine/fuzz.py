@@ -0,0 +1,285 @@
+"""
+Randomized invariant checking of the engine.
+
+Seeded games are driven with a mix of sensible moves (from the simulation
+policy) and random ones - wrong cards, wrong targets, stacks that do not
+exist - through Player.attempt_move and Game.resolve_attempt. After every
+step the game is checked:
+
+- every card of the deck is in exactly one place: the deck, the discard
+  pile, a hand or a stack
+- every stack is one organ of its color plus matching cards, its value is
+  the sum of its cards and its status follows from the value
+- nobody has two organs of a color or more cards on hand than allowed
+- a move the engine refuses (ValueError) leaves the game untouched, and
+  no move fails with any other exception
+
+A failing game is shrunk to the fewest steps that still fail the same
+way, and reported as a trace (seed, players, composition, steps) that
+fuzz_reproduce() plays again.
+"""
+import random
+from dataclasses import dataclass, field
+from functools import partial
+from multiprocessing import Pool
+
+from .card import SpecialCard
+from .game import DEFAULT_COMPOSITION, Game
+from .player import Player
+from .simulation import candidate_moves
+from .traces import state_digest
+
+ACTIONS = ("attack", "vaccinate", "heal", "organ", "discard", "special")
+STATUS_BY_VALUE = {-1: "sick", 0: "healthy", 1: "vaccinated", 2: "immune"}
+
+
+class InvariantViolation(AssertionError):
+    pass
+
+
+@dataclass
+class FuzzStats:
+    games: int = 0
+    steps: int = 0
+    refused: int = 0  # moves the engine answered with a ValueError
+    failures: list = field(default_factory=list)
+
+    def merge(self, other):
+        self.games += other.games
+        self.steps += other.steps
+        self.refused += other.refused
+        self.failures.extend(other.failures)
+        return self
+
+
+# ----------------- Invariants ----------------- #
+
+
+def deck_size(composition):
+    counts = {**DEFAULT_COMPOSITION, **(composition or {})}
+    basic = sum(counts[name] for name in ("organ", "virus", "vaccine")) * 4
+    rainbow = sum(counts[f"rainbow {name}"] for name in ("organ", "virus", "vaccine"))
+    return basic + rainbow + sum(counts[card_type] for card_type in SpecialCard.card_types)
+
+
+def check_invariants(game, cards_total):
+    """Raise InvariantViolation describing the first inconsistency found."""
+    ids = list(game.deck.cards) + list(game.deck.discard_pile)
+    for player in game.players.values():
+        ids += [card.id for card in player.on_hand]
+        ids += [card.id for stack in player.laid_out for card in stack.cards]
+        if len(player.on_hand) > Player.max_on_hand:
+            raise InvariantViolation(f"player {player.id} has {len(player.on_hand)} cards on hand")
+
+        colors = [stack.color for stack in player.laid_out]
+        if len(colors) != len(set(colors)):
+            raise InvariantViolation(f"player {player.id} has two organs of a color: {colors}")
+        for stack in player.laid_out:
+            check_stack(player, stack)
+
+    if len(ids) != cards_total:
+        raise InvariantViolation(f"{len(ids)} cards in the game instead of {cards_total}")
+    if len(set(ids)) != len(ids):
+        raise InvariantViolation("a card is in two places at once")
+
+
+def check_stack(player, stack):
+    where = f"player {player.id}'s {stack.color} stack"
+    organs = [card for card in stack.cards if card.value == 0]
+    if len(organs) != 1 or organs[0].color != stack.color:
+        raise InvariantViolation(f"{where} has organs {organs}")
+    if any(isinstance(card, SpecialCard) or not stack.matches(card) for card in stack.cards):
+        raise InvariantViolation(f"{where} holds cards of another color")
+    value = sum(card.value for card in stack.cards)
+    if stack.stack_value != value:
+        raise InvariantViolation(f"{where} has value {stack.stack_value}, its cards add up to {value}")
+    if STATUS_BY_VALUE.get(value) != stack.status:
+        raise InvariantViolation(f"{where} is {stack.status} with value {value}")
+
+
+# ----------------- Moves ----------------- #
+
+
+def random_move(game, player, rng, cards_total):
+    """A move with every field its action needs, mostly aimed at the game's cards."""
+    if rng.random() < 0.5:
+        moves = list(candidate_moves(game, player, rng))
+        if moves:
+            return rng.choice(moves)
+
+    def card_id():
+        if player.on_hand and rng.random() < 0.9:
+            return rng.choice(player.on_hand).id
+        return rng.randrange(cards_total + 2)
+
+    def someone():
+        return rng.choice(game.player_order)
+
+    def stack_of(player_id):
+        # one index past either end now and then
+        return rng.randrange(-1, len(game.players[player_id].laid_out) + 1)
+
+    action = rng.choice(ACTIONS)
+    move = {"action": action, "card_id": card_id()}
+    match action:
+        case "attack":
+            target = someone()
+            move.update(target_player_id=target, target_stack=stack_of(target))
+        case "vaccinate" | "heal":
+            move["target_stack"] = stack_of(player.id)
+        case "discard":
+            move["discard_cards_ids"] = [card_id() for _ in range(rng.randint(1, 3))]
+        case "special":
+            target = someone()
+            viruses = rng.randint(0, 3)
+            targets = [someone() for _ in range(viruses)]
+            move.update(
+                target_player_id=target,
+                target_stack=stack_of(target),
+                stack=stack_of(player.id),
+                virus_cards_ids=[rng.randrange(cards_total) for _ in range(viruses)],
+                player_stacks=[stack_of(player.id) for _ in range(viruses)],
+                target_players_ids=targets,
+                target_stacks=[stack_of(t) for t in targets],
+            )
+    return move
+
+
+def new_game(seed, players, composition):
+    game = Game(composition, seed)
+    for seat in range(players):
+        game.add_player(f"bot{seat}", seat)
+    game.start_game()
+    return game
+
+
+def apply_step(game, step):
+    """
+    Returns:
+        True when the engine refused the move
+
+    Raises:
+        InvariantViolation: the step broke the game
+    """
+    if step == "end_turn":
+        game.next_player()
+        return False
+    player_id, move = step
+    player = game.players[player_id]
+    before = state_digest(game)
+    try:
+        game.resolve_attempt(player, player.attempt_move(move))
+    except ValueError:
+        if state_digest(game) != before:
+            raise InvariantViolation("a refused move changed the game")
+        return True
+    except Exception as e:
+        raise InvariantViolation(f"move crashed the engine: {e!r}")
+    return False
+
+
+def first_failure(seed, players, composition, steps):
+    """
+    Play the steps on a fresh game.
+
+    Returns:
+        None, or (index of the failing step, message)
+    """
+    cards_total = deck_size(composition)
+    game = new_game(seed, players, composition)
+    for index, step in enumerate(steps):
+        try:
+            apply_step(game, step)
+            check_invariants(game, cards_total)
+        except InvariantViolation as e:
+            return index, str(e)
+    return None
+
+
+# ----------------- Shrinking ----------------- #
+
+
+def shrink(seed, players, composition, steps, message):
+    """
+    Remove steps, in ever smaller runs, for as long as the game still
+    fails with the same message.
+
+    Returns:
+        The shortest failing list of steps found
+    """
+    def fails(candidate):
+        failure = first_failure(seed, players, composition, candidate)
+        return failure is not None and failure[1] == message
+
+    chunk = max(len(steps) // 2, 1)
+    while True:
+        start = 0
+        while start < len(steps):
+            candidate = steps[:start] + steps[start + chunk:]
+            if candidate and fails(candidate):
+                steps = candidate
+            else:
+                start += chunk
+        if chunk == 1:
+            return steps
+        chunk = max(chunk // 2, 1)
+
+
+# ----------------- Runner ----------------- #
+
+
+def fuzz(seeds, players=4, composition=None, steps=400, max_failures=5):
+    """Fuzz one game per seed, shrinking the failing ones."""
+    stats = FuzzStats()
+    cards_total = deck_size(composition)
+    for seed in seeds:
+        stats.games += 1
+        rng = random.Random(f"fuzz-{seed}")
+        game = new_game(seed, players, composition)
+        played = []
+        for _ in range(steps):
+            if rng.random() < 0.25:
+                step = "end_turn"
+            else:
+                player = game.players[game.player_order[game.index_of_current_player]]
+                step = (player.id, random_move(game, player, rng, cards_total))
+            played.append(step)
+            stats.steps += 1
+            try:
+                stats.refused += apply_step(game, step)
+                check_invariants(game, cards_total)
+            except InvariantViolation as e:
+                if len(stats.failures) < max_failures:
+                    stats.failures.append(reproducer(seed, players, composition, played, str(e)))
+                break
+    return stats
+
+
+def reproducer(seed, players, composition, steps, message):
+    steps = shrink(seed, players, composition, steps, message)
+    return {
+        "seed": seed,
+        "players": players,
+        "composition": composition,
+        "message": message,
+        "steps": steps,
+    }
+
+
+def fuzz_reproduce(failure):
+    """Play a reported failure again, returns (step index, message) or None."""
+    steps = [step if step == "end_turn" else tuple(step) for step in failure["steps"]]
+    return first_failure(failure["seed"], failure["players"], failure["composition"], steps)
+
+
+def run_fuzz(games, players=4, composition=None, seed=0, steps=400,
+             workers=None, chunk_size=50):
+    """Fuzz `games` seeded games over a pool of `workers` processes."""
+    chunks = [range(start, min(start + chunk_size, seed + games))
+              for start in range(seed, seed + games, chunk_size)]
+    task = partial(fuzz, players=players, composition=composition, steps=steps)
+    stats = FuzzStats()
+    with Pool(workers) as pool:
+        for chunk_stats in pool.imap_unordered(task, chunks):
+            stats.merge(chunk_stats)
+    return stats
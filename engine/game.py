@@ -1,11 +1,32 @@
-from card import Card, Stack, SpecialCard
-from player import Player
+from .card import Card, Stack, SpecialCard
+from .player import Player
 import random
+import secrets
 
 
 
+# cards in a full deck, initialize_deck() takes a dict overriding some of them
+DEFAULT_COMPOSITION = {
+    # per color: red, green, blue and yellow
+    "organ": 5,
+    "virus": 4,
+    "vaccine": 4,
+    # rainbow cards, they match every color
+    "rainbow organ": 1,
+    "rainbow virus": 1,
+    "rainbow vaccine": 4,
+    # special cards
+    "organ swap": 3,
+    "thieft": 3,
+    "body swap": 1,
+    "latex glove": 1,
+    "epidemy": 2,
+}
+
+
 class Deck:
-    def __init__(self):
+    def __init__(self, rng: random.Random | None = None):
+        self.rng = rng or random.Random() #the game's rng, draws follow its seed
         self.cards: dict[int, Card] = {} #list of all cards in the deck
         self.discard_pile: dict[int, Card] = {} #list of all discarded cards
         self._next_id = 0
@@ -13,8 +34,10 @@ class Deck:
     def draw_card(self):
         if not self.cards:
             self.reshuffle_cards() #reshuffle if no cards left
+        if not self.cards:
+            raise ValueError("No cards left to draw!")
 
-        card_id = random.choice(list(self.cards.keys()))
+        card_id = self.rng.choice(list(self.cards.keys()))
         return self.cards.pop(card_id)
 
     def _add_card(self, card):
@@ -33,46 +56,61 @@ class Deck:
         self.cards[card.id] = card
 
     
-    def initialize_deck(self):
+    def initialize_deck(self, composition: dict | None = None):
+        """
+        Args:
+            composition: card counts overriding DEFAULT_COMPOSITION, e.g. {"epidemy": 4}
+        """
+        counts = {**DEFAULT_COMPOSITION, **(composition or {})}
+        unknown = set(counts) - set(DEFAULT_COMPOSITION)
+        if unknown:
+            raise ValueError(f"Unknown cards in the deck composition: {', '.join(sorted(unknown))}")
+
         def new_card(color, value):
             card = Card(id=self._next_id, color=color, value=value)
             self._next_id += 1
             self.cards[card.id] = card
-        #create all 58 basic cards: 5 organ, 4 virus, 4 vaccine per color + rainbow: 1 organ, 1 virus, 4 vaccine
-        for color in ["red", "green", "blue", "yellow"]:
-            for _ in range(5): new_card(color, 0)
-            for _ in range(4): new_card(color, -1)
-            for _ in range(4): new_card(color, 1)
-        #rainbow cards   
-        new_card("rainbow", 0)
-        new_card("rainbow", -1)
-        for _ in range(4): new_card("rainbow", 1)
+        #by default 58 basic cards: 5 organ, 4 virus, 4 vaccine per color + rainbow: 1 organ, 1 virus, 4 vaccine
+        for color in ["red", "green", "blue", "yellow", "rainbow"]:
+            prefix = "rainbow " if color == "rainbow" else ""
+            for _ in range(counts[prefix + "organ"]): new_card(color, 0)
+            for _ in range(counts[prefix + "virus"]): new_card(color, -1)
+            for _ in range(counts[prefix + "vaccine"]): new_card(color, 1)
         
         #append special cards
-        for _ in range(3): 
-            self._add_special("organ swap")
-            self._add_special("thieft")
-        self._add_special("body swap")
-        self._add_special("latex glove")
-        for _ in range(2): self._add_special("epidemy")
-
-        print(len(self.cards)) #for testing purposes
+        for card_type in SpecialCard.card_types:
+            for _ in range(counts[card_type]):
+                self._add_special(card_type)
 
 class Game:
 
-    def __init__(self):
-        self.deck = Deck() #list of all 68 cards
+    def __init__(self, composition: dict | None = None, seed: int | None = None):
+        #the same seed and the same moves always give the same game
+        self.seed = seed if seed is not None else secrets.randbits(64)
+        self.rng = random.Random(self.seed)
+        self.deck = Deck(self.rng) #list of all 68 cards
+        self.composition = composition #deck composition, None for the standard deck
 
         self.players: dict[int, Player] = {}
         self.player_order: list[int] = []
         self.index_of_current_player = 0
         
         self.players_number = 0
-        self.winner = None
+        self.winner_id = None
         self.turn_number = 0
     
+    @property
+    def started(self) -> bool:
+        return self.deck._next_id > 0 #the deck is only filled by start_game
+
+    @property
+    def finished(self) -> bool:
+        return self.winner_id is not None
+
     # players handling
     def add_player(self, name: str, player_id: int):
+        if self.started:
+            raise ValueError("The game has already started!")
         if player_id in self.players:
             raise ValueError("Player already in the game!")
         if len(self.players) >= 8:
@@ -101,17 +139,49 @@ class Game:
         return {"player_id": player_id, "card_id": card.id}
 
     def discard_card_from_player(self, player_id: int, card_id: int):
-        card = next(card for card in self.players[player_id].on_hand if card.id == card_id)
-        self.players[player_id].on_hand.remove(card)
+        player = self.players[player_id]
+        card = player.get_card_from_hand(card_id)
+        player.on_hand.remove(card)
         self.deck.discard_card(card)
         return {"player_id": player_id, "card_id": card.id}
 
+    def refill_hand(self, player_id: int):
+        #draw back up to a full hand, as long as there are cards
+        player = self.players[player_id]
+        while len(player.on_hand) < Player.max_on_hand and (self.deck.cards or self.deck.discard_pile):
+            self.draw_card_for_player(player_id)
+
+    # targets given as ids and indices
+    def _player(self, player_id: int) -> Player:
+        if player_id not in self.players:
+            raise ValueError("No such player in the game!")
+        return self.players[player_id]
+
+    def _stack(self, owner: Player, stack) -> Stack:
+        #stacks come as Stack objects or as their index in the owner's laid out organs
+        if isinstance(stack, Stack):
+            if stack not in owner.laid_out:
+                raise ValueError("This organ is not laid out by that player!")
+            return stack
+        if stack is None or not 0 <= stack < len(owner.laid_out):
+            raise ValueError("No such organ laid out!")
+        return owner.laid_out[stack]
+
+    def _cancel_out(self, stack: Stack):
+        #a virus and a vaccine on one organ destroy each other, both go to the discard pile
+        for card in [card for card in stack.cards if card.value != 0]:
+            stack.remove_card(card)
+            self.deck.discard_card(card)
+
     # game flow
-    def check_if_winner(self) -> bool:
-        p_id = self.player_order[self.current_player_index]
-        if self.players[p_id].check_win_condition():
-            self.winner_id = p_id
-            return True
+    def check_if_winner(self, player_ids=None) -> bool:
+        #the current player by default, a swap can also complete the body of its target
+        if player_ids is None:
+            player_ids = [self.player_order[self.index_of_current_player]]
+        for p_id in player_ids:
+            if p_id in self.players and self.players[p_id].check_win_condition():
+                self.winner_id = p_id
+                return True
         return False
 
     def resolve_attempt(self, player: Player, attempt):
@@ -123,78 +193,86 @@ class Game:
 
             case "attack":
                 #unsuccesfull -> need to be changed to return success: false                
-                if attempt.target_player is None or attempt.target_stack is None:
+                if attempt.target_player_id is None or attempt.target_stack is None:
                     raise ValueError("No target player or stack specified for attack!")
+                if attempt.card.value != -1:
+                    raise ValueError("Only virus cards can attack!")
+                target_player = self._player(attempt.target_player_id)
+                if target_player is player:
+                    raise ValueError("Cannot attack your own organs!")
+                target_stack = self._stack(target_player, attempt.target_stack)
                 
-                if (attempt.target_stack.color != "rainbow" and attempt.card.color != "rainbow"):
-                    if attempt.target_stack.color != attempt.card.color:
-                        raise ValueError("Card color does not match stack color!")
+                if not target_stack.matches(attempt.card):
+                    raise ValueError("Card color does not match stack color!")
                 
-                if attempt.target_stack.status == "immune":
+                if target_stack.status == "immune":
                     raise ValueError("Cannot attack this stack!")
                 
 
-                isdead = attempt.target_player.add_card_to_stack(attempt.target_stack, attempt.card)
                 player.on_hand.remove(attempt.card)
+                isdead = target_player.add_card_to_stack(target_stack, attempt.card)
 
                 result.update({
                 "card_id": attempt.card.id,
-                "target_player_id": attempt.target_player.id,
-                "target_stack_color": attempt.target_stack.color,
+                "target_player_id": target_player.id,
+                "target_stack_color": target_stack.color,
                 })
 
                 if isdead:
-                    #move the stack's cards to discard pile
-                    attempt.target_player.remove_stack(attempt.target_stack)
-                    for card in attempt.target_stack.cards:
+                    #the stack is already off the table, its cards go to the discard pile
+                    for card in target_stack.cards:
                         self.deck.discard_card(card)
+                elif target_stack.status == "healthy": #the virus destroyed a vaccine
+                    self._cancel_out(target_stack)
 
 
-            case "heal": #handles rainbow
+            case "heal" | "vaccinate": #handles rainbow
                 #unsuccessfull -> returns FALSE
                 if attempt.target_stack is None:
                     raise ValueError("No target stack specified for healing/vaccinating!")
+                if attempt.card.value != 1:
+                    raise ValueError("Only vaccine cards can heal or vaccinate!")
+                target_stack = self._stack(player, attempt.target_stack)
                 
-                if (attempt.target_stack.color != "rainbow" and attempt.card.color != "rainbow"):
-                    if attempt.target_stack.color != attempt.card.color:
-                        raise ValueError("Card color does not match stack color!")
+                if not target_stack.matches(attempt.card):
+                    raise ValueError("Card color does not match stack color!")
                 
-                if attempt.target_stack.status == "immune":
+                if target_stack.status == "immune":
                     raise ValueError("Stack is already immune!")
                 
                 #handling the attempt
-                player.add_card_to_stack(attempt.target_stack, attempt.card)
-                
-                if attempt.target_stack.status == "healthy": # it means the virus was removed by vaccine - both go to discard
-                    attempt.target_stack.cards.remove(attempt.card) # remove vaccine from stack
-                    virus_card = next(card for card in attempt.target_stack.cards if card.value == -1)
-                    attempt.target_stack.cards.remove(virus_card)
-                    self.deck.discard_card(virus_card)
-                else:
-                    self.deck.discard_card(attempt.card) # discard vaccine card
                 player.on_hand.remove(attempt.card) # remove from hand, NOT handled in add_card_to_stack
+                player.add_card_to_stack(target_stack, attempt.card)
+                
+                if target_stack.status == "healthy": # it means the virus was removed by vaccine - both go to discard
+                    self._cancel_out(target_stack)
 
                 result.update({
                     "card_id": attempt.card.id,
-                    "target_stack_color": attempt.target_stack.color,
+                    "target_stack_color": target_stack.color,
                 })
 
 
             case "organ":
-                if attempt.card.color != "rainbow":
-                    if any(stack.color == attempt.card.color for stack in player.laid_out):
-                        raise ValueError("You already have an organ of this color laid out!")
-                else:
-                    player.lay_out_organ(attempt.card)
+                if attempt.card.value != 0:
+                    raise ValueError("This is not an organ!")
+                if any(stack.color == attempt.card.color for stack in player.laid_out):
+                    raise ValueError("You already have an organ of this color laid out!")
+                player.lay_out_organ(attempt.card)
 
                 result["card_id"] = attempt.card.id
                     
 
             case "discard":
+                #all cards are checked before any is discarded
+                for card_id in attempt.discard_cards_ids:
+                    player.get_card_from_hand(card_id)
+                if len(set(attempt.discard_cards_ids)) != len(attempt.discard_cards_ids):
+                    raise ValueError("A card can only be discarded once!")
                 discarded =[]
-                for card in attempt.discard_cards:
-                    self.discard_card_from_player(player, card)
-                    discarded.append(card.id)
+                for card_id in attempt.discard_cards_ids:
+                    self.discard_card_from_player(player.id, card_id)
+                    discarded.append(card_id)
                 result["discarded_cards"] = discarded
             
 
@@ -206,59 +284,85 @@ class Game:
 
 
                     case "organ swap":
-                        if attempt.target_stack.color != attempt.stack.color and attempt.target_stack.color != "rainbow" and attempt.stack.color != "rainbow" and (attempt.target_stack.color in [stack.color for stack in player.laid_out] or attempt.stack.color in [stack.color for stack in attempt.target_player.laid_out]):
+                        target_player = self._player(attempt.target_player_id)
+                        stack = self._stack(player, attempt.stack)
+                        target_stack = self._stack(target_player, attempt.target_stack)
+                        if "immune" in (stack.status, target_stack.status):
+                            raise ValueError("Cannot swap immune organs!")
+                        #after the swap nobody may have two organs of one color
+                        if target_stack.color in [other.color for other in player.laid_out if other is not stack] or stack.color in [other.color for other in target_player.laid_out if other is not target_stack]:
                             raise ValueError("Cannot swap these organs!")
-                        attempt.stack, attempt.target_stack = attempt.target_stack, attempt.stack
-                        #swap stacks between players but im not sure if it works like i want it to do
+                        player.laid_out[player.laid_out.index(stack)] = target_stack
+                        target_player.laid_out[target_player.laid_out.index(target_stack)] = stack
+                        result.update({
+                            "target_player_id": target_player.id,
+                            "stack_color": stack.color,
+                            "target_stack_color": target_stack.color,
+                        })
 
 
                     case "thieft":
+                        target_player = self._player(attempt.target_player_id)
+                        target_stack = self._stack(target_player, attempt.target_stack)
                         #failures
-                        if attempt.target_stack.status == "immune":
+                        if target_player is player:
+                            raise ValueError("Cannot steal from yourself!")
+                        if target_stack.status == "immune":
                             raise ValueError("Cannot steal from an immune stack!")
-                        if len(attempt.target_stack.cards) == 0:
-                            raise ValueError("Target stack has no cards to steal!")
-                        if attempt.target_stack.color in [stack.color for stack in player.laid_out]:
+                        if target_stack.color in [stack.color for stack in player.laid_out]:
                             raise ValueError("You already have an organ of this color laid out!")
                         
                         #attempt
-                        stolen_card = attempt.target_stack
-                        attempt.target_player.remove_stack(attempt.stolen_card)
-                        player.laid_out.append(stolen_card)
-                        #chyba jest git, ale wszystkie karty specjalne pisałam z gorączką więc do sprawdzenia
-                        result["stolen_stack_color"] = stolen_card.color
+                        target_player.remove_stack(target_stack)
+                        player.laid_out.append(target_stack)
+                        result.update({
+                            "target_player_id": target_player.id,
+                            "stolen_stack_color": target_stack.color,
+                        })
 
                     case "body swap": #there are no restrictions on body swap 
-                        attempt.player.laid_out, attempt.target_player.laid_out = attempt.target_player.laid_out, attempt.player.laid_out
+                        target_player = self._player(attempt.target_player_id)
+                        player.laid_out, target_player.laid_out = target_player.laid_out, player.laid_out
                         #swap all stacks between players
+                        result["target_player_id"] = target_player.id
 
 
                     case "latex glove":
-                        for player in self.players.values():
-                            for card in player.on_hand:
-                                self.discard_card_from_player(player, card)
+                        #every other player discards their whole hand
+                        for other in self.players.values():
+                            if other is player:
+                                continue
+                            for card in list(other.on_hand):
+                                self.discard_card_from_player(other.id, card.id)
                     
                     
                     case "epidemy":
-
-                        for i in range(len(attempt.virus_cards)):
-                            virus_card = attempt.virus_cards[i]
-                            #target_player = attempt.target_players[i] #not used but i think it should be used ? TOBEDONE
-                            target_stack = attempt.target_stacks[i]
+                        #all transfers are checked before any virus moves
+                        transfers = []
+                        if not len(attempt.virus_cards_ids) == len(attempt.player_stacks) == len(attempt.target_stacks) == len(attempt.target_players_ids):
+                            raise ValueError("Every virus needs its stack, target player and target stack!")
+                        for i in range(len(attempt.virus_cards_ids)):
+                            stack = self._stack(player, attempt.player_stacks[i])
+                            virus_card = next((card for card in stack.cards if card.id == attempt.virus_cards_ids[i]), None)
+                            target_player = self._player(attempt.target_players_ids[i])
+                            target_stack = self._stack(target_player, attempt.target_stacks[i])
 
                             #failures -> return flase
-                            if virus_card.value != -1:
+                            if virus_card is None or virus_card.value != -1 or any(virus_card is other for _, other, _, _ in transfers):
                                 raise ValueError("Only virus cards can be given away in an epidemy!")
-                            if target_stack.status != "healthy":
+                            if target_player is player:
+                                raise ValueError("Viruses have to be given to other players!")
+                            if target_stack.status != "healthy" or any(target_stack is other for _, _, _, other in transfers):
                                 raise ValueError("You can only give a virus to a healthy stack!")
-                            if target_stack.color != "rainbow":
-                                if virus_card.color != "rainbow":
-                                    if target_stack.color != virus_card.color:
-                                        raise ValueError("Virus card color does not match target stack color!")
-                            
-                            #handling attempt
-                            attempt.player.remove_card_from_stack(attempt.player_stacks[i], virus_card)
-                            target_stack.add_card(virus_card)
+                            if not target_stack.matches(virus_card):
+                                raise ValueError("Virus card color does not match target stack color!")
+                            transfers.append((stack, virus_card, target_player, target_stack))
+                        
+                        #handling attempt
+                        for stack, virus_card, target_player, target_stack in transfers:
+                            player.remove_card_from_stack(stack, virus_card)
+                            target_player.add_card_to_stack(target_stack, virus_card)
+                        result["given_viruses"] = [virus_card.id for _, virus_card, _, _ in transfers]
                     
                     
                     case _:
@@ -274,9 +378,11 @@ class Game:
         return result
 
     def start_game(self):
+        if self.started:
+            raise ValueError("The game has already started!")
         if len(self.players) < 2:
             raise ValueError("Not enough players to start the game!")
-        self.deck.initialize_deck()
+        self.deck.initialize_deck(self.composition)
         #deal 3 cards to each player
         for player in self.players:
             for _ in range(3):
@@ -284,8 +390,11 @@ class Game:
         #game starts
 
     def next_player(self):
+        #the player whose turn ends draws back up to a full hand
+        self.refill_hand(self.player_order[self.index_of_current_player])
         self.index_of_current_player = (self.index_of_current_player + 1) % self.players_number
-        return self.player_order[self.current_player_index]
+        self.turn_number += 1
+        return self.player_order[self.index_of_current_player]
     
     
 
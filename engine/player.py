@@ -1,32 +1,36 @@
-from typing import Optional
+from typing import Optional, Union
 from dataclasses import dataclass
-from card import Card, Stack
+from .card import Card, Stack, SpecialCard
+
+# stacks are given either as Stack objects or as their index in the owner's laid_out
+StackRef = Union['Stack', int]
 
 @dataclass
 class Attempt:
-    action: str                # "attack", "heal", "organ", "discard", "vaccinate"
+    action: str                # "attack", "heal", "organ", "discard", "vaccinate", "special" (latex glove)
     card: Optional['Card'] = None      # Card to play
     target_player_id: Optional[int] = None  # Needed for attack/steal
-    target_stack: Optional['Stack'] = None    # Which stack to affect
-    # target_stack_index: Optional[int] = None  #do stacks have incides?
+    target_stack: Optional[StackRef] = None    # Which stack to affect
     discard_cards_ids: Optional[list[int]] = None  # For discard action
     
 @dataclass
 class SwapThiefAttempt:
-    action: str                # "organ swap", "body swap" , "thieft"
+    action: str                # "special" - card is "organ swap", "body swap" or "thieft"
     player_id: int
-    stack: Optional['Stack'] = None
     target_player_id: int
-    target_stack: Optional['Stack'] = None
+    card: Optional['SpecialCard'] = None
+    stack: Optional[StackRef] = None
+    target_stack: Optional[StackRef] = None
 
 @dataclass
 class EpidemyAttempt:
-    action: str                # "epidemy"
+    action: str                # "special" - card is "epidemy"
     player_id: int
     virus_cards_ids: list[int]  # List of virus cards to give away 
-    player_stacks: list['Stack']  # List of player stacks to remove virus cards from
-    target_stacks: list['Stack']  # List of target stacks to receive the virus cards
+    player_stacks: list[StackRef]  # List of player stacks to remove virus cards from
+    target_stacks: list[StackRef]  # List of target stacks to receive the virus cards
     target_players_ids: list[int]  # List of target players to receive the virus cards
+    card: Optional['SpecialCard'] = None
     #virus cards index corresponds to target players index and target stacks index
 
 class Player:
@@ -83,22 +87,24 @@ class Player:
             case "special":
                 card_to_play = self.get_card_from_hand(attempt_info["card_id"]) #special card; altrnatively: self.choose_card_from_hand(100)
                 
-                if card_to_play is None:
-                    raise ValueError("No special cards on hand!")
+                if not isinstance(card_to_play, SpecialCard):
+                    raise ValueError("This is not a special card!")
                 
 
                 if card_to_play.card_type in ["organ swap", "body swap"]:
                     return SwapThiefAttempt(
-                        action=card_to_play.card_type,
+                        action="special",
+                        card=card_to_play,
                         player_id=self.id,
-                        stack=attempt_info["stack"],
+                        stack=attempt_info.get("stack"), # body swap takes the whole body
                         target_player_id=attempt_info["target_player_id"],
-                        target_stack=attempt_info["target_stack"],
+                        target_stack=attempt_info.get("target_stack"),
                     )
                 
                 elif card_to_play.card_type == "thieft":
                     return SwapThiefAttempt(
-                        action="thieft",
+                        action="special",
+                        card=card_to_play,
                         player_id=self.id,
                         target_player_id=attempt_info["target_player_id"],
                         target_stack=attempt_info["target_stack"],
@@ -112,7 +118,8 @@ class Player:
                     # player can choose 0 - 4 viruses from their stacks to give them other players - TOBEDONE
                     # they have to choose how many and which ones and to whom to give them (FRONTEND)
                     return EpidemyAttempt(
-                        action="epidemy",
+                        action="special",
+                        card=card_to_play,
                         player_id=self.id,
                         virus_cards_ids=attempt_info["virus_cards_ids"],  #list of virus cards to give away 
                         player_stacks=attempt_info["player_stacks"], #list of player's stacks to remove virus cards from  
@@ -153,7 +160,10 @@ class Player:
         return False
     
     def get_card_from_hand(self, card_id: int) -> Card:
-        return next(c for c in self.on_hand if c.id == card_id)
+        card = next((c for c in self.on_hand if c.id == card_id), None)
+        if card is None:
+            raise ValueError("You don't have this card on hand!")
+        return card
     
     def remove_card_from_stack(self, stack: Stack, card: Card):
         stack.remove_card(card)
@@ -173,4 +183,4 @@ class Player:
             if stack.status not in ["healthy", "immune", "vaccinated"]:
                 return False
         self.status = 1
-        return True
\ No newline at end of file
+        return True
\ No newline at end of file
@@ -0,0 +1,278 @@
+"""
+Monte Carlo simulation of whole games, for tuning the deck composition.
+
+Simulated players follow a simple greedy policy: lay out an organ, heal a
+sick one, play a special card, attack the leader, vaccinate, and only then
+discard. Every move goes through Player.attempt_move and
+Game.resolve_attempt like a real one. Games are seeded, so a run can be
+repeated, and each worker process only sends back its aggregated
+BalanceStats, never the games themselves.
+"""
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from multiprocessing import Pool
+
+from .card import SpecialCard
+from .game import Game
+
+
+@dataclass
+class BalanceStats:
+    games: int = 0
+    stalled: int = 0  # games without a winner after max_turns
+    seat_wins: Counter = field(default_factory=Counter)
+    game_turns: Counter = field(default_factory=Counter)  # turns -> games
+    special_played: Counter = field(default_factory=Counter)  # card type -> plays
+    special_players: Counter = field(default_factory=Counter)  # card type -> players who played it
+    special_winners: Counter = field(default_factory=Counter)  # card type -> those who won
+
+    def merge(self, other):
+        self.games += other.games
+        self.stalled += other.stalled
+        for name in ("seat_wins", "game_turns", "special_played",
+                     "special_players", "special_winners"):
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+
+# ----------------- Policy ----------------- #
+
+
+def opponents(game, player):
+    return [game.players[p_id] for p_id in game.player_order if p_id != player.id]
+
+
+def candidate_moves(game, player, rng):
+    """Moves worth trying, best first, as attempt_move() dictionaries."""
+    hand = player.on_hand
+    own_colors = {stack.color for stack in player.laid_out}
+    # the leader is attacked first, ties in random order so no seat is picked on
+    others = opponents(game, player)
+    rng.shuffle(others)
+    others.sort(key=lambda other: -len(other.laid_out))
+    organs = [card for card in hand if not isinstance(card, SpecialCard) and card.value == 0]
+    viruses = [card for card in hand if not isinstance(card, SpecialCard) and card.value == -1]
+    vaccines = [card for card in hand if not isinstance(card, SpecialCard) and card.value == 1]
+    specials = [card for card in hand if isinstance(card, SpecialCard)]
+
+    for card in organs:
+        if card.color not in own_colors:
+            yield {"action": "organ", "card_id": card.id}
+
+    for card in vaccines:
+        for index, stack in enumerate(player.laid_out):
+            if stack.status == "sick" and stack.matches(card):
+                yield {"action": "heal", "card_id": card.id, "target_stack": index}
+
+    for card in specials:
+        yield from special_moves(game, player, card, others)
+
+    for card in viruses:
+        for other in others:
+            for index, stack in enumerate(other.laid_out):
+                if stack.status != "immune" and stack.matches(card):
+                    yield {"action": "attack", "card_id": card.id,
+                           "target_player_id": other.id, "target_stack": index}
+
+    for card in vaccines:
+        for index, stack in enumerate(player.laid_out):
+            if stack.status in ("healthy", "vaccinated") and stack.matches(card):
+                yield {"action": "vaccinate", "card_id": card.id, "target_stack": index}
+
+
+def special_moves(game, player, card, others):
+    move = {"action": "special", "card_id": card.id}
+    own_colors = {stack.color for stack in player.laid_out}
+
+    match card.card_type:
+        case "thieft":
+            for other in others:
+                for index, stack in enumerate(other.laid_out):
+                    if stack.status != "immune" and stack.color not in own_colors:
+                        yield {**move, "target_player_id": other.id, "target_stack": index}
+
+        case "organ swap":
+            # a sick organ of ours for a healthier one
+            for own_index, own in enumerate(player.laid_out):
+                if own.status != "sick":
+                    continue
+                for other in others:
+                    for index, stack in enumerate(other.laid_out):
+                        if stack.stack_value > own.stack_value:
+                            yield {**move, "stack": own_index,
+                                   "target_player_id": other.id, "target_stack": index}
+
+        case "body swap":
+            def healthy(someone):
+                return sum(stack.stack_value >= 0 for stack in someone.laid_out)
+            best = max(others, key=healthy)
+            if healthy(best) > healthy(player):
+                yield {**move, "target_player_id": best.id}
+
+        case "latex glove":
+            if any(other.on_hand for other in others):
+                yield move
+
+        case "epidemy":
+            virus_cards, player_stacks, target_players, target_stacks = [], [], [], []
+            taken = set()
+            for own_index, own in enumerate(player.laid_out):
+                virus = next((c for c in own.cards if c.value == -1), None)
+                if virus is None:
+                    continue
+                target = next((
+                    (other, index) for other in others
+                    for index, stack in enumerate(other.laid_out)
+                    if stack.status == "healthy" and stack.matches(virus)
+                    and id(stack) not in taken
+                ), None)
+                if target is None:
+                    continue
+                taken.add(id(target[0].laid_out[target[1]]))
+                virus_cards.append(virus.id)
+                player_stacks.append(own_index)
+                target_players.append(target[0].id)
+                target_stacks.append(target[1])
+            if virus_cards:
+                yield {**move, "virus_cards_ids": virus_cards, "player_stacks": player_stacks,
+                       "target_players_ids": target_players, "target_stacks": target_stacks}
+
+
+def apply_move(game, player_id, move):
+    """
+    Returns:
+        The result of the move, or {"error": message} when the game refused it
+    """
+    player = game.players[player_id]
+    try:
+        return game.resolve_attempt(player, player.attempt_move(move))
+    except ValueError as e:
+        return {"error": str(e)}
+
+
+def play_turn(game, player, rng, play=apply_move):
+    """
+    Play the first candidate move the game accepts, or discard a card.
+
+    Args:
+        rng: the policy's own random.Random, drawing from the game's would
+            make the deck depend on the policy
+        play: play(game, player_id, move) -> result, apply_move() or a recorder's
+
+    Returns:
+        The special card type played, or None
+    """
+    for move in candidate_moves(game, player, rng):
+        card = player.get_card_from_hand(move["card_id"])
+        if "error" not in play(game, player.id, move):
+            return card.card_type if isinstance(card, SpecialCard) else None
+
+    if player.on_hand:
+        card = rng.choice(player.on_hand)
+        play(game, player.id, {"action": "discard", "discard_cards_ids": [card.id]})
+    return None
+
+
+# ----------------- Simulation ----------------- #
+
+
+def policy_rng(seed):
+    return random.Random(f"policy-{seed}")
+
+
+def play_game(seed, players=4, composition=None, max_turns=500):
+    """
+    Returns:
+        Tuple of (winner's seat or None, turns played, [(seat, special card type) for every special played])
+    """
+    game = Game(composition, seed)
+    for seat in range(players):
+        game.add_player(f"bot{seat}", seat)
+    game.start_game()
+    rng = policy_rng(seed)
+
+    plays = []
+    for turn in range(1, max_turns + 1):
+        seat = game.player_order[game.index_of_current_player]
+        special = play_turn(game, game.players[seat], rng)
+        if special:
+            plays.append((seat, special))
+        if game.check_if_winner():
+            return game.winner_id, turn, plays
+        game.next_player()
+    return None, max_turns, plays
+
+
+def simulate(seeds, players=4, composition=None, max_turns=500):
+    """Play one game per seed and aggregate them."""
+    stats = BalanceStats()
+    for seed in seeds:
+        winner, turns, plays = play_game(seed, players, composition, max_turns)
+        stats.games += 1
+        stats.game_turns[turns] += 1
+        if winner is None:
+            stats.stalled += 1
+        else:
+            stats.seat_wins[winner] += 1
+        stats.special_played.update(card_type for _, card_type in plays)
+        for seat, card_type in set(plays):
+            stats.special_players[card_type] += 1
+            if seat == winner:
+                stats.special_winners[card_type] += 1
+    return stats
+
+
+def run_simulations(games, players=4, composition=None, seed=0,
+                    max_turns=500, workers=None, chunk_size=250):
+    """
+    Play `games` seeded games over a pool of `workers` processes (one per
+    core by default). Seeds are seed .. seed + games - 1, so two
+    compositions run with the same seed are dealt from the same shuffles.
+    """
+    chunks = [range(start, min(start + chunk_size, seed + games))
+              for start in range(seed, seed + games, chunk_size)]
+    task = partial(simulate, players=players, composition=composition, max_turns=max_turns)
+    stats = BalanceStats()
+    with Pool(workers) as pool:
+        for chunk_stats in pool.imap_unordered(task, chunks):
+            stats.merge(chunk_stats)
+    return stats
+
+
+def balance_report(stats, players):
+    """Summary of the aggregated games, ready to be dumped as JSON."""
+    decided = stats.games - stats.stalled
+    lengths = sorted(stats.game_turns.elements())
+
+    def turns_at(fraction):
+        return lengths[min(int(fraction * len(lengths)), len(lengths) - 1)] if lengths else 0
+
+    baseline = 1 / players
+    specials = {}
+    for card_type in SpecialCard.card_types:
+        holders = stats.special_players[card_type]
+        win_rate = stats.special_winners[card_type] / holders if holders else 0.0
+        specials[card_type] = {
+            "plays_per_game": stats.special_played[card_type] / stats.games if stats.games else 0.0,
+            "win_rate_when_played": win_rate,
+            # above 1 when playing the card goes with winning more than the fair share
+            "win_rate_lift": win_rate / baseline if holders else 0.0,
+        }
+
+    return {
+        "games": stats.games,
+        "players": players,
+        "stalled": stats.stalled,
+        "seat_win_rate": {seat: stats.seat_wins[seat] / decided if decided else 0.0 for seat in range(players)},
+        "specials": specials,
+        "game_turns": {
+            "mean": sum(lengths) / len(lengths) if lengths else 0.0,
+            "p50": turns_at(0.5),
+            "p90": turns_at(0.9),
+            "max": lengths[-1] if lengths else 0,
+            # games per bucket of 10 turns
+            "histogram": dict(sorted(Counter(turns // 10 * 10 for turns in lengths).items())),
+        },
+    }
@@ -0,0 +1,201 @@
+"""
+Recorded games that can be replayed move by move.
+
+A trace holds what is needed to play a game again - its seed, players,
+deck composition and every move in order - together with what the engine
+answered to each move and a digest of the whole game state after it.
+Replaying a trace on the current engine and comparing answers and
+digests shows the first move where the engine behaves differently.
+
+Trace format (one JSON object per line in the fixture files):
+    {"seed": 7, "players": [0, 1], "composition": null,
+     "steps": [{"player_id": 0, "move": {...}, "result": {...},
+                "state": "3f2a..."},
+               {"player_id": 0, "move": "end_turn", "result": {...}, ...}],
+     "winner_id": 1}
+"""
+import gzip
+import hashlib
+import json
+from functools import partial
+from multiprocessing import Pool
+
+from .game import Game
+from .simulation import apply_move, play_turn, policy_rng
+
+
+def state_digest(game):
+    """Short hash of everything a move can change."""
+    state = (
+        game.index_of_current_player,
+        sorted(game.deck.cards),
+        sorted(game.deck.discard_pile),
+        [
+            (
+                player_id,
+                [card.id for card in game.players[player_id].on_hand],
+                [
+                    (stack.color, stack.status, [card.id for card in stack.cards])
+                    for stack in game.players[player_id].laid_out
+                ],
+            )
+            for player_id in game.player_order
+        ],
+    )
+    return hashlib.blake2b(repr(state).encode(), digest_size=8).hexdigest()
+
+
+def normalized(result):
+    # as read back from JSON
+    return json.loads(json.dumps(result))
+
+
+class TraceRecorder:
+    """Plays moves on a game and records them as a trace."""
+
+    def __init__(self, game):
+        self.game = game
+        self.steps = []
+
+    def play(self, game, player_id, move):
+        """apply_move() that records the move, usable as play_turn()'s play."""
+        result = apply_move(game, player_id, move)
+        self.record(player_id, move, result)
+        return result
+
+    def end_turn(self):
+        player_id = self.game.player_order[self.game.index_of_current_player]
+        result = {"next_player": self.game.next_player()}
+        self.record(player_id, "end_turn", result)
+        return result
+
+    def record(self, player_id, move, result):
+        self.steps.append({
+            "player_id": player_id,
+            "move": move,
+            "result": normalized(result),
+            "state": state_digest(self.game),
+        })
+
+    def trace(self):
+        return {
+            "seed": self.game.seed,
+            "players": list(self.game.player_order),
+            "composition": self.game.composition,
+            "steps": self.steps,
+            "winner_id": self.game.winner_id,
+        }
+
+
+def record_game(seed, players=4, composition=None, max_turns=500):
+    """Play a simulated game (see engine.simulation) and return its trace."""
+    game = Game(composition, seed)
+    for seat in range(players):
+        game.add_player(f"bot{seat}", seat)
+    game.start_game()
+    recorder = TraceRecorder(game)
+    rng = policy_rng(seed)
+
+    for _ in range(max_turns):
+        seat = game.player_order[game.index_of_current_player]
+        play_turn(game, game.players[seat], rng, recorder.play)
+        if game.check_if_winner():
+            break
+        recorder.end_turn()
+    return recorder.trace()
+
+
+def replay_trace(trace):
+    """
+    Play the trace again on the current engine.
+
+    Returns:
+        None when it behaves the same, otherwise a dict describing the
+        first step that differs
+    """
+    game = Game(trace["composition"], trace["seed"])
+    for player_id in trace["players"]:
+        game.add_player(f"bot{player_id}", player_id)
+    game.start_game()
+
+    for index, step in enumerate(trace["steps"]):
+        if step["move"] == "end_turn":
+            result = {"next_player": game.next_player()}
+        else:
+            result = apply_move(game, step["player_id"], step["move"])
+        result = normalized(result)
+        state = state_digest(game)
+        if result != step["result"] or state != step["state"]:
+            return {
+                "seed": trace["seed"],
+                "step": index,
+                "move": step["move"],
+                "expected": step["result"],
+                "actual": result,
+                "state_differs": state != step["state"],
+            }
+
+    game.check_if_winner()
+    if game.winner_id != trace["winner_id"]:
+        return {
+            "seed": trace["seed"],
+            "step": len(trace["steps"]),
+            "move": None,
+            "expected": {"winner_id": trace["winner_id"]},
+            "actual": {"winner_id": game.winner_id},
+            "state_differs": False,
+        }
+    return None
+
+
+# ----------------- Fixture files ----------------- #
+
+
+def write_traces(path, traces):
+    with gzip.open(path, "wt", encoding="utf-8") as fixture:
+        for trace in traces:
+            fixture.write(json.dumps(trace, separators=(",", ":")) + "\n")
+
+
+def read_trace_lines(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fixture:
+        return [line for line in fixture if line.strip()]
+
+
+def _replay_lines(lines):
+    divergences = []
+    for line in lines:
+        trace = json.loads(line)
+        try:
+            divergence = replay_trace(trace)
+        except Exception as e:
+            # an engine crash is a divergence too
+            divergence = {"seed": trace["seed"], "error": repr(e)}
+        if divergence:
+            divergences.append(divergence)
+    return len(lines), divergences
+
+
+def replay_traces(path, workers=None, chunk_size=100):
+    """
+    Replay every trace of a fixture file over a pool of processes.
+
+    Returns:
+        Tuple of (traces replayed, divergences)
+    """
+    lines = read_trace_lines(path)
+    chunks = [lines[start:start + chunk_size]
+              for start in range(0, len(lines), chunk_size)]
+    replayed, divergences = 0, []
+    with Pool(workers) as pool:
+        for count, found in pool.imap_unordered(_replay_lines, chunks):
+            replayed += count
+            divergences.extend(found)
+    return replayed, sorted(divergences, key=lambda d: d["seed"])
+
+
+def record_traces(seeds, players=4, composition=None, max_turns=500, workers=None):
+    """Record one simulated game per seed, in seed order, over a pool of processes."""
+    task = partial(record_game, players=players, composition=composition, max_turns=max_turns)
+    with Pool(workers) as pool:
+        return pool.map(task, seeds, chunksize=50)
@@ -9,15 +9,20 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'virus_the_game.settings')
+# set up Django before the websocket stack imports models and settings
+django_asgi_application = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from virus_the_game.routing import websocket_urlpatterns
 from virus_the_game.ws_auth import PlayerTokenAuthMiddlewareStack
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'virus_the_game.settings')
+from virus_the_game.lifespan import lifespan_application
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_application,
     "websocket": PlayerTokenAuthMiddlewareStack(
     URLRouter(websocket_urlpatterns)
     ),
+    "lifespan": lifespan_application,
 })
@@ -0,0 +1,375 @@
+"""
+Server-side bot players.
+
+A bot takes a seat the way a phone does. It joins the game through the
+join service, registers its channel in RedisChannelManager and joins the
+room group. It talks to the host with the frames PlayerConsumer forwards,
+built from frontend frames validated by PLAYER_ROUTES.
+
+A bot only knows what a player knows: its hand, its stacks and the
+room's public state. It asks the host for the public state the way a
+spectator does. It plays a cheap greedy policy: lay out an organ, heal,
+attack the leader, vaccinate, otherwise discard.
+
+With a Redis channel layer, the bots of a worker run in a "bots" thread,
+on their own event loop and channel layer instance. Their messages never
+queue behind the worker loop's human connections. The in-memory layer
+cannot be shared between loops, so with REDIS_URL = "memory://" the bots
+run on the worker's loop.
+"""
+import asyncio
+import json
+import random
+import threading
+
+from asgiref.sync import sync_to_async
+from channels.layers import (
+    DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+    )
+from django.conf import settings
+
+from backend.join_service import join_game
+from virus_the_game.consumer_helpers import (
+    RedisChannelManager, create_redis_connection
+    )
+from virus_the_game.consumers import PLAYER_ROUTES
+from virus_the_game.metrics import Gauge
+
+
+# ----------------- Policy ----------------- #
+
+
+def matches(color, other):
+    # rainbow organs take any color, rainbow cards go on any organ
+    return 'rainbow' in (color, other) or color == other
+
+
+def choose_moves(hand, stacks, opponents):
+    """
+    Card plays worth trying, best first, as frontend "card_play" data.
+
+    Args:
+        hand: the bot's "hand_state" cards
+        stacks: the bot's "stacks_state" stacks
+        opponents: the other players of the public state, with their stacks
+    """
+    basic = [card for card in hand if not card['card_type']]
+    organs = [card for card in basic if card['value'] == 0]
+    viruses = [card for card in basic if card['value'] == -1]
+    vaccines = [card for card in basic if card['value'] == 1]
+    own_colors = {stack['color'] for stack in stacks}
+
+    for card in organs:
+        if card['color'] not in own_colors:
+            yield {'action': 'organ', 'card_id': card['card_id']}
+
+    for card in vaccines:
+        for stack in stacks:
+            if stack['value'] == -1 and matches(card['color'], stack['color']):
+                yield {'action': 'heal', 'card_id': card['card_id'],
+                       'target_id': stack['stack_id']}
+
+    # the leader first
+    for card in viruses:
+        for other in sorted(opponents, key=lambda o: -len(o['stacks'])):
+            for stack in other['stacks']:
+                if stack['value'] < 2 \
+                        and matches(card['color'], stack['color']):
+                    yield {'action': 'attack', 'card_id': card['card_id'],
+                           'target_id': other['player_id'],
+                           'target_stack': stack['stack_id']}
+
+    for card in vaccines:
+        for stack in stacks:
+            if stack['value'] in (0, 1) \
+                    and matches(card['color'], stack['color']):
+                yield {'action': 'vaccinate', 'card_id': card['card_id'],
+                       'target_id': stack['stack_id']}
+
+
+# ----------------- Bot ----------------- #
+
+
+class BotStopped(Exception):
+    """The game is over, or the host went quiet."""
+
+
+class Bot:
+    """
+    One bot seat in a room.
+
+    Args:
+        runner: the BotRunner whose loop, channel layer and Redis it uses
+        room_code: room named after the game's id in the database
+        nickname: Player nickname, reused when the bot plays again
+    """
+
+    def __init__(self, runner, room_code, nickname):
+        self.runner = runner
+        self.room_code = room_code
+        self.nickname = nickname
+        self.player_id = None
+        self.channel_name = None
+        self.hand = []
+        self.stacks = []
+        self.public_state = None
+        self.rng = random.Random()
+
+    @property
+    def channel_layer(self):
+        return self.runner.channel_layer
+
+    async def run(self):
+        manager = await self.runner.channel_manager()
+        response = await sync_to_async(join_game)(
+            self.room_code, self.nickname
+            )
+        self.player_id = response['player_id']
+        self.channel_name = await self.channel_layer.new_channel('bot.')
+        await manager.add_player(
+            self.room_code, self.player_id, self.channel_name
+            )
+        await self.channel_layer.group_add(self.room_code, self.channel_name)
+        try:
+            await self.send_group_message('player_connected')
+            await self.send('connection', {'action': 'add'})
+            if not (await self.wait_for('attempt'))['status']:
+                return
+            while True:
+                if (await self.wait_for('turn_state'))['status']:
+                    await self.take_turn()
+        except BotStopped:
+            pass
+        finally:
+            await self.send_group_message('player_disconnected')
+            await manager.remove_player(self.room_code, self.player_id)
+            await self.channel_layer.group_discard(
+                self.room_code, self.channel_name
+            )
+
+    async def take_turn(self):
+        """Play the first card the host accepts, or discard, then end the turn."""
+        await asyncio.sleep(self.runner.think_time)
+        # hand and stacks were sent before the reply to this request
+        await self.request_public_state()
+        opponents = [
+            player for player in self.public_state['players']
+            if player['player_id'] != self.player_id
+        ]
+        played = False
+        for move in choose_moves(self.hand, self.stacks, opponents):
+            await self.send('card_play', move)
+            if (await self.wait_for('attempt'))['status']:
+                played = True
+                break
+        if not played and self.hand:
+            card = self.rng.choice(self.hand)
+            await self.send('card_play', {
+                'action': 'discard', 'card_id': card['card_id']
+            })
+            await self.wait_for('attempt')
+        await self.send('turn_end', {'action': 'end_turn'})
+        self.runner.turns += 1
+
+    # ----------------- message senders ---------------- #
+
+    async def send(self, header, data):
+        """Send a frontend frame to the host, as PlayerConsumer would."""
+        handler, payload = PLAYER_ROUTES.route('frontend', header, data)
+        if handler == 'join_room':
+            payload['nickname'] = self.nickname
+        host_channel = await self.host_channel()
+        await self.channel_layer.send(host_channel, {
+            'type': 'player_message',
+            'header': header,
+            'sender': str(self.player_id),
+            'data': payload,
+            'trace': None,
+        })
+
+    async def send_group_message(self, message):
+        await self.channel_layer.group_send(self.room_code, {
+            'type': 'group_message',
+            'sender': self.player_id,
+            'message': message,
+        })
+
+    async def request_public_state(self):
+        await self.channel_layer.send(await self.host_channel(), {
+            'type': 'spectator_snapshot_request',
+            'reply_channel': self.channel_name,
+        })
+        await self.wait_for('snapshot')
+
+    async def host_channel(self):
+        manager = await self.runner.channel_manager()
+        host_channel = await manager.get_host_channel(self.room_code)
+        if host_channel is None:
+            raise BotStopped()
+        return host_channel
+
+    # ----------------- message receivers ---------------- #
+
+    async def wait_for(self, *headers):
+        """
+        Read events until a host message with one of the headers arrives,
+        keeping the bot's view of the game up to date on the way.
+
+        Returns:
+            The data of that message
+        """
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    self.channel_layer.receive(self.channel_name),
+                    self.runner.reply_timeout
+                )
+            except asyncio.TimeoutError:
+                raise BotStopped()
+            match event['type']:
+                case 'host_message':
+                    header, data = event['header'], event['data']
+                case 'spectator_snapshot':
+                    header, data = 'snapshot', None
+                    self.public_state = json.loads(event['text'])['data']
+                case _:
+                    continue
+            match header:
+                case 'hand_state':
+                    self.hand = data['cards']
+                case 'stacks_state':
+                    self.stacks = data['stacks']
+                case 'game_over':
+                    raise BotStopped()
+            if header in headers:
+                return data
+
+
+# ----------------- Runner ----------------- #
+
+
+class BotRunner:
+    """
+    The bots of a worker.
+
+    Args:
+        threaded: run the bots on an event loop of their own in a thread
+        think_time: seconds a bot waits before playing its turn
+        max_bots: bots allowed at once in the worker
+    """
+
+    def __init__(self, threaded, think_time, max_bots):
+        self.threaded = threaded
+        self.think_time = think_time
+        self.max_bots = max_bots
+        # the host is reaped after ROOM_IDLE_TIMEOUT of silence, so is a bot
+        self.reply_timeout = settings.ROOM_IDLE_TIMEOUT or None
+        self.bots = set()
+        self.tasks = set()  # of the bots, on the loop they run on
+        self.turns = 0
+        self.loop = None
+        self.channel_layer = None
+        self._channel_manager = None
+        if threaded:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(
+                target=self.loop.run_forever, name="bots", daemon=True
+            )
+            self.thread.start()
+            # channels_redis connections belong to the loop they were made on
+            self.channel_layer = channel_layers.make_backend(
+                DEFAULT_CHANNEL_LAYER
+            )
+
+    @property
+    def running(self):
+        return len(self.bots)
+
+    async def channel_manager(self):
+        """RedisChannelManager shared by the bots, opened on their loop."""
+        if self._channel_manager is None:
+            redis = await create_redis_connection()
+            self._channel_manager = RedisChannelManager(redis)
+        return self._channel_manager
+
+    def add_bots(self, room_code, nicknames):
+        """
+        Start one bot per nickname in the room, returns immediately.
+
+        Raises:
+            ValueError: the worker runs max_bots bots already
+        """
+        if self.running + len(nicknames) > self.max_bots:
+            raise ValueError(
+                f"This server runs {self.running} of {self.max_bots} bots!"
+            )
+        for nickname in nicknames:
+            bot = Bot(self, room_code, nickname)
+            self.bots.add(bot)
+            if self.threaded:
+                asyncio.run_coroutine_threadsafe(self.run_bot(bot), self.loop)
+            else:
+                if self.channel_layer is None:
+                    self.channel_layer = channel_layers[DEFAULT_CHANNEL_LAYER]
+                asyncio.ensure_future(self.run_bot(bot))
+
+    async def run_bot(self, bot):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            await bot.run()
+        except Exception as e:
+            print(f"Bot {bot.nickname} in room {bot.room_code} failed: {e!r}")
+        finally:
+            self.tasks.discard(task)
+            self.bots.discard(bot)
+
+    async def cancel_bots(self):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        # lets them leave Redis and their room group
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stop(self):
+        """Stop every bot, and the bots' thread."""
+        if not self.threaded:
+            await self.cancel_bots()
+            return
+        await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self.cancel_bots(), self.loop)
+        )
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        await asyncio.to_thread(self.thread.join, 5)
+
+
+_runner = None
+
+
+def get_bot_runner():
+    """The worker's bot runner, created on first use."""
+    global _runner
+    if _runner is None:
+        in_memory = isinstance(
+            channel_layers[DEFAULT_CHANNEL_LAYER], InMemoryChannelLayer
+        )
+        _runner = BotRunner(
+            settings.BOT_THREAD and not in_memory,
+            settings.BOT_THINK_TIME,
+            settings.BOT_MAX_PER_WORKER,
+        )
+        BOTS_RUNNING.set_function(lambda: _runner.running)
+    return _runner
+
+
+async def stop_bot_runner():
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner = None
+
+
+BOTS_RUNNING = Gauge(
+    'virus_bots_running',
+    'Bot players seated by this worker'
+)
@@ -1,10 +1,52 @@
+import time
+
 import httpx
 import aioredis
+from django.conf import settings
+
+from virus_the_game.metrics import REDIS_LATENCY
 
 
 # ----------------- API Interaction Helpers ----------------- #
 
 
+_api_client = None
+
+
+def get_api_client():
+    """
+    Shared client for the Django API, keeping connections alive between
+    calls. With API_TRANSPORT = "asgi" the requests are handed straight to
+    this process's Django application, without a socket in between.
+    """
+    global _api_client
+    if _api_client is None:
+        if settings.API_TRANSPORT == 'asgi':
+            from django.core.asgi import get_asgi_application
+            transport = httpx.ASGITransport(app=get_asgi_application())
+            base_url = "http://localhost/api/"
+        else:
+            transport = None
+            base_url = settings.API_BASE_URL
+        _api_client = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20
+            )
+        )
+    return _api_client
+
+
+async def close_api_client():
+    """Close the shared API client, called on worker shutdown."""
+    global _api_client
+    if _api_client is not None:
+        await _api_client.aclose()
+        _api_client = None
+
+
 async def get_api_data(
         endpoint: str,
         headers: dict = None,
@@ -24,14 +66,14 @@ async def get_api_data(
     Returns:
         Tuple of (status_code, response_json_dict)
     """
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.get(
-            f"localhost:8000/api/{endpoint}",
-            headers=headers,
-            data=data
-        )
+    response = await get_api_client().get(
+        endpoint,
+        headers=headers,
+        params=data,
+        timeout=timeout
+    )
 
-        return response.status_code, response.json()
+    return response.status_code, response.json()
 
 
 async def post_api_data(
@@ -53,14 +95,14 @@ async def post_api_data(
     Returns:
         Tuple of (status_code, response_json_dict)
     """
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.post(
-            f"localhost:8000/api/{endpoint}",
-            headers=headers,
-            data=data
-        )
+    response = await get_api_client().post(
+        endpoint,
+        headers=headers,
+        data=data,
+        timeout=timeout
+    )
 
-        return response.status_code, response.json()
+    return response.status_code, response.json()
 
 
 async def delete_api_data(
@@ -82,14 +124,16 @@ async def delete_api_data(
     Returns:
         Tuple of (status_code, response_json_dict)
     """
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.delete(
-            f"localhost:8000/api/{endpoint}",
-            headers=headers,
-            data=data
-        )
+    # httpx only takes a body on DELETE through the generic request()
+    response = await get_api_client().request(
+        "DELETE",
+        endpoint,
+        headers=headers,
+        data=data,
+        timeout=timeout
+    )
 
-        return response.status_code, response.json()
+    return response.status_code, response.json()
 
 
 # ----------------- Redis Chanel Management ----------------- #
@@ -99,49 +143,65 @@ class RedisChannelManager:
     """
     Manages player and host channel names using Redis.
     Stores mapping of room_code -> player_id -> channel_name
+    and the set of rooms that currently have a host.
     """
 
+    rooms_key = "rooms"
+
     def __init__(self, redis_connection):
         self.redis = redis_connection
 
+    async def _call(self, command, *args):
+        """Run a Redis command, recording its round-trip time."""
+        started = time.perf_counter()
+        result = await getattr(self.redis, command)(*args)
+        REDIS_LATENCY.labels(command).observe(time.perf_counter() - started)
+        return result
+
     async def add_player(self, room_code, player_id, channel_name):
         """Register a player's channel name in Redis."""
         key = f"room:{room_code}:players"
-        await self.redis.hset(key, player_id, channel_name)
+        await self._call('hset', key, player_id, channel_name)
 
     async def remove_player(self, room_code, player_id):
         """Unregister a player from Redis."""
         key = f"room:{room_code}:players"
-        await self.redis.hdel(key, player_id)
+        await self._call('hdel', key, player_id)
 
     async def set_host(self, room_code, channel_name):
         """Register the host's channel name in Redis."""
         key = f"room:{room_code}:host"
-        await self.redis.set(key, channel_name)
+        await self._call('set', key, channel_name)
+        await self._call('sadd', self.rooms_key, room_code)
 
     async def remove_host(self, room_code):
         """Unregister the host from Redis."""
         key = f"room:{room_code}:host"
-        await self.redis.delete(key)
+        await self._call('delete', key)
+        await self._call('srem', self.rooms_key, room_code)
 
     async def get_player_channel(self, room_code, player_id):
         """Get a specific player's channel name from Redis."""
         key = f"room:{room_code}:players"
-        channel_name = await self.redis.hget(key, player_id)
+        channel_name = await self._call('hget', key, player_id)
         return channel_name.decode() if channel_name else None
 
     async def get_host_channel(self, room_code):
         """Get the host's channel name from Redis."""
         key = f"room:{room_code}:host"
-        channel_name = await self.redis.get(key)
+        channel_name = await self._call('get', key)
         return channel_name.decode() if channel_name else None
 
     async def get_all_players(self, room_code):
         """Get all players in a room from Redis."""
         key = f"room:{room_code}:players"
-        players = await self.redis.hgetall(key)
+        players = await self._call('hgetall', key)
         return {k.decode(): v.decode() for k, v in players.items()}
 
+    async def count_rooms(self):
+        """Number of rooms with a registered host."""
+        return await self._call('scard', self.rooms_key)
+
     async def get_room_participants(self, room_code):
         """Get all participants (players + host) from Redis."""
         return {
@@ -149,13 +209,97 @@ class RedisChannelManager:
             'host': await self.get_host_channel(room_code)
         }
 
+    async def store_game(self, room_code, payload, ttl):
+        """Keep the serialized game of a spilled room in Redis, ttl in s."""
+        await self._call('setex', f"room:{room_code}:game", ttl, payload)
+
+    async def load_game(self, room_code):
+        """Get the serialized game of a spilled room from Redis."""
+        return await self._call('get', f"room:{room_code}:game")
+
+    async def delete_game(self, room_code):
+        """Drop the serialized game once it is back in memory."""
+        await self._call('delete', f"room:{room_code}:game")
+
     async def cleanup_room(self, room_code):
         """Clean up all data for a room from Redis."""
-        await self.redis.delete(f"room:{room_code}:players")
-        await self.redis.delete(f"room:{room_code}:host")
+        await self._call('delete', f"room:{room_code}:players")
+        await self._call('delete', f"room:{room_code}:host")
+        await self._call('delete', f"room:{room_code}:game")
+        await self._call('srem', self.rooms_key, room_code)
+
+
+class InMemoryRedis:
+    """
+    In-process stand-in for the aioredis connection.
+    Implements only the commands used by RedisChannelManager,
+    storing bytes the same way Redis returns them.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    async def hset(self, key, field, value):
+        self.data.setdefault(key, {})[self._encode(field)] = \
+            self._encode(value)
+
+    async def hdel(self, key, field):
+        self.data.get(key, {}).pop(self._encode(field), None)
+
+    async def hget(self, key, field):
+        return self.data.get(key, {}).get(self._encode(field))
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def set(self, key, value):
+        self.data[key] = self._encode(value)
+
+    async def setex(self, key, seconds, value):
+        # never expires, the room's cleanup deletes it
+        self.data[key] = self._encode(value)
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(self._encode(member))
+
+    async def srem(self, key, member):
+        self.data.get(key, set()).discard(self._encode(member))
+
+    async def scard(self, key):
+        return len(self.data.get(key, ()))
+
+    def close(self):
+        # shared between all consumers of the worker, nothing to release
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+_in_memory_redis = InMemoryRedis()
+
+
+async def create_redis_connection():
+    """
+    Open a Redis connection for the configured REDIS_URL.
+    With "memory://" every consumer of the worker shares one InMemoryRedis.
+    """
+    if settings.REDIS_URL.startswith('memory://'):
+        return _in_memory_redis
+    return await aioredis.create_redis_pool(settings.REDIS_URL)
 
 
 async def get_redis_manager():
     """Get or create Redis connection for channel management."""
-    redis = await aioredis.create_redis_pool('redis://redis:6379')
+    redis = await create_redis_connection()
     return RedisChannelManager(redis)
@@ -1,11 +1,125 @@
+import asyncio
 import json
-import aioredis
+import time
+from contextlib import asynccontextmanager
+from functools import partial
 from channels.generic.websocket import AsyncWebsocketConsumer
-from consumer_helpers import (
-    get_api_data, post_api_data, delete_api_data, RedisChannelManager
+from django.conf import settings
+from backend.recorder import get_result_recorder
+from virus_the_game.consumer_helpers import (
+    get_api_data, post_api_data, delete_api_data, RedisChannelManager,
+    create_redis_connection
     )
-from ..engine.game import Game
-from ..engine.player import Player
+from virus_the_game.governor import GameLost, get_memory_governor
+from virus_the_game.heartbeat import get_heartbeat_monitor
+from virus_the_game.message_router import (
+    Field, InvalidMessage, MessageRouter, Schema, int_list
+    )
+from virus_the_game.metrics import CONNECTIONS, MESSAGES, MOVE_RESOLUTION
+from virus_the_game.replay import ReplayBuffer
+from virus_the_game.timers import get_timer_service
+from virus_the_game.tracing import (
+    start_trace, add_span, finish_trace, trace_id
+    )
+from engine.game import Game
+from engine.player import Player
+
+
+# ================== Message Routes =================== #
+
+
+def single_id_list(card_id):
+    return [int(card_id)]
+
+
+# frames a player's frontend may send, with the payload forwarded to host
+PLAYER_ROUTES = MessageRouter()
+PLAYER_ROUTES.register(
+    'frontend', 'connection', 'join_room',
+    schema=Schema(constants={'action': 'add'})
+)
+PLAYER_ROUTES.register(
+    'frontend', 'connection', 'join_room', action='resume',
+    schema=Schema(
+        Field('last_seq', cast=int, required=False, default=0),
+        constants={'action': 'resume'}
+    )
+)
+PLAYER_ROUTES.register('frontend', 'pong', None)
+PLAYER_ROUTES.register(
+    'frontend', 'turn_end', 'send_message_to_host',
+    schema=Schema(constants={'action': 'end-turn'})
+)
+PLAYER_ROUTES.register(
+    'frontend', 'card_play', 'send_message_to_host', action='attack',
+    schema=Schema(
+        Field('card_id', cast=int),
+        Field('target_stack', cast=int),
+        Field('target_player_id', 'target_id', cast=int),
+        constants={'action': 'attack'}
+    )
+)
+for action in ('vaccinate', 'heal'):
+    PLAYER_ROUTES.register(
+        'frontend', 'card_play', 'send_message_to_host', action=action,
+        schema=Schema(
+            Field('card_id', cast=int),
+            Field('target_stack', 'target_id', cast=int),
+            constants={'action': action}
+        )
+    )
+PLAYER_ROUTES.register(
+    'frontend', 'card_play', 'send_message_to_host', action='organ',
+    schema=Schema(
+        Field('card_id', cast=int),
+        constants={'action': 'organ'}
+    )
+)
+PLAYER_ROUTES.register(
+    'frontend', 'card_play', 'send_message_to_host', action='discard',
+    schema=Schema(
+        Field('discard_cards_ids', 'card_id', cast=single_id_list),
+        constants={'action': 'discard'}
+    )
+)
+_swap_fields = (
+    Field('target_player_id', 'target_id', cast=int),
+    Field('target_stack', cast=int),
+    Field('stack', 'player_stack', cast=int),
+)
+PLAYER_ROUTES.register(
+    'frontend', 'card_play', 'send_message_to_host', action='special',
+    schema=Schema(
+        Field('card_id', cast=int),
+        Field('card_type', cast=str, required=False),
+        constants={'action': 'special'},
+        variant='card_type',
+        variants={
+            'organ swap': _swap_fields,
+            'body swap': _swap_fields,
+            'thieft': _swap_fields[:2],
+            'epidemy': (
+                Field('player_stacks', cast=int_list),
+                Field('target_stacks', cast=int_list),
+                Field('target_players_ids', 'target_players', cast=int_list),
+                Field('virus_cards_ids', 'virus_cards', cast=int_list),
+            ),
+        }
+    )
+)
+
+# frames reaching the host, player ones were validated by PlayerConsumer
+HOST_ROUTES = MessageRouter()
+HOST_ROUTES.register('player', 'connection', 'connect_player')
+HOST_ROUTES.register('player', 'card_play', 'players_move')
+HOST_ROUTES.register('player', 'turn_end', 'end_turn')
+HOST_ROUTES.register('player', 'all_stacks', 'provide_other_stacks')
+HOST_ROUTES.register('frontend', 'game_start', 'start_game')
+HOST_ROUTES.register(
+    'frontend', 'add_bot', 'add_bot',
+    schema=Schema(Field('count', cast=int, required=False, default=1))
+)
+HOST_ROUTES.register('frontend', 'pong', None)
 
 
 # ==================== Game Consumer ==================== #
@@ -32,6 +146,9 @@ class PlayerConsumer(AsyncWebsocketConsumer):
 
         self.player = player
         self.nickname = player.nickname
+        auth_started, auth_finished = self.scope["auth_span"]
+        connect_trace = start_trace('auth_start', started=auth_started)
+        connect_trace['spans'].append(['auth_end', auth_finished])
 
         # Join room group
         print("Connecting...")
@@ -44,7 +161,7 @@ class PlayerConsumer(AsyncWebsocketConsumer):
             self.channel_name
             )
         # Initialize Redis manager
-        self.redis = await aioredis.create_redis_pool('redis://redis:6379')
+        self.redis = await create_redis_connection()
         self.channel_manager = RedisChannelManager(self.redis)
 
         await self.channel_layer.group_add(
@@ -56,12 +173,16 @@ class PlayerConsumer(AsyncWebsocketConsumer):
         await self.channel_manager.add_player(
             self.room_code, self.player_id, self.channel_name
             )
+        add_span(connect_trace, 'registered')
         await self.accept()
+        finish_trace(connect_trace, 'accepted')
+        CONNECTIONS.labels('player').inc()
 
         print("Player connected to", self.room_group_name)
         players = await self.channel_manager.get_all_players(self.room_code)
         print(f"Room Manager - Room: {self.room_code}, Players: {players}")
         print("Connected.")
+        get_heartbeat_monitor().register(self)
 
         # Notify lobby of new connection
         await self.send_group_message('player_connected')
@@ -71,6 +192,11 @@ class PlayerConsumer(AsyncWebsocketConsumer):
         Handle player disconnection.
         Removes player from Redis registry and cleans up Redis connection.
         """
+        if not hasattr(self, 'channel_manager'):
+            # rejected by the token check, nothing was registered
+            return
+        CONNECTIONS.labels('player').dec()
+        get_heartbeat_monitor().unregister(self)
         # Sending the change to the lobby
         await self.send_group_message('player_disconnected')
 
@@ -93,6 +219,10 @@ class PlayerConsumer(AsyncWebsocketConsumer):
 
     # ----------------- message senders ---------------- #
 
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        MESSAGES.labels('out').inc()
+        await super().send(text_data, bytes_data, close)
+
     async def send_group_message(self, message):
         """
         Broadcast a message to all players in the room group.
@@ -107,7 +237,7 @@ class PlayerConsumer(AsyncWebsocketConsumer):
             }
         )
 
-    async def send_message_to_host(self, header, data):
+    async def send_message_to_host(self, header, data, trace=None):
         """
         Send a direct message to the host.
         Uses Redis to lookup host's channel name for direct delivery.
@@ -115,6 +245,7 @@ class PlayerConsumer(AsyncWebsocketConsumer):
         host_channel = await self.channel_manager.get_host_channel(
             self.room_code
             )
+        add_span(trace, 'host_lookup')
         if host_channel:
             await self.channel_layer.send(
                 host_channel,
@@ -123,162 +254,76 @@ class PlayerConsumer(AsyncWebsocketConsumer):
                     'header': header,
                     'sender': str(self.player_id),
                     'data': data,
+                    'trace': trace,
                     }
             )
 
     # ----------------- message receivers ---------------- #
 
+    async def group_message(self, event):
+        """
+        Handle a broadcast to the room group.
+        Forwards room-wide notifications to the frontend.
+        """
+        await self.send(json.dumps({
+            'sender': str(event.get('sender')),
+            'header': event.get('message'),
+            'data': {},
+        }))
+
     async def host_message(self, event):
         """
         Handle incoming message from host.
         Receives direct messages from the host player.
         """
+        trace = add_span(event.get('trace'), 'reply_received')
         await self.send(json.dumps({
+            'sender': event.get('sender'),
+            'header': event.get('header'),
             'data': event.get('data'),
-            'sender': event.get('sender')
+            'seq': event.get('seq'),
+            'trace_id': trace_id(trace),
         }))
+        if trace:
+            finish_trace(trace, 'reply_sent')
 
-    async def receive(self, message):
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Handle incoming WebSocket messages from the player.
-        Parses action type and routes to appropriate handler
-        """
-        sender = message.get('sender', 'unknown')
-        header = message.get('header', '')
-        data = message.get('data', {})
-        match sender:
-            case 'host':
-                await self.handle_host_message()
-            case 'frontend':
-                await self.handle_player_action(header, data)
-
-    async def handle_player_action(self, header, data):
-        """
-        Handle messages received from the player.
-        Routes based on header
-        """
-        match header:
-            case 'connection':
-                await self.send_message_to_host(
-                    header,
-                    {'action': 'add',
-                     'nickname': self.nickname}
-                    )
-            case "turn_end":
-                await self.send_message_to_host(
-                    header,
-                    {'action': 'end-turn'}
-                    )
-            case 'card_play':
-                attempt_info = self.parse_player_action(data)
-                await self.send_message_to_host(
-                    header,
-                    attempt_info
-                    )
-
-    async def handle_host_message(self):
-        """
-        Handle messages received from the host.
-        Processes game state updates or commands sent by the host.
-        """
-        pass  # reaction is handled in frontend
-
-    # ------------ game logic helpers ------------------ #
-
-    def parse_player_action(self, data):
-        """
-        Route player action to the appropriate handler method.
-        Parses action type and extracts relevant parameters.
+        Validates the frame against PLAYER_ROUTES and calls its handler,
+        frames without a route are answered with a failed attempt.
         """
+        received = time.time()
+        MESSAGES.labels('in').inc()
+        get_heartbeat_monitor().beat(self)
+        try:
+            message = json.loads(text_data)
+            header = message.get('header')
+            handler, payload = PLAYER_ROUTES.route(
+                message.get('sender'),
+                header,
+                message.get('data', {})
+                )
+        except (ValueError, AttributeError) as e:
+            await self.reject_message(str(e))
+            return
+        trace = start_trace(
+            'player_receive', message.get('trace_id'), received
+            )
+        if handler:
+            await getattr(self, handler)(header, payload, trace)
 
-        action = data.get('action')
-
-        # Route to appropriate handler based on action type
-        if action == 'attack':
-            attempt_info = self.get_attack_attempt_info(data)
-        elif action == 'vaccinate':
-            attempt_info = self.get_vaccinate_attempt_info(data)
-        elif action == 'heal':
-            attempt_info = self.get_heal_attempt_info(data)
-        elif action == 'organ':
-            attempt_info = self.get_organ_attempt_info(data)
-        elif action == 'discard':
-            attempt_info = self.get_discard_attempt_info(data)
-        elif action == 'special':
-            attempt_info = self.get_special_attempt_info(data)
-        else:
-            attempt_info = {'action': action}
-
-        return attempt_info
-
-    def get_attack_attempt_info(self, data):
-        """Extract action info for attack action."""
-        return {
-            'action': 'attack',
-            'card_to_play': data.get('card_id'),
-            'target_stack': data.get('target_id'),
-            'target_player': data.get('target_id'),
-        }
-
-    def get_vaccinate_attempt_info(self, data):
-        """Extract action info for vaccinate action."""
-        return {
-            'action': 'vaccinate',
-            'card_to_play': data.get('card_id'),
-            'target_stack': data.get('target_id'),
-        }
-
-    def get_heal_attempt_info(self, data):
-        """Extract action info for heal action."""
-        return {
-            'action': 'heal',
-            'card_to_play': data.get('card_id'),
-            'target_stack': data.get('target_id'),
-        }
-
-    def get_organ_attempt_info(self, data):
-        """Extract action info for organ action."""
-        return {
-            'action': 'organ',
-            'card_to_play': data.get('card_id'),
-        }
-
-    def get_discard_attempt_info(self, data):
-        """Extract action info for discard action."""
-        return {
-            'action': 'discard',
-            'card_to_play': data.get('card_id'),
-        }
-
-    def get_special_attempt_info(self, data):
-        """Extract action info for special action based on card type."""
-        card_type = data.get('card_type')
-        attempt_info = {
-            'action': 'special',
-            'card_type': card_type,
-            'card_to_play': data.get('card_id'),
-        }
-
-        if card_type in ["organ swap", "body swap", "theft"]:
-            attempt_info.update({
-                'target_player': data.get('target_id'),
-                'target_stack': data.get('target_stack')
-            })
-
-        if card_type in ["organ swap", "body swap"]:
-            attempt_info.update({
-                'player_stack': data.get('player_stack')
-            })
-
-        if card_type == "epidemy":
-            attempt_info.update({
-                'player_stacks': data.get('player_stacks'),
-                'target_stacks': data.get('target_stacks'),
-                'target_players': data.get('target_players'),
-                'virus_cards': data.get('virus_cards')
-            })
+    async def reject_message(self, reason):
+        await self.send(json.dumps({
+            'sender': 'lobby',
+            'header': 'attempt',
+            'data': {'status': False, 'message': reason},
+        }))
 
-        return attempt_info
+    async def join_room(self, header, data, trace=None):
+        """Ask the host to seat the player, or to resume its session."""
+        data['nickname'] = self.nickname
+        await self.send_message_to_host(header, data, trace)
 
 
 # =================== Host Consumer ==================== #
@@ -305,7 +350,7 @@ class HostConsumer(AsyncWebsocketConsumer):
         self.room_group_name = f"{self.room_code}"
 
         # Initialize Redis manager
-        self.redis = await aioredis.create_redis_pool('redis://redis:6379')
+        self.redis = await create_redis_connection()
         self.channel_manager = RedisChannelManager(self.redis)
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -316,17 +361,34 @@ class HostConsumer(AsyncWebsocketConsumer):
         await self.channel_manager.set_host(self.room_code, self.channel_name)
 
         await self.accept()
+        CONNECTIONS.labels('host').inc()
+        get_heartbeat_monitor().register(self)
         print("Host connected to", self.room_group_name)
         print(f"Room Manager created in Redis for room: {self.room_code}")
 
         # Creating the game instance in the host consumer
         self.game = Game()
+        self.game_lock = asyncio.Lock()
+        self.replay = ReplayBuffer(settings.REPLAY_BUFFER_SIZE)
+        self.spectator_group_name = f"{self.room_code}.spectators"
+        self.spectator_seq = 0
+        self.spectator_snapshot_cache = None
+        self.bots_added = 0
+        self.reset_idle_timer()
+        # registers the room with the worker's memory governor
+        async with self.active_game():
+            pass
 
     async def disconnect(self, close_code):
         """
         Handle host disconnection.
         Cleans up all room data in Redis and closes Redis connection.
         """
+        CONNECTIONS.labels('host').dec()
+        get_heartbeat_monitor().unregister(self)
+        get_timer_service().cancel(f"turn:{self.room_code}")
+        get_timer_service().cancel(f"idle:{self.room_code}")
+        get_memory_governor().unregister(self.room_code)
         # Clean up room data in Redis
         await self.channel_manager.cleanup_room(self.room_code)
 
@@ -344,6 +406,10 @@ class HostConsumer(AsyncWebsocketConsumer):
 
     # ------------------ message senders ----------------- #
 
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        MESSAGES.labels('out').inc()
+        await super().send(text_data, bytes_data, close)
+
     async def send_group_message(self, message):
         """
         Broadcast a message to all players in the room group.
@@ -358,63 +424,134 @@ class HostConsumer(AsyncWebsocketConsumer):
             }
         )
 
-    async def send_message_to_player(self, player_id, header, data):
+    async def send_message_to_player(self, player_id, header, data,
+                                     trace=None):
         """
-        Send a direct message to the host.
-        Uses Redis to lookup host's channel name for direct delivery.
+        Send a direct message to a player.
+        Numbers it with the room's next sequence number and keeps it in
+        the replay buffer, so it can be resent if the player was offline.
+        """
+        seq = self.replay.append(player_id, header, data)
+        await self.deliver_to_player(player_id, seq, header, data, trace)
+
+    async def deliver_to_player(self, player_id, seq, header, data,
+                                trace=None):
+        """
+        Deliver an already numbered message to a player.
+        Uses Redis to lookup player's channel name for direct delivery.
         """
-        host_channel = await self.channel_manager.get_player_channel(
+        player_channel = await self.channel_manager.get_player_channel(
             self.room_code,
             player_id
             )
-        if host_channel:
+        add_span(trace, 'reply_lookup')
+        if player_channel:
             await self.channel_layer.send(
-                host_channel,
+                player_channel,
                 {
                     'type': 'host_message',
                     'header': header,
                     'sender': "host",
                     'data': data,
+                    'seq': seq,
+                    'trace': trace,
                     }
             )
 
     # ----------------- message receivers ---------------- #
 
+    async def group_message(self, event):
+        """
+        Handle a broadcast to the room group.
+        Forwards room-wide notifications to the host frontend.
+        """
+        await self.send(json.dumps({
+            'sender': str(event.get('sender')),
+            'header': event.get('message'),
+            'data': {},
+        }))
+
     async def player_message(self, event):
-        """Handle incoming message from a player."""
+        """
+        Handle incoming message from a player.
+        Applies it to the game and mirrors it to the host frontend.
+        """
+        trace = add_span(event.get('trace'), 'host_receive')
+        self.reset_idle_timer()
         await self.send(json.dumps({
-            'action': event.get('action'),
-            'data': event.get('data')
+            'sender': event.get('sender'),
+            'header': event.get('header'),
+            'data': event.get('data'),
+            'trace_id': trace_id(trace),
             }))
+        try:
+            handler, payload = HOST_ROUTES.route(
+                'player', event.get('header'), event.get('data', {})
+                )
+        except InvalidMessage as e:
+            print(f"Dropped message from player {event.get('sender')}: {e}")
+            return
+        async with self.active_game():
+            await getattr(self, handler)(
+                int(event.get('sender')), payload, trace
+                )
 
-    async def receive(self, message):
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Handle incoming WebSocket messages from the host.
         Routes host commands and game logic decisions.
         """
-        sender = message.get('sender', 'unknown')
-        header = message.get('header', '')
-        data = message.get('data', {})
-        match sender:
-            case 'player':
-                await self.handle_player_message(sender, header, data)
-            case 'frontend':
-                await self.handle_host_action(header, data)
-
-    async def handle_player_message(self, sender, header, data):
-        match header:
-            case "connection":
-                await self.connect_player(int(sender), data)
-            case "card_play":
-                await self.players_move(int(sender), data)
-            case "turn_end":
-                await self.evaluate_turn(int(sender))
-            case "all_stacks":
-                await self.provide_other_stacks(int(sender))
+        MESSAGES.labels('in').inc()
+        get_heartbeat_monitor().beat(self)
+        self.reset_idle_timer()
+        try:
+            message = json.loads(text_data)
+            handler, payload = HOST_ROUTES.route(
+                message.get('sender'),
+                message.get('header'),
+                message.get('data', {})
+                )
+        except (ValueError, AttributeError) as e:
+            await self.send(json.dumps({
+                'sender': 'lobby',
+                'header': 'attempt',
+                'data': {'status': False, 'message': str(e)}
+            }))
+            return
+        if handler:
+            async with self.active_game():
+                await getattr(self, handler)(payload)
+
+    @asynccontextmanager
+    async def active_game(self):
+        """
+        Keep the room's game in memory while a message is handled.
+        Loads it back from Redis if the memory governor spilled it, and
+        holds the lock the governor takes before spilling a room.
+        """
+        async with self.game_lock:
+            try:
+                await get_memory_governor().touch(self)
+            except GameLost as e:
+                print(f"{e}, closing the room")
+                await self.channel_manager.cleanup_room(self.room_code)
+                await self.close(code=4008)
+                raise
+            yield self.game
+
+    async def dispatch(self, message):
+        try:
+            await super().dispatch(message)
+        except GameLost:
+            # active_game() closed the room already
+            pass
 
     # ------------ game logic helpers ------------------ #
 
-    async def connect_player(self, player_id, data):
+    async def connect_player(self, player_id, data, trace=None):
+        if data.get('action') == 'resume' and player_id in self.game.players:
+            await self.resume_player(player_id, data.get('last_seq', 0))
+            return
         try:
             # add the player to the game engine
             self.game.add_player(data.get("nickname"), player_id)
@@ -425,53 +562,452 @@ class HostConsumer(AsyncWebsocketConsumer):
                         "status": True,
                         'message': ''
                     })
+            await self.publish_to_spectators(
+                    "player_joined",
+                    self.public_player(player_id))
         except Exception as e:
             await self.send_message_to_player(
                     player_id,
                     "attempt",
                     {
                         "status": False,
-                        'message': e.message
+                        'message': str(e)
+                    })
+
+    async def resume_player(self, player_id, last_seq):
+        """
+        Catch a reconnected player up with the messages it missed.
+        Falls back to a full snapshot when the replay buffer no longer
+        holds all of them.
+        """
+        missed = self.replay.missed(player_id, last_seq)
+        if missed is None:
+            await self.send_snapshot(player_id)
+            mode = "snapshot"
+        else:
+            for seq, header, data in missed:
+                await self.deliver_to_player(player_id, seq, header, data)
+            mode = "replay"
+        await self.send_message_to_player(
+                player_id,
+                "resume",
+                {
+                    "mode": mode,
+                    "replayed": len(missed or ()),
+                })
+
+    async def send_snapshot(self, player_id):
+        """Send the player's full current view of the game."""
+        if self.game.player_order:
+            await self.send_message_to_player(
+                    player_id,
+                    "turn_state",
+                    {
+                        "status": player_id == self.current_player_id(),
+                    })
+        await self.send_the_cards(player_id)
+        await self.send_the_stacks(player_id)
+
+    def current_player_id(self):
+        return self.game.player_order[self.game.index_of_current_player]
+
+    async def start_game(self, data=None):
+        try:
+            self.game.start_game()
+        except ValueError as e:
+            await self.send(json.dumps({
+                'sender': 'lobby',
+                'header': 'attempt',
+                'data': {'status': False, 'message': str(e)}
+            }))
+            return
+
+        # with the moves, the seed is enough to play the game again
+        print(f"Game {self.room_code} started with seed {self.game.seed}")
+        current_player = self.current_player_id()
+        self.schedule_turn_timer(current_player)
+        for player_id in self.game.player_order:
+            await self.send_message_to_player(
+                    player_id,
+                    "turn_state",
+                    {
+                        "status": player_id == current_player,
                     })
+            await self.send_the_cards(player_id)
+            await self.send_the_stacks(player_id)
+        await self.publish_to_spectators("game_start", self.public_state())
+
+    async def add_bot(self, data):
+        """
+        Seat bot players in the room before the game starts.
+        They connect on their own, like phones, and show up in the lobby.
+        """
+        # bots.py builds its frames with this module's PLAYER_ROUTES
+        from virus_the_game.bots import get_bot_runner
+
+        count = data['count']
+        try:
+            if self.game.started:
+                raise ValueError("The game has already started!")
+            if not 1 <= count <= 8 - self.game.players_number:
+                raise ValueError("Maximum number of players reached!")
+            if not self.room_code.isdigit():
+                raise ValueError("Bots can only join games of the database!")
+            first = self.bots_added + 1
+            get_bot_runner().add_bots(self.room_code, [
+                f"Bot {self.room_code}-{number}"
+                for number in range(first, first + count)
+            ])
+            self.bots_added += count
+        except ValueError as e:
+            status, message = False, str(e)
+        else:
+            status, message = True, ''
+        await self.send(json.dumps({
+            'sender': 'lobby',
+            'header': 'attempt',
+            'data': {'status': status, 'message': message}
+        }))
 
-    async def players_move(self, player_id, data):
+    async def players_move(self, player_id, data, trace=None):
         try:
+            if self.game.finished:
+                raise ValueError("The game is over!")
             player = self.game.players[player_id]
-            attempt = player.attempt_move(data)
-            result = self.game.resolve_attempt(player, attempt)
+            add_span(trace, 'resolve_start')
+            with MOVE_RESOLUTION.time():
+                attempt = player.attempt_move(data)
+                result = self.game.resolve_attempt(player, attempt)
+            add_span(trace, 'resolve_end')
             await self.send_message_to_player(
                     player_id,
                     "attempt",
                     {
                         "status": True,
                         'message': result
-                    })
+                    },
+                    trace)
+            await self.send_the_cards(player_id)
+            await self.send_the_stacks(player_id)
+            await self.publish_move(result)
         except Exception as e:
             await self.send_message_to_player(
                     player_id,
                     "attempt",
                     {
                         "status": False,
-                        'message': e.message
+                        'message': str(e)
+                    },
+                    trace)
+        else:
+            # the mover, or the player it swapped bodies or organs with
+            if self.game.check_if_winner(
+                    [player_id, result.get('target_player_id')]):
+                await self.finish_game()
+
+    async def finish_game(self):
+        """Announce the winner and hand the result to the recorder."""
+        winner_id = self.game.winner_id
+        get_timer_service().cancel(f"turn:{self.room_code}")
+        # rooms are named after the game's id in the database
+        if self.room_code.isdigit():
+            get_result_recorder().submit({
+                "game_id": int(self.room_code),
+                "winner_id": winner_id,
+                "scores": {str(winner_id): 1},
+                "end_time": time.time(),
+            })
+        for player_id in self.game.player_order:
+            await self.send_message_to_player(
+                    player_id,
+                    "game_over",
+                    {
+                        "winner_id": winner_id,
                     })
+        await self.publish_to_spectators(
+                "game_over",
+                {"winner_id": winner_id})
+
+    async def end_turn(self, player_id, data, trace=None):
+        if self.game.finished:
+            await self.send_message_to_player(
+                    player_id,
+                    "attempt",
+                    {
+                        "status": False,
+                        'message': "The game is over!"
+                    },
+                    trace)
+            return
+        await self.evaluate_turn(player_id, trace)
 
-    async def evaluate_turn(self, player_id):
+    async def evaluate_turn(self, player_id, trace=None):
+        if self.game.finished:
+            # a turn timeout that fired while the game was being won
+            return
+        ending_player = player_id
         new_player = self.game.next_player()
+        add_span(trace, 'next_player')
+        self.schedule_turn_timer(new_player)
         for player_id in self.game.player_order:
             await self.send_message_to_player(
                     player_id,
                     "turn_state",
                     {
                         "status": player_id == new_player,
-                    })
+                    },
+                    trace if player_id == ending_player else None)
             await self.send_the_cards(player_id)
             await self.send_the_stacks(player_id)
+        await self.publish_to_spectators(
+                "turn_state",
+                {"current_player": new_player})
+
+    # ------------------- timers ----------------------- #
+
+    def schedule_turn_timer(self, player_id):
+        """Start the deadline of the player whose turn just began."""
+        if settings.TURN_TIMEOUT:
+            get_timer_service().schedule(
+                f"turn:{self.room_code}",
+                settings.TURN_TIMEOUT,
+                partial(self.turn_timed_out, player_id)
+                )
+
+    async def turn_timed_out(self, player_id):
+        """Pass the turn of a player who let the deadline expire."""
+        print(f"Turn timeout in room {self.room_code}, player {player_id}")
+        async with self.active_game():
+            await self.evaluate_turn(player_id)
+
+    def reset_idle_timer(self):
+        """Push back the expiry of the room after any activity."""
+        if settings.ROOM_IDLE_TIMEOUT:
+            get_timer_service().schedule(
+                f"idle:{self.room_code}",
+                settings.ROOM_IDLE_TIMEOUT,
+                self.room_timed_out
+                )
+
+    async def room_timed_out(self):
+        """Reap an abandoned room, disconnect() finishes the cleanup."""
+        print("Room idle, cleaning up:", self.room_code)
+        await self.channel_manager.cleanup_room(self.room_code)
+        await self.close(code=4008)
 
-    async def provide_other_stacks(self, player_id):
+    async def provide_other_stacks(self, player_id, data=None, trace=None):
         pass
 
     async def send_the_cards(self, player_id):
-        pass
+        player = self.game.players[player_id]
+        await self.send_message_to_player(
+                player_id,
+                "hand_state",
+                {
+                    "cards": [{
+                        "card_id": card.id,
+                        "color": getattr(card, "color", ""),
+                        "value": card.value,
+                        "card_type": getattr(card, "card_type", ""),
+                    } for card in player.on_hand]
+                })
 
     async def send_the_stacks(self, player_id):
-        pass
+        player = self.game.players[player_id]
+        await self.send_message_to_player(
+                player_id,
+                "stacks_state",
+                {
+                    "stacks": self.stacks_view(player)
+                })
+
+    def stacks_view(self, player):
+        return [{
+            "stack_id": index,
+            "color": stack.color,
+            "value": stack.stack_value,
+        } for index, stack in enumerate(player.laid_out)]
+
+    # ----------------- spectator fan-out ---------------- #
+
+    def public_player(self, player_id):
+        """A seat as spectators see it: name and organs, never the hand."""
+        player = self.game.players[player_id]
+        return {
+            "player_id": player.id,
+            "player_name": player.name,
+            "stacks": self.stacks_view(player),
+        }
+
+    def public_state(self):
+        return {
+            "current_player": self.current_player_id()
+            if self.game.player_order else None,
+            "players": [
+                self.public_player(player_id)
+                for player_id in self.game.player_order
+            ],
+        }
+
+    async def publish_move(self, result):
+        """Publish the seats changed by a resolved move."""
+        affected = [result["player_id"]]
+        target = result.get("target_player_id")
+        if target in self.game.players and target not in affected:
+            affected.append(target)
+        await self.publish_to_spectators(
+                "move",
+                {
+                    "result": result,
+                    "players": [self.public_player(p) for p in affected],
+                })
+
+    async def publish_to_spectators(self, header, data):
+        """
+        Encode a public delta once and fan the same text out to every
+        spectator. The room never waits for them: deltas a full spectator
+        channel cannot take are dropped by the channel layer and the
+        spectator recovers with a fresh snapshot.
+        """
+        self.spectator_seq += 1
+        text = json.dumps({
+            'sender': 'lobby',
+            'header': header,
+            'data': data,
+            'seq': self.spectator_seq,
+        })
+        await self.channel_layer.group_send(
+            self.spectator_group_name,
+            {
+                'type': 'spectator_delta',
+                'seq': self.spectator_seq,
+                'text': text,
+            }
+        )
+
+    async def spectator_snapshot_request(self, event):
+        """Send a spectator the public state, encoded once per sequence."""
+        cached = self.spectator_snapshot_cache
+        if cached is None or cached[0] != self.spectator_seq:
+            async with self.active_game():
+                cached = self.spectator_snapshot_cache = (
+                    self.spectator_seq,
+                    json.dumps({
+                        'sender': 'lobby',
+                        'header': 'snapshot',
+                        'data': self.public_state(),
+                        'seq': self.spectator_seq,
+                    })
+                )
+        await self.channel_layer.send(
+            event['reply_channel'],
+            {
+                'type': 'spectator_snapshot',
+                'seq': cached[0],
+                'text': cached[1],
+            }
+        )
+
+
+# ================= Spectator Consumer ================= #
+
+
+class SpectatorConsumer(AsyncWebsocketConsumer):
+    """
+    Read-only WebSocket consumer for watching a room.
+    Gets one snapshot from the host and then the room's shared stream of
+    public deltas, forwarded as the already encoded text.
+    """
+
+    max_pending = 32
+
+    # ------------- connection functions -------------- #
+
+    async def connect(self):
+        """
+        Establish WebSocket connection for a spectator.
+        Joins the room's spectator group and asks the host for a snapshot.
+        """
+        self.room_code = self.scope["url_route"]["kwargs"]["room_code"]
+        self.spectator_group_name = f"{self.room_code}.spectators"
+        # sequence number shown so far, None while waiting for a snapshot
+        self.last_seq = None
+        self.pending = []
+
+        self.redis = await create_redis_connection()
+        self.channel_manager = RedisChannelManager(self.redis)
+        await self.channel_layer.group_add(
+            self.spectator_group_name,
+            self.channel_name
+        )
+        await self.accept()
+        CONNECTIONS.labels('spectator').inc()
+        get_heartbeat_monitor().register(self)
+
+        await self.request_snapshot()
+
+    async def disconnect(self, close_code):
+        """Leave the spectator group and close Redis connection."""
+        CONNECTIONS.labels('spectator').dec()
+        get_heartbeat_monitor().unregister(self)
+        await self.channel_layer.group_discard(
+            self.spectator_group_name,
+            self.channel_name
+        )
+        self.redis.close()
+        await self.redis.wait_closed()
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        MESSAGES.labels('out').inc()
+        await super().send(text_data, bytes_data, close)
+
+    # ----------------- message receivers ---------------- #
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Spectators are read-only, their frames only count as heartbeats.
+        """
+        MESSAGES.labels('in').inc()
+        get_heartbeat_monitor().beat(self)
+
+    async def request_snapshot(self):
+        """Ask the host for the public state of the room."""
+        self.last_seq = None
+        self.pending = []
+        host_channel = await self.channel_manager.get_host_channel(
+            self.room_code
+            )
+        if host_channel:
+            await self.channel_layer.send(
+                host_channel,
+                {
+                    'type': 'spectator_snapshot_request',
+                    'reply_channel': self.channel_name,
+                }
+            )
+
+    async def spectator_snapshot(self, event):
+        """Show the snapshot, then the deltas that overtook it."""
+        self.last_seq = event['seq']
+        await self.send(text_data=event['text'])
+        pending, self.pending = self.pending, []
+        for delta in sorted(pending, key=lambda delta: delta['seq']):
+            await self.spectator_delta(delta)
+
+    async def spectator_delta(self, event):
+        """
+        Forward a public delta as is.
+        A gap in the sequence means the channel layer dropped deltas
+        while this spectator was behind, so it starts over from a snapshot.
+        """
+        if self.last_seq is None:
+            if len(self.pending) < self.max_pending:
+                self.pending.append(event)
+            return
+        if event['seq'] <= self.last_seq:
+            return
+        if event['seq'] != self.last_seq + 1:
+            await self.request_snapshot()
+            return
+        self.last_seq = event['seq']
+        await self.send(text_data=event['text'])
@@ -0,0 +1,179 @@
+"""
+Per-worker memory governor for the games held by HostConsumers.
+
+Resident rooms are kept in least-recently-active order. When the worker
+holds more games than GAME_RESIDENT_MAX_ROOMS, or their estimated size
+goes over GAME_RESIDENT_MAX_MB, the coldest games are pickled into Redis
+and dropped from memory. The next message for a spilled room loads it
+back before the consumer touches the game, so the consumers never see the
+difference.
+
+The pickles are signed with an HMAC keyed on SECRET_KEY and unpickled only
+when the signature matches, anyone able to write to Redis could otherwise
+run code in the worker. They expire after GAME_SPILL_TTL seconds.
+"""
+import hashlib
+import hmac
+import pickle
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+
+from virus_the_game.metrics import Gauge
+
+SIGNING_SALT = "virus_the_game.governor"
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+class GameLost(Exception):
+    """The spilled game of a room expired, or its signature is wrong."""
+
+
+def signature(payload):
+    return salted_hmac(SIGNING_SALT, payload, algorithm="sha256").digest()
+
+
+def sign(payload):
+    return signature(payload) + payload
+
+
+def unsign(signed):
+    """The payload of sign(), None when missing or not signed by us."""
+    if signed is None:
+        return None
+    mac, payload = signed[:SIGNATURE_SIZE], signed[SIGNATURE_SIZE:]
+    if not hmac.compare_digest(mac, signature(payload)):
+        return None
+    return payload
+
+
+class GameMemoryGovernor:
+    """
+    Args:
+        max_rooms: resident games allowed before spilling, 0 for no limit
+        max_bytes: estimated resident bytes allowed, 0 for no limit
+    """
+
+    def __init__(self, max_rooms, max_bytes):
+        self.max_rooms = max_rooms
+        self.max_bytes = max_bytes
+        # room_code -> consumer of the resident rooms, coldest first
+        self.rooms = OrderedDict()
+        self.spilled = {}  # room_code -> consumer
+        # running estimate of a pickled game's size
+        self.game_bytes = None
+        self.spills = 0
+        self.rehydrations = 0
+
+    @property
+    def resident_count(self):
+        return len(self.rooms)
+
+    def unregister(self, room_code):
+        self.rooms.pop(room_code, None)
+        self.spilled.pop(room_code, None)
+
+    async def touch(self, consumer):
+        """
+        Mark the consumer's room as the most recently active one, load
+        its game back if it was spilled and spill colder rooms if needed.
+        The caller holds the consumer's game_lock.
+
+        Raises:
+            GameLost: the room's spilled game cannot be loaded back
+        """
+        room_code = consumer.room_code
+        if room_code in self.spilled:
+            await self.rehydrate(consumer)
+        self.rooms[room_code] = consumer
+        self.rooms.move_to_end(room_code)
+        await self.enforce_budget()
+
+    def over_budget(self):
+        resident = self.resident_count
+        if self.max_rooms and resident > self.max_rooms:
+            return True
+        if self.max_bytes and self.game_bytes:
+            return resident * self.game_bytes > self.max_bytes
+        return False
+
+    async def enforce_budget(self):
+        if self.max_bytes and self.game_bytes is None and self.rooms:
+            consumer = next(reversed(self.rooms.values()))
+            self.measure(pickle.dumps(consumer.game, pickle.HIGHEST_PROTOCOL))
+
+        while self.over_budget():
+            consumer = self.coldest_idle()
+            if consumer is None:
+                return
+            async with consumer.game_lock:
+                await self.spill(consumer)
+
+    def coldest_idle(self):
+        """
+        The coldest resident room whose game is not in use, None if there
+        is none. The room touched last is never a candidate.
+        """
+        newest = next(reversed(self.rooms), None)
+        for room_code, consumer in self.rooms.items():
+            if room_code == newest:
+                return None
+            if not consumer.game_lock.locked():
+                return consumer
+        return None
+
+    def measure(self, payload):
+        size = len(payload)
+        if self.game_bytes is None:
+            self.game_bytes = size
+        else:
+            self.game_bytes = 0.9 * self.game_bytes + 0.1 * size
+
+    async def spill(self, consumer):
+        payload = pickle.dumps(consumer.game, pickle.HIGHEST_PROTOCOL)
+        await consumer.channel_manager.store_game(
+            consumer.room_code, sign(payload), settings.GAME_SPILL_TTL
+        )
+        consumer.game = None
+        # unless the host left meanwhile
+        if self.rooms.pop(consumer.room_code, None) is not None:
+            self.spilled[consumer.room_code] = consumer
+        self.measure(payload)
+        self.spills += 1
+
+    async def rehydrate(self, consumer):
+        room_code = consumer.room_code
+        payload = unsign(await consumer.channel_manager.load_game(room_code))
+        self.spilled.pop(room_code, None)
+        if payload is None:
+            raise GameLost(f"Spilled game of room {room_code} is gone")
+        consumer.game = pickle.loads(payload)
+        await consumer.channel_manager.delete_game(room_code)
+        self.rehydrations += 1
+
+
+_governor = None
+
+
+def get_memory_governor():
+    """The worker's governor, created on first use."""
+    global _governor
+    if _governor is None:
+        _governor = GameMemoryGovernor(
+            settings.GAME_RESIDENT_MAX_ROOMS,
+            settings.GAME_RESIDENT_MAX_MB * 1024 * 1024
+        )
+        ROOMS_RESIDENT.set_function(lambda: _governor.resident_count)
+        ROOMS_SPILLED.set_function(lambda: len(_governor.spilled))
+    return _governor
+
+
+ROOMS_RESIDENT = Gauge(
+    'virus_games_resident',
+    'Games held in memory by this worker'
+)
+ROOMS_SPILLED = Gauge(
+    'virus_games_spilled',
+    'Games of this worker spilled to Redis'
+)
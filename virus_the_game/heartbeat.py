@@ -0,0 +1,117 @@
+"""
+Application-level heartbeats for the websocket consumers of a worker.
+
+Receiving a frame only stamps the connection's last-seen time. One sweep
+per HEARTBEAT_INTERVAL, scheduled on the worker's timer service, pings the
+connections that went quiet and closes the ones silent for
+HEARTBEAT_MAX_MISSED intervals. Closing goes through the consumer's
+disconnect(), so a half-open socket leaves Redis and its groups the same
+way a clean one does, instead of receiving group sends until TCP gives up.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+
+from virus_the_game.metrics import Counter, Gauge
+from virus_the_game.timers import get_timer_service
+
+
+PING = json.dumps({'sender': 'lobby', 'header': 'ping', 'data': {}})
+
+
+class HeartbeatMonitor:
+    """
+    Args:
+        interval: seconds between sweeps, 0 disables the monitor
+        max_missed: silent intervals after which a connection is reaped
+    """
+
+    sweep_key = "heartbeat:sweep"
+
+    def __init__(self, interval, max_missed):
+        self.interval = interval
+        self.max_missed = max_missed
+        self.connections = {}  # channel_name -> consumer
+        self.last_seen = {}  # channel_name -> monotonic time
+        self.reaped = 0
+        self.scheduled = False
+
+    def register(self, consumer):
+        if not self.interval:
+            return
+        self.connections[consumer.channel_name] = consumer
+        self.last_seen[consumer.channel_name] = time.monotonic()
+        if not self.scheduled:
+            self.scheduled = True
+            get_timer_service().schedule(
+                self.sweep_key, self.interval, self.sweep
+            )
+
+    def unregister(self, consumer):
+        self.connections.pop(consumer.channel_name, None)
+        self.last_seen.pop(consumer.channel_name, None)
+
+    def beat(self, consumer):
+        """Any frame from the connection counts as a heartbeat."""
+        if consumer.channel_name in self.last_seen:
+            self.last_seen[consumer.channel_name] = time.monotonic()
+
+    async def sweep(self):
+        if self.connections:
+            get_timer_service().schedule(
+                self.sweep_key, self.interval, self.sweep
+            )
+        else:
+            # rescheduled by the next register()
+            self.scheduled = False
+            return
+
+        now = time.monotonic()
+        reap_after = self.interval * self.max_missed
+        pings, reaps = [], []
+        for channel_name, seen in self.last_seen.items():
+            silent = now - seen
+            if silent >= reap_after:
+                reaps.append(self.connections[channel_name])
+            elif silent >= self.interval:
+                pings.append(self.connections[channel_name])
+
+        for consumer in reaps:
+            self.unregister(consumer)
+            self.reaped += 1
+            print("Heartbeat lost, closing:", consumer.channel_name)
+        results = await asyncio.gather(
+            *(consumer.send(PING) for consumer in pings),
+            *(consumer.close(code=4008) for consumer in reaps),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Heartbeat sweep failed: {result!r}")
+
+
+_monitor = None
+
+
+def get_heartbeat_monitor():
+    """The worker's heartbeat monitor, created on first use."""
+    global _monitor
+    if _monitor is None:
+        _monitor = HeartbeatMonitor(
+            settings.HEARTBEAT_INTERVAL, settings.HEARTBEAT_MAX_MISSED
+        )
+        CONNECTIONS_LIVE.set_function(lambda: len(_monitor.connections))
+        CONNECTIONS_REAPED.set_function(lambda: _monitor.reaped)
+    return _monitor
+
+
+CONNECTIONS_LIVE = Gauge(
+    'virus_connections_live',
+    'Websocket connections watched by this worker\'s heartbeat monitor'
+)
+CONNECTIONS_REAPED = Counter(
+    'virus_connections_reaped_total',
+    'Connections this worker closed after missing their heartbeats'
+)
@@ -0,0 +1,45 @@
+"""
+ASGI lifespan handler.
+
+Worker-wide services (pooled API client, timer wheel, result recorder,
+trace sink, token invalidation listener, bots) outlive single
+connections, so they are released here when the server shuts down. The result recorder is started with the server, so results
+left in its journal by a previous run are written right away.
+"""
+import asyncio
+
+from backend.recorder import get_result_recorder, stop_result_recorder
+from virus_the_game.bots import stop_bot_runner
+from virus_the_game.consumer_helpers import close_api_client
+from virus_the_game.timers import get_timer_service
+from virus_the_game.tracing import stop_trace_sink
+from virus_the_game.ws_auth import stop_invalidation_listener
+
+
+async def startup():
+    get_result_recorder()
+
+
+async def shutdown():
+    await stop_bot_runner()
+    await close_api_client()
+    await get_timer_service().stop()
+    # waits for the last batch to be written
+    await asyncio.to_thread(stop_result_recorder)
+    await asyncio.to_thread(stop_trace_sink)
+    await asyncio.to_thread(stop_invalidation_listener)
+
+
+async def lifespan_application(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                await shutdown()
+            except Exception as e:
+                print("Shutdown failed:", repr(e))
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
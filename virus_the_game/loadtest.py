@@ -0,0 +1,498 @@
+"""
+Load generator for the websocket game flow.
+
+Opens rooms made of one simulated host and several simulated players,
+plays them through the WEBSOCKET_COMMUNICATION.md protocol and reports
+connect latency, move round-trip times, throughput and memory while the
+number of rooms ramps up.
+"""
+import asyncio
+import json
+import math
+import os
+import subprocess
+import time
+import uuid
+
+import httpx
+
+from virus_the_game.measurement import percentile
+
+
+# ----------------- Measurement Helpers ----------------- #
+
+
+def current_rss_kb():
+    """Current resident set size of this process in kB, None if unknown."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # no /proc off Linux, ps reports the current RSS in kB there too
+    try:
+        output = subprocess.run(
+            ["ps", "-o", "rss=", "-p", str(os.getpid())],
+            capture_output=True, text=True, check=True
+        ).stdout
+        return int(output.strip())
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadStats:
+    """Counters shared by all simulated clients during one ramp step."""
+
+    def __init__(self):
+        self.connect_times = []
+        self.move_times = []
+        self.messages = 0
+        self.errors = 0
+
+
+def use_in_memory_backends():
+    """
+    Switch the worker to the in-process channel layer, cache and Redis
+    stand-ins, what REDIS_URL = "memory://" selects at startup.
+    Only meaningful when the application runs in the same process.
+    """
+    from django.conf import settings
+    from channels.layers import (
+        DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+        )
+    from django.test.signals import clear_cache_handlers
+
+    from backend import leaderboard, matchmaking
+    from virus_the_game import ws_auth
+
+    settings.REDIS_URL = "memory://"
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+    # rebuilds the cache handler the way override_settings does
+    clear_cache_handlers(setting="CACHES")
+    channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer())
+    # clients created at import for the Redis the settings named
+    leaderboard.redis_leaderboard = None
+    matchmaking.redis_queue = None
+    ws_auth.redis_token_cache = None
+
+
+# ----------------- Socket Transports ----------------- #
+
+
+class InProcessSocket:
+    """Websocket driven directly against the ASGI application."""
+
+    def __init__(self, application, path):
+        try:
+            # channels.testing is built on daphne, not a server dependency
+            from channels.testing import WebsocketCommunicator
+        except ImportError as e:
+            raise ImportError(
+                "In-process sockets need daphne (pip install daphne), "
+                "or pass the url of a running server"
+                ) from e
+        self.communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self):
+        connected, code = await self.communicator.connect()
+        if not connected:
+            raise ConnectionError(f"Connection refused ({code})")
+
+    async def send(self, message):
+        await self.communicator.send_to(text_data=json.dumps(message))
+
+    async def receive(self, timeout):
+        return json.loads(await self.communicator.receive_from(timeout))
+
+    async def close(self):
+        if self.communicator.future.done():
+            # the application closed the socket already
+            return
+        await self.communicator.disconnect()
+
+
+class NetworkSocket:
+    """Websocket opened against a running server."""
+
+    def __init__(self, base_url, path):
+        self.url = f"{base_url}{path}"
+        self.connection = None
+
+    async def connect(self):
+        import websockets
+
+        self.connection = await websockets.connect(self.url)
+
+    async def send(self, message):
+        await self.connection.send(json.dumps(message))
+
+    async def receive(self, timeout):
+        return json.loads(
+            await asyncio.wait_for(self.connection.recv(), timeout)
+            )
+
+    async def close(self):
+        await self.connection.close()
+
+
+# ----------------- Simulated Clients ----------------- #
+
+
+class PlayerStopped(Exception):
+    """The game is over, or the player's socket was closed."""
+
+
+class SimulatedPlayer:
+    """
+    Phone-side client: connects with its token, announces itself to the
+    lobby and, when its turn_state says so, plays organs from its hand,
+    discards the cards it cannot use and ends the turn.
+
+    A reader task moves the socket's frames to an inbox, so waiting for
+    the turn can time out at the end of a ramp step without giving up on
+    the socket. A reply that does not come within `timeout` stops the
+    player, its socket is not used again.
+    """
+
+    def __init__(self, socket, stats, timeout):
+        self.socket = socket
+        self.stats = stats
+        self.timeout = timeout
+        self.hand = []
+        self.stacks = []
+        self.my_turn = False
+        self.synced = True  # hand and stacks as of the last turn_state
+        self.rejected = set()  # card ids the host refused this turn
+        self.inbox = asyncio.Queue()
+        self.reader = None
+        self.stopped = False
+        self.game_over = False
+
+    async def send(self, header, data):
+        await self.socket.send({
+            'sender': 'frontend',
+            'header': header,
+            'data': data,
+        })
+        self.stats.messages += 1
+
+    async def read(self):
+        try:
+            while True:
+                self.inbox.put_nowait(await self.socket.receive(None))
+                self.stats.messages += 1
+        except Exception:
+            # closed by the server
+            self.inbox.put_nowait(None)
+
+    async def next_message(self, timeout):
+        """
+        Next frame from the host, keeping the player's view up to date.
+
+        Raises:
+            asyncio.TimeoutError: nothing arrived within the timeout
+            PlayerStopped: game_over arrived, or the socket was closed
+        """
+        message = await asyncio.wait_for(self.inbox.get(), timeout)
+        if message is None:
+            raise PlayerStopped("Socket closed by the server")
+        data = message.get('data') or {}
+        match message.get('header'):
+            case 'hand_state':
+                self.hand = data['cards']
+            case 'stacks_state':
+                self.stacks = data['stacks']
+                self.synced = True
+            case 'turn_state':
+                # the player's hand and stacks follow it
+                self.my_turn = data['status']
+                self.synced = False
+                self.rejected.clear()
+            case 'game_over':
+                self.game_over = True
+                raise PlayerStopped("Game over")
+        return message
+
+    async def reply(self, header):
+        """Read frames until the reply with the header arrives."""
+        while True:
+            message = await self.next_message(self.timeout)
+            if message.get('header') == header:
+                return message
+
+    async def connect(self):
+        started = time.perf_counter()
+        await self.socket.connect()
+        self.stats.connect_times.append(time.perf_counter() - started)
+        self.reader = asyncio.create_task(self.read())
+        await self.send('connection', {'action': 'add'})
+        attempt = await self.reply('attempt')
+        if not attempt['data']['status']:
+            raise ConnectionError(attempt['data']['message'])
+
+    def choose_move(self):
+        """
+        Pick an organ to lay out, else a card to discard so the hand
+        refills with playable ones. None when the turn should end.
+        """
+        laid_out = {stack['color'] for stack in self.stacks}
+        cards = [
+            card for card in self.hand
+            if card['card_id'] not in self.rejected
+        ]
+        for card in cards:
+            if card['value'] == 0 and not card['card_type'] \
+                    and card['color'] not in laid_out:
+                return {'action': 'organ', 'card_id': card['card_id']}
+        if cards:
+            return {'action': 'discard', 'card_id': cards[0]['card_id']}
+        return None
+
+    async def take_turn(self):
+        """One card_play or turn_end, timed until its reply arrived."""
+        while not self.synced:
+            await self.next_message(self.timeout)
+        move = self.choose_move()
+        started = time.perf_counter()
+        if move:
+            await self.send('card_play', move)
+            attempt = await self.reply('attempt')
+            if attempt['data']['status']:
+                # the hand and stacks without the card follow the attempt
+                self.synced = False
+            else:
+                self.rejected.add(move['card_id'])
+        else:
+            await self.send('turn_end', {'action': 'end_turn'})
+            # the next turn_state is the one this turn_end caused
+            await self.reply('turn_state')
+        self.stats.move_times.append(time.perf_counter() - started)
+
+    async def play(self, deadline):
+        """Play the player's turns until the deadline or the game's end."""
+        try:
+            while not self.stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                if self.my_turn:
+                    await self.take_turn()
+                    continue
+                try:
+                    await self.next_message(remaining)
+                except asyncio.TimeoutError:
+                    # the step is over, still waiting for the turn
+                    return
+        except asyncio.TimeoutError:
+            # a reply went missing, the socket may be stuck
+            self.stats.errors += 1
+            await self.close()
+        except PlayerStopped:
+            await self.close()
+
+    async def close(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        if self.reader:
+            self.reader.cancel()
+            await asyncio.gather(self.reader, return_exceptions=True)
+        await self.socket.close()
+
+
+class SimulatedRoom:
+    """One host socket and its players, created through the REST API."""
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.host = None
+        self.players = []
+        self.drain_task = None
+
+    async def drain_host(self):
+        """Keep the host socket's mirrored frames from piling up."""
+        while True:
+            try:
+                await self.host.receive(None)
+            except Exception:
+                # socket closed underneath us, nothing left to drain
+                return
+            self.generator.stats.messages += 1
+
+    async def open(self, api, run_id, room_index):
+        status, body = await self.generator.api_post(api, 'games/', {})
+        game_id = body['game_id']
+
+        self.host = self.generator.socket(f"/ws/lobby/{game_id}/")
+        await self.host.connect()
+        self.drain_task = asyncio.create_task(self.drain_host())
+
+        for seat in range(self.generator.players_per_room):
+            status, body = await self.generator.api_post(
+                api,
+                f'games/{game_id}/',
+                {'player_name': f"load-{run_id}-{room_index}-{seat}"}
+                )
+            player = SimulatedPlayer(
+                self.generator.socket(
+                    f"/ws/game/{game_id}/{body['player_id']}/"
+                    f"?token={body['token']}"
+                    ),
+                self.generator.stats,
+                self.generator.timeout
+                )
+            await player.connect()
+            self.players.append(player)
+
+        await self.host.send({
+            'sender': 'frontend',
+            'header': 'game_start',
+            'data': {},
+        })
+
+    @property
+    def finished(self):
+        return any(player.game_over for player in self.players)
+
+    async def play(self, deadline):
+        await asyncio.gather(*(p.play(deadline) for p in self.players))
+
+    async def close(self):
+        for player in self.players:
+            await player.close()
+        if self.drain_task:
+            self.drain_task.cancel()
+            await asyncio.gather(self.drain_task, return_exceptions=True)
+        if self.host:
+            await self.host.close()
+
+
+# ----------------- Load Generator ----------------- #
+
+
+class LoadGenerator:
+    """
+    Ramps rooms up in steps and measures every step separately.
+
+    Args:
+        rooms: number of rooms reached at the last step
+        players_per_room: simulated phones per room
+        steps: how many increments the ramp is split into
+        step_duration: seconds of play measured per step
+        url: ws://host:port of a running server, in-process when None
+        timeout: seconds to wait for a reply before counting an error
+    """
+
+    def __init__(
+            self,
+            rooms,
+            players_per_room,
+            steps=5,
+            step_duration=10.0,
+            url=None,
+            timeout=5.0
+    ):
+        self.rooms = rooms
+        self.players_per_room = players_per_room
+        self.steps = steps
+        self.step_duration = step_duration
+        self.url = url
+        self.timeout = timeout
+        self.stats = LoadStats()
+        self.application = None
+        self.base_rss = None
+
+    def socket(self, path):
+        if self.url:
+            return NetworkSocket(self.url, path)
+        return InProcessSocket(self.application, path)
+
+    def api_client(self):
+        if self.url:
+            base_url = self.url.replace('ws', 'http', 1)
+            return httpx.AsyncClient(base_url=f"{base_url}/api/")
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.application),
+            base_url="http://localhost/api/"
+            )
+
+    async def api_post(self, api, endpoint, data):
+        response = await api.post(endpoint, json=data)
+        response.raise_for_status()
+        return response.status_code, response.json()
+
+    async def run(self):
+        """Run the whole ramp, returning one report dict per step."""
+        if not self.url:
+            from virus_the_game.asgi import application
+            self.application = application
+
+        run_id = uuid.uuid4().hex[:8]
+        rooms = []
+        reports = []
+        async with self.api_client() as api:
+            # what the process holds before any room, rooms are measured
+            # by what they add to it
+            self.base_rss = current_rss_kb()
+            try:
+                for step in range(1, self.steps + 1):
+                    self.stats = LoadStats()
+                    target = math.ceil(self.rooms * step / self.steps)
+                    while len(rooms) < target:
+                        room = SimulatedRoom(self)
+                        await room.open(api, run_id, len(rooms))
+                        rooms.append(room)
+
+                    # rooms opened earlier keep the stats they started with
+                    for room in rooms:
+                        for player in room.players:
+                            player.stats = self.stats
+                    connect_times = self.stats.connect_times
+                    self.stats.messages = 0
+
+                    started = time.perf_counter()
+                    deadline = started + self.step_duration
+                    await asyncio.gather(*(r.play(deadline) for r in rooms))
+                    elapsed = time.perf_counter() - started
+
+                    reports.append(self.report(
+                        rooms, connect_times, elapsed
+                        ))
+            finally:
+                for room in rooms:
+                    await room.close()
+                if not self.url:
+                    from virus_the_game.lifespan import shutdown
+                    # the timer wheel and writer threads of the server
+                    await shutdown()
+        return reports
+
+    def report(self, rooms, connect_times, elapsed):
+        room_count = len(rooms)
+        rss = current_rss_kb()
+        if rss is None or self.base_rss is None:
+            rss = growth = math.nan
+        else:
+            growth = (rss - self.base_rss) / room_count
+        moves = self.stats.move_times
+        return {
+            'rooms': room_count,
+            'players': room_count * self.players_per_room,
+            'connect_p50_ms': percentile(connect_times, 0.50) * 1000,
+            'connect_p95_ms': percentile(connect_times, 0.95) * 1000,
+            'moves': len(moves),
+            'move_p50_ms': percentile(moves, 0.50) * 1000,
+            'move_p95_ms': percentile(moves, 0.95) * 1000,
+            'move_p99_ms': percentile(moves, 0.99) * 1000,
+            'messages_per_sec': self.stats.messages / elapsed,
+            'rss_mb': rss / 1024,
+            'rss_growth_per_room_kb': growth,
+            'games_over': sum(room.finished for room in rooms),
+            'errors': self.stats.errors,
+        }
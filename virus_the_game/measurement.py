@@ -0,0 +1,14 @@
+"""
+Helpers shared by the benchmarks, the load generator, the trace summary
+and the matchmaking stats.
+"""
+import math
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0.0 for no data)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
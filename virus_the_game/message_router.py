@@ -0,0 +1,140 @@
+"""
+Declarative routing of websocket frames.
+
+Every accepted frame is registered once as (sender, header, action) with a
+schema and the name of the consumer method handling it. Schemas are
+compiled into flat extraction plans when registered, so a frame is
+validated and turned into its handler's payload in a single pass, and a
+frame without a route is rejected before the consumer does any work.
+"""
+
+ANY = '*'
+
+
+class InvalidMessage(ValueError):
+    """A frame without a route or with fields that fail validation."""
+
+
+def int_list(value):
+    return [int(item) for item in value]
+
+
+class Field:
+    """
+    Args:
+        name: key in the extracted payload
+        source: key in the frame's data, defaults to name
+        cast: callable converting the value, e.g. int
+        required: reject the frame when the value is missing
+        default: value used when an optional field is missing
+    """
+
+    __slots__ = ('name', 'source', 'cast', 'required', 'default')
+
+    def __init__(self, name, source=None, cast=None, required=True,
+                 default=None):
+        self.name = name
+        self.source = source or name
+        self.cast = cast
+        self.required = required
+        self.default = default
+
+
+class Schema:
+    """
+    Extraction plan for one route.
+
+    Args:
+        fields: Field objects read from the frame's data
+        constants: keys set to fixed values in every payload
+        variant: payload key selecting extra fields from `variants`
+        variants: variant value -> tuple of extra Fields
+    """
+
+    def __init__(self, *fields, constants=None, variant=None, variants=None):
+        self.constants = dict(constants or {})
+        self.plan = self._compile(fields)
+        self.variant = variant
+        self.variants = {
+            key: self._compile(extra)
+            for key, extra in (variants or {}).items()
+        }
+
+    @staticmethod
+    def _compile(fields):
+        return tuple(
+            (f.name, f.source, f.cast, f.required, f.default)
+            for f in fields
+        )
+
+    def extract(self, data):
+        """Validate `data` and build the payload in one pass."""
+        payload = dict(self.constants)
+        self._apply(self.plan, data, payload)
+        if self.variant:
+            extra = self.variants.get(payload.get(self.variant))
+            if extra:
+                self._apply(extra, data, payload)
+        return payload
+
+    @staticmethod
+    def _apply(plan, data, payload):
+        for name, source, cast, required, default in plan:
+            value = data.get(source)
+            if value is None:
+                if required:
+                    raise InvalidMessage(f"Missing field '{source}'")
+                payload[name] = default
+                continue
+            if cast is not None:
+                try:
+                    value = cast(value)
+                except (TypeError, ValueError):
+                    raise InvalidMessage(f"Invalid field '{source}'")
+            payload[name] = value
+
+
+class Route:
+    __slots__ = ('handler', 'schema')
+
+    def __init__(self, handler, schema):
+        self.handler = handler
+        self.schema = schema
+
+
+class MessageRouter:
+    """
+    Table of (sender, header, action) -> Route.
+    An action of ANY matches frames whose action has no route of its own.
+    A route without a schema passes the data through unchanged, for
+    frames that were already validated by the consumer that sent them.
+    A route without a handler accepts the frame and does nothing else,
+    e.g. heartbeat replies.
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    def register(self, sender, header, handler, action=ANY, schema=None):
+        self.routes[(sender, header, action)] = Route(handler, schema)
+
+    def route(self, sender, header, data):
+        """
+        Returns:
+            Tuple of (handler_name, payload)
+
+        Raises:
+            InvalidMessage: no route or invalid fields
+        """
+        if not isinstance(header, str) or not isinstance(data, dict):
+            raise InvalidMessage("Malformed message")
+        action = data.get('action')
+        if not isinstance(action, str):
+            action = None
+        route = self.routes.get((sender, header, action)) \
+            or self.routes.get((sender, header, ANY))
+        if route is None:
+            raise InvalidMessage(f"Unknown message '{header}'")
+        if route.schema is None:
+            return route.handler, data
+        return route.handler, route.schema.extract(data)
@@ -0,0 +1,268 @@
+"""
+Process-local metrics rendered in the Prometheus text format.
+
+Counters and histograms are plain in-memory numbers updated inline by the
+consumers, so keeping them on in production costs a dict lookup and an
+addition per observation. Gauges that are expensive to keep up to date,
+and counters another object keeps already, are read through a callback
+only when /metrics is scraped.
+"""
+import bisect
+import time
+
+
+# ----------------- Metric Types ----------------- #
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames:
+            self.labels()
+        REGISTRY.register(self)
+
+    def labels(self, *values):
+        """Child metric for one combination of label values."""
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.new_child()
+        return child
+
+    def label_string(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        inner = ','.join(f'{name}="{value}"' for name, value in pairs)
+        return '{' + inner + '}'
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in self.children.items():
+            lines.extend(self.render_child(values, child))
+        return lines
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count, or one kept by another object and
+    read through a callback when scraped.
+    """
+    kind = 'counter'
+
+    class Child:
+        def __init__(self):
+            self.value = 0
+            self.callback = None
+
+        def inc(self, amount=1):
+            self.value += amount
+
+        def set_function(self, callback):
+            self.callback = callback
+
+        def get(self):
+            return self.callback() if self.callback else self.value
+
+    def new_child(self):
+        return Counter.Child()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set_function(self, callback):
+        self.labels().set_function(callback)
+
+    def render_child(self, values, child):
+        return [f"{self.name}{self.label_string(values)} {child.get()}"]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, or is computed when scraped."""
+    kind = 'gauge'
+
+    class Child:
+        def __init__(self):
+            self.value = 0
+            self.callback = None
+
+        def inc(self, amount=1):
+            self.value += amount
+
+        def dec(self, amount=1):
+            self.value -= amount
+
+        def set(self, value):
+            self.value = value
+
+        def set_function(self, callback):
+            self.callback = callback
+
+        def get(self):
+            return self.callback() if self.callback else self.value
+
+    def new_child(self):
+        return Gauge.Child()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, callback):
+        self.labels().set_function(callback)
+
+    def render_child(self, values, child):
+        return [f"{self.name}{self.label_string(values)} {child.get()}"]
+
+
+class Histogram(Metric):
+    """Latency distribution over fixed buckets (seconds)."""
+    kind = 'histogram'
+    default_buckets = (
+        0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+    )
+
+    class Child:
+        def __init__(self, buckets):
+            self.buckets = buckets
+            self.counts = [0] * (len(buckets) + 1)
+            self.sum = 0.0
+
+        def observe(self, value):
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+        def time(self):
+            return _Timer(self)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        self.buckets = tuple(buckets or self.default_buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def new_child(self):
+        return Histogram.Child(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), child.counts):
+            cumulative += count
+            labels = self.label_string(values, [('le', bound)])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = self.label_string(values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """Context manager observing the elapsed time into a histogram."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+# ----------------- Callbacks ----------------- #
+
+
+def channel_layer_queue_size():
+    """
+    Messages waiting in this worker's channel layer queues.
+    In-memory layer: all channel queues, Redis layer: the local receive
+    buffers of channels that have not been consumed yet.
+    """
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    queues = getattr(layer, 'channels', None)
+    if queues is None:
+        queues = getattr(layer, 'receive_buffer', {})
+    return sum(queue.qsize() for queue in list(queues.values()))
+
+
+# ----------------- Game Server Metrics ----------------- #
+
+
+ROOMS_ACTIVE = Gauge(
+    'virus_rooms_active',
+    'Rooms with a connected host (all workers, from Redis)'
+)
+CONNECTIONS = Gauge(
+    'virus_ws_connections',
+    'Open websocket connections in this worker',
+    ['consumer']
+)
+# frames per second is rate(virus_ws_messages_total[1m]) in Prometheus
+MESSAGES = Counter(
+    'virus_ws_messages_total',
+    'Websocket frames handled by this worker',
+    ['direction']
+)
+MOVE_RESOLUTION = Histogram(
+    'virus_move_resolution_seconds',
+    'Time spent in attempt_move and resolve_attempt'
+)
+REDIS_LATENCY = Histogram(
+    'virus_redis_roundtrip_seconds',
+    'Round-trip time of room registry commands',
+    ['command']
+)
+CHANNEL_LAYER_QUEUE = Gauge(
+    'virus_channel_layer_queue_size',
+    'Messages waiting in this worker\'s channel layer queues'
+)
+TIMERS_PENDING = Gauge(
+    'virus_timers_pending',
+    'Turn, heartbeat and idle-room timers scheduled in this worker'
+)
+TIMERS_FIRED = Counter(
+    'virus_timers_fired_total',
+    'Timers that expired in this worker since it started'
+)
+
+for direction in ('in', 'out'):
+    # both directions show up from the first scrape, at 0
+    MESSAGES.labels(direction)
+CHANNEL_LAYER_QUEUE.set_function(channel_layer_queue_size)
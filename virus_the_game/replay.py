@@ -0,0 +1,46 @@
+"""
+Per-room replay buffer for resumable player sessions.
+
+Every message the host sends to a player gets the next sequence number of
+the room and is kept in a bounded ring buffer, so a player reconnecting
+with the last sequence number it saw can be sent exactly what it missed.
+"""
+from collections import deque
+
+
+class ReplayBuffer:
+    """
+    Last `capacity` outbound messages of one room.
+
+    Args:
+        capacity: number of messages kept before the oldest are dropped
+    """
+
+    def __init__(self, capacity):
+        self.messages = deque(maxlen=capacity)
+        self.last_seq = 0
+
+    def append(self, player_id, header, data):
+        """Number a message for `player_id` and remember it."""
+        self.last_seq += 1
+        self.messages.append((self.last_seq, player_id, header, data))
+        return self.last_seq
+
+    def missed(self, player_id, last_seen):
+        """
+        Messages for `player_id` numbered after `last_seen`.
+
+        Returns:
+            List of (seq, header, data) tuples, or None when some of the
+            missed messages were already dropped from the buffer
+        """
+        if last_seen >= self.last_seq:
+            return []
+        oldest = self.messages[0][0] if self.messages else self.last_seq + 1
+        if last_seen + 1 < oldest:
+            return None
+        return [
+            (seq, header, data)
+            for seq, recipient, header, data in self.messages
+            if seq > last_seen and recipient == player_id
+        ]
@@ -1,7 +1,11 @@
 from django.urls import re_path
-from .consumers import GameConsumer, LobbyConsumer
+from .consumers import PlayerConsumer, HostConsumer, SpectatorConsumer
 
 websocket_urlpatterns = [
-    re_path(r"ws/game/(?P<room_code>\w+)/$", GameConsumer.as_asgi()),
-    re_path(r"ws/lobby/(?P<room_code>\w+)/$", LobbyConsumer.as_asgi()),
+    re_path(
+        r"ws/game/(?P<room_code>\w+)/(?P<player_id>\d+)/$",
+        PlayerConsumer.as_asgi()
+        ),
+    re_path(r"ws/lobby/(?P<room_code>\w+)/$", HostConsumer.as_asgi()),
+    re_path(r"ws/watch/(?P<room_code>\w+)/$", SpectatorConsumer.as_asgi()),
 ]
@@ -14,24 +14,159 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from virus_the_game.storage import server_profile, sqlite_profile
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / "data" / "db.sqlite3"
+# empty runs on SQLite in data/, otherwise e.g. postgres://user:pw@host/db
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+# seconds a connection is reused between requests (0 closes it each time)
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', '600'))
+
+if DATABASE_URL:
+    DATABASES = {
+        'default': server_profile(
+            DATABASE_URL,
+            conn_max_age=DATABASE_CONN_MAX_AGE,
+            pool_min=int(os.environ.get('DATABASE_POOL_MIN', '2')),
+            pool_max=int(os.environ.get('DATABASE_POOL_MAX', '20')),
+        )
+    }
+else:
+    DATABASES = {
+        'default': sqlite_profile(
+            BASE_DIR / "data" / "db.sqlite3",
+            busy_timeout=int(os.environ.get('SQLITE_BUSY_TIMEOUT', '5000')),
+            synchronous=os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+            conn_max_age=DATABASE_CONN_MAX_AGE,
+        )
     }
-}
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {
-            "hosts": [("redis", 6379)],
+# "memory://" swaps Redis for in-process stand-ins (single worker only)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379')
+
+if REDIS_URL.startswith('memory://'):
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
         },
-    },
-}
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [REDIS_URL],
+            },
+        },
+    }
+
+# Django cache, shared through Redis so every worker sees invalidations
+if REDIS_URL.startswith('memory://'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+
+# "asgi" hands consumer API calls to this process's Django application,
+# "http" sends them to API_BASE_URL
+API_TRANSPORT = os.environ.get('API_TRANSPORT', 'asgi')
+API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000/api/')
+
+# websocket token -> player cache, optionally shared between workers in Redis
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', '60'))
+TOKEN_CACHE_REDIS = os.environ.get('TOKEN_CACHE_REDIS', 'False') == 'True'
+
+# fraction of player moves whose per-hop timings are written to TRACE_FILE
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+TRACE_FILE = os.environ.get('TRACE_FILE', BASE_DIR / "data" / "traces.jsonl")
+
+# timeouts in seconds handled by the per-worker timer wheel, 0 disables
+TURN_TIMEOUT = float(os.environ.get('TURN_TIMEOUT', '60'))
+ROOM_IDLE_TIMEOUT = float(os.environ.get('ROOM_IDLE_TIMEOUT', '1800'))
+TIMER_TICK = float(os.environ.get('TIMER_TICK', '0.1'))
+
+# seconds between heartbeat sweeps (0 disables) and the number of silent
+# sweeps after which a connection is closed
+HEARTBEAT_INTERVAL = float(os.environ.get('HEARTBEAT_INTERVAL', '0'))
+HEARTBEAT_MAX_MISSED = int(os.environ.get('HEARTBEAT_MAX_MISSED', '3'))
+
+# server-side bots (host "add_bot" frames): seconds a bot thinks before
+# playing, bots a worker runs at most, and whether they run on a thread
+# of their own (always on the worker's loop with REDIS_URL = "memory://")
+BOT_THINK_TIME = float(os.environ.get('BOT_THINK_TIME', '1'))
+BOT_MAX_PER_WORKER = int(os.environ.get('BOT_MAX_PER_WORKER', '200'))
+BOT_THREAD = os.environ.get('BOT_THREAD', 'True') == 'True'
+
+# outbound messages kept per room for players resuming their session
+REPLAY_BUFFER_SIZE = int(os.environ.get('REPLAY_BUFFER_SIZE', '256'))
+
+# games a worker keeps in memory before spilling the coldest to Redis,
+# by count and by estimated size, 0 disables either limit
+GAME_RESIDENT_MAX_ROOMS = int(
+    os.environ.get('GAME_RESIDENT_MAX_ROOMS', '500')
+)
+GAME_RESIDENT_MAX_MB = int(os.environ.get('GAME_RESIDENT_MAX_MB', '256'))
+# seconds a spilled game is kept in Redis, a room quiet for longer is closed
+GAME_SPILL_TTL = int(os.environ.get('GAME_SPILL_TTL', '86400'))
+
+# serve game create/join/state/remove/finish from async views
+ASYNC_API = os.environ.get('ASYNC_API', 'True') == 'True'
+
+# seconds a serialized game state stays cached for the polling clients
+GAME_STATE_CACHE_TTL = int(os.environ.get('GAME_STATE_CACHE_TTL', '300'))
+
+# finished games are journaled here (suffixed with each worker's pid) and
+# written to the database in batches of RESULT_BATCH_SIZE, waiting at most
+# RESULT_FLUSH_INTERVAL seconds
+RESULT_JOURNAL = os.environ.get(
+    'RESULT_JOURNAL', BASE_DIR / "data" / "results.journal"
+)
+RESULT_BATCH_SIZE = int(os.environ.get('RESULT_BATCH_SIZE', '100'))
+RESULT_FLUSH_INTERVAL = float(os.environ.get('RESULT_FLUSH_INTERVAL', '1'))
+
+# python manage.py archive_games moves games finished ARCHIVE_AFTER_DAYS
+# ago into ARCHIVE_DIR, deleting ARCHIVE_BATCH_SIZE games per transaction
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', BASE_DIR / "data" / "archive")
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+
+# engine regression fixtures, see engine/traces.py
+GOLDEN_TRACES = BASE_DIR / "engine" / "golden" / "traces.jsonl.gz"
+
+# rows read from the database at a time by the /api/export/ streams
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# seconds a join response is kept for retries with the same Idempotency-Key
+JOIN_IDEMPOTENCY_TTL = int(os.environ.get('JOIN_IDEMPOTENCY_TTL', '600'))
+
+# players leaderboard, mirrored into a Redis sorted set unless disabled
+LEADERBOARD_REDIS = os.environ.get('LEADERBOARD_REDIS', 'True') == 'True'
+LEADERBOARD_PAGE_SIZE = int(os.environ.get('LEADERBOARD_PAGE_SIZE', '50'))
+LEADERBOARD_MAX_PAGE_SIZE = 200
+
+# auto-match queue (api/matchmaking/), in Redis unless disabled: rooms of
+# MATCH_ROOM_SIZE players within MATCH_BAND points of total_score, the band
+# widening by MATCH_BAND_GROWTH per second of waiting up to MATCH_BAND_MAX,
+# and rooms of 2 or more after MATCH_SMALL_ROOM_AFTER seconds
+MATCHMAKING_REDIS = os.environ.get('MATCHMAKING_REDIS', 'True') == 'True'
+MATCH_ROOM_SIZE = int(os.environ.get('MATCH_ROOM_SIZE', '4'))
+MATCH_BAND = float(os.environ.get('MATCH_BAND', '2'))
+MATCH_BAND_GROWTH = float(os.environ.get('MATCH_BAND_GROWTH', '0.5'))
+MATCH_BAND_MAX = float(os.environ.get('MATCH_BAND_MAX', '100'))
+MATCH_SMALL_ROOM_AFTER = float(os.environ.get('MATCH_SMALL_ROOM_AFTER', '30'))
+# seconds a matched player's seat is kept for its next poll
+MATCH_RESULT_TTL = int(os.environ.get('MATCH_RESULT_TTL', '300'))
 
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'default-insecure-key')
 DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
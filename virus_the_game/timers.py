@@ -0,0 +1,189 @@
+"""
+Per-worker timer service for turn deadlines, heartbeats and idle rooms.
+
+All timers of the worker live in one hierarchical timer wheel driven by a
+single asyncio task, so scheduling, rescheduling and cancelling are O(1)
+and thousands of rooms cost no more than one sleeping task. Timers are
+keyed (e.g. "turn:42"), scheduling the same key again replaces the
+previous deadline, which is what resetting a turn or idle timer needs.
+"""
+import asyncio
+import inspect
+import time
+
+from django.conf import settings
+
+from virus_the_game.metrics import TIMERS_FIRED, TIMERS_PENDING
+
+
+# ----------------- Timer Wheel ----------------- #
+
+
+class Timer:
+    __slots__ = ('key', 'deadline', 'callback', 'cancelled')
+
+    def __init__(self, key, deadline, callback):
+        self.key = key
+        self.deadline = deadline  # in ticks
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel counted in ticks.
+
+    Level 0 has one slot per tick, every higher level has slots `size`
+    times wider. A timer sits on the lowest level that can hold its
+    distance from now and cascades one level down each time the wheel
+    below it completes a revolution, until it fires from level 0.
+    Cancelled timers are skipped lazily instead of being searched for.
+
+    Args:
+        size: slots per level
+        levels: number of levels, size ** levels ticks is the range
+    """
+
+    def __init__(self, size=64, levels=4):
+        self.size = size
+        self.levels = levels
+        self.wheels = [[[] for _ in range(size)] for _ in range(levels)]
+        self.current_tick = 0
+        self.timers = {}
+
+    def __len__(self):
+        return len(self.timers)
+
+    def schedule(self, key, ticks, callback):
+        """Schedule (or reschedule) the timer `key` to fire in `ticks`."""
+        self.cancel(key)
+        timer = Timer(key, self.current_tick + max(1, ticks), callback)
+        self.timers[key] = timer
+        self._place(timer)
+        return timer
+
+    def cancel(self, key):
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancelled = True
+
+    def _place(self, timer):
+        distance = timer.deadline - self.current_tick
+        for level in range(self.levels):
+            if distance < self.size ** (level + 1) or \
+                    level == self.levels - 1:
+                slot = (timer.deadline // self.size ** level) % self.size
+                self.wheels[level][slot].append(timer)
+                return
+
+    def advance(self, ticks):
+        """
+        Move the wheel forward, returning the timers that became due.
+        """
+        expired = []
+        for _ in range(ticks):
+            self.current_tick += 1
+            tick = self.current_tick
+
+            # cascade from the top so timers can fall several levels
+            for level in range(self.levels - 1, 0, -1):
+                span = self.size ** level
+                if tick % span == 0:
+                    slot = self.wheels[level][(tick // span) % self.size]
+                    pending, slot[:] = list(slot), []
+                    for timer in pending:
+                        if not timer.cancelled:
+                            self._place(timer)
+
+            slot = self.wheels[0][tick % self.size]
+            due, slot[:] = list(slot), []
+            for timer in due:
+                if timer.cancelled:
+                    continue
+                if timer.deadline > tick:
+                    # parked on the top level beyond the wheel's range
+                    self._place(timer)
+                    continue
+                del self.timers[timer.key]
+                expired.append(timer)
+        return expired
+
+
+# ----------------- Timer Service ----------------- #
+
+
+class TimerService:
+    """
+    Drives a TimerWheel from one asyncio task per worker.
+    Callbacks may be plain functions or coroutine functions.
+
+    Args:
+        tick: wheel resolution in seconds
+    """
+
+    def __init__(self, tick=0.1):
+        self.tick = tick
+        self.wheel = TimerWheel()
+        self.task = None
+        self.started = None
+        self.fired = 0
+
+    def schedule(self, key, delay, callback):
+        """Run `callback()` in `delay` seconds, replacing the key's timer."""
+        self._ensure_running()
+        ticks = int(delay / self.tick + 0.5)
+        self.wheel.schedule(key, ticks, callback)
+
+    def cancel(self, key):
+        self.wheel.cancel(key)
+
+    def __len__(self):
+        return len(self.wheel)
+
+    def _ensure_running(self):
+        if self.task is None or self.task.done():
+            elapsed = self.wheel.current_tick * self.tick
+            self.started = time.monotonic() - elapsed
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            target = int((time.monotonic() - self.started) / self.tick)
+            expired = self.wheel.advance(target - self.wheel.current_tick)
+            if expired:
+                await self.fire(expired)
+
+    async def fire(self, expired):
+        coroutines = []
+        for timer in expired:
+            self.fired += 1
+            try:
+                result = timer.callback()
+            except Exception as e:
+                print(f"Timer {timer.key} failed: {e!r}")
+                continue
+            if inspect.isawaitable(result):
+                coroutines.append(result)
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Timer callback failed: {result!r}")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+
+_timer_service = None
+
+
+def get_timer_service():
+    """The worker's timer service, created on first use."""
+    global _timer_service
+    if _timer_service is None:
+        _timer_service = TimerService(settings.TIMER_TICK)
+        TIMERS_PENDING.set_function(_timer_service.__len__)
+        TIMERS_FIRED.set_function(lambda: _timer_service.fired)
+    return _timer_service
@@ -0,0 +1,165 @@
+"""
+Move latency tracing across the player and host consumers.
+
+A trace is a plain dict that travels inside the channel layer events:
+
+    {"id": "9f1c...", "sampled": False, "spans": [["player_receive", t], ...]}
+
+Every hop appends a wall-clock span, so the time between two consecutive
+spans is the time spent in that hop (Redis lookup, channel layer,
+resolve_attempt, ...). Sampled traces are appended to TRACE_FILE as JSON
+lines once the reply reaches the player's socket, by a writer thread so
+the event loop never waits for the disk.
+"""
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from virus_the_game.measurement import percentile
+
+
+# ----------------- Trace Building ----------------- #
+
+
+def start_trace(span, trace_id=None, started=None):
+    """
+    Begin a trace with its first span.
+
+    Args:
+        span: name of the first span
+        trace_id: id supplied by the client, a fresh one is made otherwise
+        started: timestamp of the first span, now by default
+
+    Returns:
+        Trace dictionary, sampled according to TRACE_SAMPLE_RATE
+    """
+    return {
+        'id': trace_id or uuid.uuid4().hex[:16],
+        'sampled': random.random() < settings.TRACE_SAMPLE_RATE,
+        'spans': [[span, started or time.time()]],
+    }
+
+
+def add_span(trace, span):
+    """Stamp the end of a hop onto the trace (no-op without a trace)."""
+    if trace is not None:
+        trace['spans'].append([span, time.time()])
+    return trace
+
+
+def trace_id(trace):
+    """Id of the trace, or None for untraced messages."""
+    return trace['id'] if trace else None
+
+
+# ----------------- Trace Sink ----------------- #
+
+
+class TraceSink:
+    """
+    Appends finished, sampled traces to a JSON lines file.
+    Unsampled traces are dropped without touching the disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self.run, name="trace-sink", daemon=True
+        )
+        self.thread.start()
+
+    def record(self, trace):
+        """Queue a sampled trace for the writer thread, never blocks."""
+        if not trace or not trace['sampled']:
+            return
+        self.queue.put(
+            json.dumps({'id': trace['id'], 'spans': trace['spans']})
+        )
+
+    def stop(self, timeout=5):
+        """Write the queued traces and stop the thread."""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            lines = [self.queue.get()]
+            # whatever queued up meanwhile goes in the same write
+            while not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            if None in lines:
+                stopping = True
+                lines = [line for line in lines if line is not None]
+            if not lines:
+                continue
+            try:
+                with open(self.path, 'a') as trace_file:
+                    trace_file.write('\n'.join(lines) + '\n')
+            except OSError as e:
+                print(f"Writing {len(lines)} traces failed: {e!r}")
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_trace_sink():
+    """Worker-wide sink writing to TRACE_FILE."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = TraceSink(settings.TRACE_FILE)
+    return _sink
+
+
+def stop_trace_sink():
+    global _sink
+    with _sink_lock:
+        if _sink is not None:
+            _sink.stop()
+            _sink = None
+
+
+def finish_trace(trace, span):
+    """Stamp the last span and hand the trace over to the sink."""
+    add_span(trace, span)
+    get_trace_sink().record(trace)
+
+
+# ----------------- Trace Analysis ----------------- #
+
+
+def summarize_traces(path):
+    """
+    Per-hop latency breakdown of a trace file.
+
+    Returns:
+        Dict of "from -> to" hop names to count, mean, p50, p95 and p99
+        in milliseconds, ordered as the hops appear in the traces
+    """
+    hops = {}
+    with open(path) as trace_file:
+        for line in trace_file:
+            spans = json.loads(line)['spans']
+            for (start, started), (end, ended) in zip(spans, spans[1:]):
+                hops.setdefault(f"{start} -> {end}", []).append(
+                    (ended - started) * 1000
+                    )
+
+    return {
+        hop: {
+            'count': len(durations),
+            'mean_ms': sum(durations) / len(durations),
+            'p50_ms': percentile(durations, 0.50),
+            'p95_ms': percentile(durations, 0.95),
+            'p99_ms': percentile(durations, 0.99),
+        }
+        for hop, durations in hops.items()
+    }
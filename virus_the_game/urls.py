@@ -17,6 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from backend.views import metrics
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -24,6 +26,9 @@ urlpatterns = [
     # Your REST API (DRF)
     path("api/", include("backend.urls")),
 
+    # Prometheus scrape endpoint
+    path("metrics/", metrics),
+
     # Optional: if you still want a homepage route, point it to backend for now
     path("", include("backend.urls")),
 ]
@@ -1,7 +1,15 @@
+import json
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from virus_the_game.metrics import Gauge
 
 
 @database_sync_to_async
@@ -14,6 +22,278 @@ def get_player_for_token(token: str):
         return None
 
 
+# ----------------- Token Cache ----------------- #
+
+
+class TokenCache:
+    """
+    Bounded LRU of token -> player with a time-to-live.
+    Unknown tokens are never cached, so a rotated or deleted token cannot
+    be kept alive by repeated attempts.
+
+    Args:
+        max_size: number of tokens kept before the least recent is dropped
+        ttl: seconds an entry is trusted without asking the database
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # token -> (expires_at, player)
+        self.tokens_by_player = {}
+        self.hits = 0
+        self.misses = 0
+        # signal handlers invalidate from the database threads
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, player):
+        with self.lock:
+            self.entries[token] = (time.monotonic() + self.ttl, player)
+            self.entries.move_to_end(token)
+            self.tokens_by_player[player.id] = token
+            while len(self.entries) > self.max_size:
+                self._drop(next(iter(self.entries)))
+
+    def invalidate_player(self, player_id):
+        """Forget the player's token, returning it if it was cached."""
+        with self.lock:
+            token = self.tokens_by_player.get(player_id)
+            if token is not None:
+                self._drop(token)
+            return token
+
+    def _drop(self, token):
+        _, player = self.entries.pop(token)
+        if self.tokens_by_player.get(player.id) == token:
+            del self.tokens_by_player[player.id]
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RedisTokenCache:
+    """
+    Optional second tier shared by all workers, so a reconnect storm hits
+    the database once per token rather than once per token per worker.
+    """
+
+    def __init__(self, url, ttl):
+        import redis
+        import redis.asyncio
+
+        self.ttl = ttl
+        self.redis = redis.asyncio.from_url(url)
+        # invalidation runs in signal handlers, outside the event loop
+        self.sync_redis = redis.Redis.from_url(url)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def token_key(token):
+        return f"auth:token:{token}"
+
+    @staticmethod
+    def player_key(player_id):
+        return f"auth:player:{player_id}"
+
+    async def get(self, token):
+        cached = await self.redis.get(self.token_key(token))
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        Player = apps.get_model("backend", "Player")
+        return Player(**json.loads(cached))
+
+    async def set(self, token, player):
+        fields = {
+            "id": player.id,
+            "nickname": player.nickname,
+            "total_score": player.total_score,
+        }
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self.token_key(token), json.dumps(fields), ex=self.ttl)
+            pipe.set(self.player_key(player.id), token, ex=self.ttl)
+            await pipe.execute()
+
+    def invalidate_player(self, player_id):
+        token = self.sync_redis.get(self.player_key(player_id))
+        if token is not None:
+            self.sync_redis.delete(
+                self.token_key(token.decode()),
+                self.player_key(player_id)
+            )
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL
+)
+redis_token_cache = None
+if settings.TOKEN_CACHE_REDIS and not settings.REDIS_URL.startswith('memory'):
+    redis_token_cache = RedisTokenCache(
+        settings.REDIS_URL, settings.TOKEN_CACHE_TTL
+    )
+
+TOKEN_CACHE_HIT_RATE = Gauge(
+    'virus_token_cache_hit_rate',
+    'Share of websocket token lookups answered without the database',
+    ['tier']
+)
+TOKEN_CACHE_HIT_RATE.labels('local').set_function(token_cache.hit_rate)
+TOKEN_CACHE_SIZE = Gauge(
+    'virus_token_cache_entries',
+    'Tokens held in this worker\'s token cache'
+)
+TOKEN_CACHE_SIZE.set_function(lambda: len(token_cache.entries))
+if redis_token_cache:
+    TOKEN_CACHE_HIT_RATE.labels('redis').set_function(
+        lambda: redis_token_cache.hits
+        / max(1, redis_token_cache.hits + redis_token_cache.misses)
+    )
+
+
+# ----------------- Invalidation ----------------- #
+
+
+INVALIDATION_CHANNEL = "auth:invalidate"
+
+
+class InvalidationListener:
+    """
+    Drops from this worker's local cache the players whose token was
+    rotated or deleted by any worker, published on INVALIDATION_CHANNEL.
+    Listens on a redis-py pub/sub thread, TokenCache is thread-safe.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(**{INVALIDATION_CHANNEL: self.handle})
+        self.thread = self.pubsub.run_in_thread(
+            sleep_time=1, daemon=True, exception_handler=self.failed
+        )
+
+    @staticmethod
+    def handle(message):
+        token_cache.invalidate_player(int(message["data"]))
+
+    @staticmethod
+    def failed(error, pubsub, thread):
+        # keeps listening, redis-py reconnects on the next read
+        print(f"Token invalidation listener failed: {error!r}")
+        time.sleep(1)
+
+    def stop(self):
+        self.thread.stop()
+        self.pubsub.close()
+        self.redis.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+_publisher = None
+
+
+def shared_invalidation():
+    """Whether other processes may cache tokens, not with memory://."""
+    return not settings.REDIS_URL.startswith('memory')
+
+
+def start_invalidation_listener():
+    """Subscribe this worker to the other workers' invalidations, once."""
+    global _listener
+    import redis
+
+    if shared_invalidation() and _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                try:
+                    _listener = InvalidationListener(settings.REDIS_URL)
+                except redis.RedisError as e:
+                    # tried again on the next authentication
+                    print(f"Token invalidation listener not started: {e!r}")
+
+
+def stop_invalidation_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def publish_invalidation(player_id):
+    global _publisher
+    import redis
+
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(settings.REDIS_URL)
+    _publisher.publish(INVALIDATION_CHANNEL, player_id)
+
+
+async def authenticate_token(token: str):
+    """Resolve a token to its player: local LRU, Redis, then database."""
+    start_invalidation_listener()
+    player = token_cache.get(token)
+    if player is not None:
+        return player
+
+    if redis_token_cache:
+        player = await redis_token_cache.get(token)
+        if player is not None:
+            token_cache.set(token, player)
+            return player
+
+    player = await get_player_for_token(token)
+    if player is not None:
+        token_cache.set(token, player)
+        if redis_token_cache:
+            await redis_token_cache.set(token, player)
+    return player
+
+
+def invalidate_player_token(player_id):
+    """
+    Drop a player's cached token, called when the token is rotated or
+    the player is deleted. This worker forgets it at once, the Redis tier
+    and the other workers once the transaction is committed: before that
+    they could read the old token again and cache it for its TTL.
+    """
+    token_cache.invalidate_player(player_id)
+    transaction.on_commit(lambda: invalidate_shared_token(player_id))
+
+
+def invalidate_shared_token(player_id):
+    import redis
+
+    try:
+        if redis_token_cache:
+            redis_token_cache.invalidate_player(player_id)
+        if shared_invalidation():
+            publish_invalidation(player_id)
+    except redis.RedisError as e:
+        # the entries elsewhere still expire with TOKEN_CACHE_TTL
+        print(f"Invalidating the token of {player_id} failed: {e!r}")
+
+
+# ----------------- Middleware ----------------- #
+
+
 class PlayerTokenAuthMiddleware:
     def __init__(self, app):
         self.app = app
@@ -24,8 +304,11 @@ class PlayerTokenAuthMiddleware:
         token = params.get("token", [None])[0]
 
         scope["player"] = None
+        auth_started = time.time()
         if token:
-            scope["player"] = await get_player_for_token(token)
+            scope["player"] = await authenticate_token(token)
+        # picked up by the consumer's connect trace
+        scope["auth_span"] = (auth_started, time.time())
 
         return await self.app(scope, receive, send)
 